@@ -4,39 +4,195 @@ import streamlit as st
 # Set page title and layout
 st.set_page_config(page_title="Air Quality Dashboard", layout="wide")
 
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import plotly.express as px
-from streamlit_extras.switch_page_button import switch_page
-from streamlit_extras.add_vertical_space import add_vertical_space
 import time
 from chatbot import chatbot_button
+# Shared dataset, loaded once per process; `version` changes when ingest.py writes a new partition
+from shared_data import city_names, current_version, live_aggregate, load_daily_series, load_data, load_live_feed
+
+# Per-section timings, memory and cache hits of every rerun; exported when AQ_PROFILE_LOG / AQ_PROFILE_PROM are set
+@st.cache_resource
+def load_profiler():
+    from rerun_profiler import RerunProfiler
+    return RerunProfiler()
+
+rerun = load_profiler().start()
+
+# Heavy libraries (pandas, plotting, SMTP) are imported on the pages that use them,
+# so Login and Home render without loading them
+
+# Pre-aggregate the dataset once for the Dataset Explorer widgets
+@st.cache_resource(max_entries=1)
+def load_cube(version):
+    from rollups import build_cube
+    # With a live feed the cube follows the new rows instead of being rebuilt
+    cube = live_aggregate(version, "cube", build_cube)
+    return build_cube(load_data(version)) if cube is None else cube
+
+# Per-city AQI series for the trend chart, reduced to the chart's point budget; kept live like the cube
+@st.cache_resource(max_entries=1)
+def load_downsampler(version):
+    from downsample import SeriesDownsampler
+    downsampler = live_aggregate(version, "downsampler", SeriesDownsampler)
+    return SeriesDownsampler(load_data(version)) if downsampler is None else downsampler
+
+# City and Date indexes for the paged dataset preview; kept live like the cube
+@st.cache_resource(max_entries=1)
+def load_table_index(version):
+    from table_view import TableIndex
+    table_index = live_aggregate(version, "table_index", TableIndex)
+    return TableIndex(load_data(version)) if table_index is None else table_index
+
+# City × day matrices for comparing any cities over any dates; kept live like the cube
+@st.cache_resource(max_entries=1)
+def load_comparison(version):
+    from city_compare import CityComparison
+    comparison = live_aggregate(version, "city_compare", CityComparison)
+    return CityComparison(load_data(version)) if comparison is None else comparison
+
+# Rendered charts shared by every session; keys carry the data version, so charts of older data age out
+@st.cache_resource
+def load_figure_cache():
+    from figure_cache import FigureCache
+    return FigureCache()
+
+# Exports of the filtered data, written on demand and kept on disk up to a size budget
+@st.cache_resource
+def load_export_cache():
+    from data_export import ExportCache
+    return ExportCache()
+
+# Feedback mail goes through a durable outbox drained by a background worker over pooled SMTP connections
+@st.cache_resource
+def load_mail_worker():
+    from mail_outbox import DeliveryWorker, Outbox, SMTPPool
 
-# Load Dataset
-@st.cache_data
-def load_data():
-    file_path = r"C:\Users\RISHIRAJ\OneDrive\Desktop\final_cleaned_city_day.csv"  
-    df = pd.read_csv(file_path)
-
-    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
-
-    df["Month"] = df["Date"].dt.month
-
-    return df
-
-# Load the data
-df = load_data()
+    # Load secrets from secrets.toml
+    smtp = st.secrets["email"]
+    pool = SMTPPool(smtp["smtp_server"], smtp["smtp_port"], smtp["smtp_user"], smtp["smtp_password"], starttls=smtp.get("starttls", True))
+    return DeliveryWorker(Outbox(), pool).start()
+
+# Accounts shared by every session and worker process, with hashed passwords and signed session tokens
+@st.cache_resource
+def load_user_store():
+    import logging
+    import secrets
+    from user_store import UserStore
+
+    store = UserStore()
+    # Default admin account, created once; set admin_password under [auth] in secrets.toml
+    try:
+        admin_password = st.secrets.get("auth", {}).get("admin_password")
+    except FileNotFoundError:
+        admin_password = None
+    if admin_password:
+        store.ensure_user("admin", admin_password)
+    # Never a well-known password: without one configured, a random one is logged once by the process creating the account
+    elif store.ensure_user("admin", admin_password := secrets.token_urlsafe(12)):
+        logging.getLogger(__name__).warning("Created the admin account with password %s; set admin_password under [auth] in secrets.toml to choose it", admin_password)
+    return store
+
+# Function to show one page of the dataset; filtering and sorting happen on the server
+def show_table_page(key, city=None):
+    from table_view import PAGE_SIZE
+    table_index = load_table_index(data_version)
+    first_day, last_day = (day.date() for day in table_index.date_range())
+
+    sort_col, order_col, dates_col = st.columns(3)
+    sort_by = sort_col.selectbox("Sort by", ["City, Date"] + list(table_index.columns), key=f"{key}_sort")
+    order = order_col.radio("Order", ["Ascending", "Descending"], horizontal=True, key=f"{key}_order")
+    date_range = dates_col.date_input("Date range", value=(first_day, last_day), min_value=first_day, max_value=last_day, key=f"{key}_dates")
+    start, end = (date_range[0], date_range[-1]) if len(date_range) else (None, None)
+
+    total = len(table_index.rows(city, start, end))
+    pages = max((total + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+    page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+    rows, total = table_index.page(
+        city,
+        start,
+        end,
+        sort_by=None if sort_by == "City, Date" else sort_by,
+        ascending=order == "Ascending",
+        page=page - 1,
+    )
+    st.dataframe(rows)
+    first_row = (page - 1) * PAGE_SIZE
+    st.caption(f"Rows {min(first_row + 1, total):,}–{first_row + len(rows):,} of {total:,}")
+
+# Version of the data a chart of `city` shows; with a live feed it only moves when that city (any city for "All") gets new rows
+def chart_version(city=None):
+    live = load_live_feed()
+    return data_version if live is None else live.dataset.city_version(city)
+
+# Function returning a rendered figure from the shared cache; the lookup counts towards this rerun's profile
+def cached_figure(key, render):
+    from rerun_profiler import count_cache
+    built = []
+    payload = load_figure_cache().get(key, lambda: built.append(key) or render())
+    count_cache("figures", hit=not built)
+    return payload
+
+# Function to show a Plotly chart, built only the first time its (chart, city, pollutant, data version, ...) is seen
+def show_plotly_chart(build, chart, city=None, pollutant=None, *extra):
+    from figure_cache import plotly_figure, plotly_payload
+    payload = cached_figure((chart, city, pollutant, chart_version(city), *extra), lambda: plotly_payload(build()))
+    st.plotly_chart(plotly_figure(payload))
+
+# Function returning a computed table from the same cache, keyed like show_plotly_chart
+def cached_table(build, chart, city=None, pollutant=None, *extra):
+    from figure_cache import table_frame, table_payload
+    return table_frame(cached_figure((chart, city, pollutant, chart_version(city), *extra), lambda: table_payload(build())))
+
+# Function returning the data of a download button; the export is only written when the button is clicked
+def deferred_export(city, start, end, columns, export_format):
+    export_cache = load_export_cache()
+    table_index = load_table_index(data_version)
+    key = (data_version, city, start, end, tuple(columns), export_format)
+
+    def read_export():
+        path = export_cache.get(key, table_index.df, table_index.rows(city, start, end), columns, export_format)
+        with open(path, "rb") as f:
+            return f.read()
+    return read_export
+
+# Function to show a Matplotlib figure from the same cache, as PNG
+def show_pyplot(build, chart, city=None, pollutant=None, *extra):
+    from figure_cache import png_payload
+    payload = cached_figure((chart, city, pollutant, chart_version(city), *extra), lambda: png_payload(build()))
+    st.image(payload, width="stretch")
+
+# Live feed panel, run as a fragment that redraws itself every few seconds without rerunning the page;
+# its chart is only rebuilt when the city shown got new rows. A redraw on its own is profiled as a rerun of its own
+def show_live_panel(city):
+    import plotly.express as px
+
+    with load_profiler().part("live panel", "Dashboard"):
+        live = load_live_feed()
+        stats = live.stats()
+        latest_day = live.dataset.latest_date.get(city) if city != "All" else max(live.dataset.latest_date.values(), default=None)
+        rows_col, rate_col, day_col, batch_col = st.columns(4)
+        rows_col.metric("Rows received", f"{stats['rows']:,}")
+        rate_col.metric("Rows/s (last minute)", f"{stats['rows_per_second']:.1f}")
+        day_col.metric("Latest reading", "–" if latest_day is None else str(latest_day.date()))
+        batch_col.metric("Last batch", "–" if stats["seconds_since_batch"] is None else f"{stats['seconds_since_batch']:.0f} s ago")
+        if stats["last_error"]:
+            st.warning(f"⚠️ {stats['errors']} feed batch(es) skipped; last error: {stats['last_error']}")
+        st.dataframe(live.dataset.latest(city), hide_index=True)
+        show_plotly_chart(
+            lambda: px.line(live.dataset.recent(city), x="Date", y="AQI", color="City", title="AQI, Last 90 Days"),
+            "live_aqi", city, "AQI",
+        )
 
 # Initialize session state for authentication and theme
 if "authenticated" not in st.session_state:
     st.session_state.authenticated = False
-    st.session_state.users = {"admin": "password123"}  # Default user
+    st.session_state.session_token = None
     st.session_state.theme = "light"
 
+# A valid session token stands for a verified login; checking it costs one HMAC, not a password hash
+rerun.section("auth")
+st.session_state.username = load_user_store().verify_token(st.session_state.get("session_token"))
+st.session_state.authenticated = st.session_state.username is not None
+
 # Function to toggle theme
 def toggle_theme():
     st.session_state.theme = "dark" if st.session_state.theme == "light" else "light"
@@ -64,10 +220,6 @@ else:
         unsafe_allow_html=True,
     )
 
-# Function for user authentication
-def authenticate(username, password):
-    return st.session_state.users.get(username) == password
-
 # Function to handle login/logout
 def login():
     st.subheader("🔐 Login to Access the Dashboard")
@@ -75,7 +227,9 @@ def login():
     password = st.text_input("Password", type="password")
     
     if st.button("Login"):
-        if authenticate(username, password):
+        token = load_user_store().login(username, password)
+        if token:
+            st.session_state.session_token = token
             st.session_state.authenticated = True
             st.session_state.username = username
             st.success("✅ Login successful! Access granted.")
@@ -91,16 +245,19 @@ def register():
     new_password = st.text_input("Choose a Password", type="password")
     
     if st.button("Register"):
-        if new_username in st.session_state.users:
+        if not new_username or not new_password:
+            st.error("⚠️ Please enter a username and a password.")
+        elif not load_user_store().register(new_username, new_password):
             st.error("⚠️ Username already exists! Choose a different one.")
         else:
-            st.session_state.users[new_username] = new_password
             st.success("✅ Registration successful! Please log in.")
             time.sleep(1)
             st.rerun()
 
 # Login or Register page with theme toggle
 if not st.session_state.authenticated:
+    rerun.page = "Login"
+    rerun.section("login")
     st.sidebar.title("🔑 User Access")
     choice = st.sidebar.radio("Select an option:", ["Login", "Register"])
     st.sidebar.button("🌙 Toggle Theme", on_click=toggle_theme)
@@ -109,23 +266,29 @@ if not st.session_state.authenticated:
         login()
     else:
         register()
+    rerun.finish()
     st.stop()
 
 # Navigation Sidebar with icons
+rerun.section("sidebar")
 st.sidebar.title("🌍 Navigation")
 st.sidebar.button("🏠 Home", on_click=lambda: st.session_state.update(page="Home"), use_container_width=True)
 st.sidebar.button("📊 Dashboard", on_click=lambda: st.session_state.update(page="Dashboard"), use_container_width=True)
 st.sidebar.button("💬 Feedback", on_click=lambda: st.session_state.update(page="Feedback"), use_container_width=True)
+rerun.section("chatbot")
 chatbot_button()
+rerun.section("sidebar")
 
 # Logout Button
-st.sidebar.button("🔓 Logout", on_click=lambda: (st.session_state.update(authenticated=False), st.rerun()))
+st.sidebar.button("🔓 Logout", on_click=lambda: (st.session_state.update(authenticated=False, session_token=None), st.rerun()))
 
 # Determine current page
 page = st.session_state.get("page", "Home")
+rerun.page = page
 
 # Home Page
 if page == "Home":
+    rerun.section("home")
     st.title("🌍 Welcome to Air Quality Hub")
     st.write("""
              
@@ -148,6 +311,17 @@ Transform data into action! This platform isn't just a dashboard—it's a gatewa
 
 # Dashboard Section
 elif page == "Dashboard":
+    # Only this page plots or touches the data
+    import matplotlib.pyplot as plt
+    import plotly.express as px
+    import seaborn as sns
+
+    # Load the data
+    rerun.section("load data")
+    data_version = current_version()
+    cube = load_cube(data_version)
+
+    rerun.section("overview")
     st.title("📊 Air Quality Dashboard")
     tab1, tab2 = st.tabs(["📊 Dashboard View", "📂 Dataset Explorer"])
 
@@ -195,35 +369,89 @@ elif page == "Dashboard":
         st.subheader("📂 Explore Air Quality Data")
 
         # Raw Data Preview
+        rerun.section("raw preview")
         st.write("### 📋 Raw Dataset Preview")
-        st.dataframe(df)
+        show_table_page("raw")
 
         # Filtering Options
+        rerun.section("filter")
         st.write("### 🔍 Filter Data")
-        city_list = df["City"].unique().tolist()
+        city_list = list(city_names(data_version))
         selected_city = st.selectbox("Select a City", ["All"] + city_list)
 
-        if selected_city != "All":
-            df_filtered = df[df["City"] == selected_city]
-        else:
-            df_filtered = df
+        # Rows of the selected city, only read when a chart is not in the figure cache
+        def filtered_data():
+            df = load_data(data_version)
+            return df if selected_city == "All" else df[df["City"] == selected_city]
+
+        show_table_page("filtered", None if selected_city == "All" else selected_city)
 
-        st.dataframe(df_filtered)
+        # Live Feed
+        if load_live_feed() is not None:
+            from live_feed import REFRESH_SECONDS
+            st.write("### 🔴 Live Feed")
+            st.fragment(show_live_panel, run_every=REFRESH_SECONDS)(selected_city)
 
         # Statistical Summary
+        rerun.section("summary")
         st.write("### 📊 Summary Statistics")
-        st.write(df_filtered.describe())
+        st.write(cube.describe(selected_city))
 
         # AQI Trends Over Time
+        rerun.section("trend")
         st.write("### 📈 AQI Trends Over Time")
-        fig = px.line(df_filtered, x="Date", y="AQI", color="City", title="AQI Trends Over Time")
-        st.plotly_chart(fig)
+        downsampler = load_downsampler(data_version)
+        first_day, last_day = downsampler.date_range()
+        # Narrowing the range re-fetches the series with the same point budget, i.e. more detail
+        zoom_start, zoom_end = st.slider(
+            "Zoom to dates",
+            min_value=first_day.date(),
+            max_value=last_day.date(),
+            value=(first_day.date(), last_day.date()),
+        )
+        trend_cities = None if selected_city == "All" else [selected_city]
+        show_plotly_chart(
+            lambda: px.line(downsampler.frame(trend_cities, start=zoom_start, end=zoom_end), x="Date", y="AQI", color="City", title="AQI Trends Over Time"),
+            "aqi_trend", selected_city, "AQI", zoom_start, zoom_end,
+        )
+
+        # Rolling Averages
+        rerun.section("rolling averages")
+        st.write("### 📉 Rolling Averages")
+        from daily_series import WHO_LIMITS, WINDOWS
+        daily_series = load_daily_series(data_version)
+        if selected_city == "All":
+            st.info("Select a city above to see its rolling averages.")
+        else:
+            rolling_pollutant = st.selectbox("Pollutant", ["AQI", *WHO_LIMITS], key="rolling_pollutant")
+            latest = daily_series.latest(selected_city, rolling_pollutant)
+            if latest is not None:
+                latest_date, means = latest
+                for column, window in zip(st.columns(len(WINDOWS)), WINDOWS):
+                    column.metric(f"{window}-day average", f"{means[f'{window}-day']:.1f}")
+                st.caption(f"Up to {latest_date.date()}")
+            show_plotly_chart(
+                lambda: px.line(daily_series.rolling(selected_city, rolling_pollutant).reset_index(), x="Date", y=[f"{w}-day" for w in WINDOWS],
+                                title=f"Rolling {rolling_pollutant} Averages in {selected_city}", labels={"value": rolling_pollutant, "variable": "Window"}),
+                "rolling_means", selected_city, rolling_pollutant,
+            )
+
+        # WHO Guideline Exceedances
+        rerun.section("who exceedances")
+        st.write("### 🚩 Days Above WHO Guidelines")
+        if selected_city == "All":
+            st.caption("Share of days each city's 24-hour mean was above the WHO 2021 guideline")
+            st.dataframe(daily_series.exceedance_table().style.format("{:.0%}", na_rep="–"))
+        else:
+            st.caption("Days above the WHO 2021 24-hour guideline, and the longest run of consecutive such days")
+            st.dataframe(daily_series.exceedance_table(selected_city).style.format({"Share": "{:.0%}", "WHO limit": "{:g}"}, na_rep="–"))
 
         # Most & Least Polluted Cities
+        rerun.section("city ranking")
         st.write("### 🌆 Most & Least Polluted Cities")
-        avg_aqi = df.groupby("City")["AQI"].mean().reset_index()
-        most_polluted = avg_aqi.nlargest(5, "AQI")
-        least_polluted = avg_aqi.nsmallest(5, "AQI")
+        avg_aqi = cube.city_means("AQI")
+        most_polluted = cube.top_cities(5, "AQI")
+        least_polluted = cube.top_cities(5, "AQI", largest=False)
 
         st.write("#### 🚨 Most Polluted Cities")
         st.dataframe(most_polluted)
@@ -231,48 +459,109 @@ elif page == "Dashboard":
         st.dataframe(least_polluted)
 
         # City-wise AQI Comparison
+        rerun.section("city comparison")
         st.write("### 🏙 City-wise AQI Comparison")
-        fig = px.bar(avg_aqi, x="City", y="AQI", title="Average AQI by City", color="AQI", height=600)
-        st.plotly_chart(fig)
+        show_plotly_chart(lambda: px.bar(avg_aqi, x="City", y="AQI", title="Average AQI by City", color="AQI", height=600), "city_aqi_bar", None, "AQI")
+
+        # Multi-City Comparison
+        rerun.section("compare cities")
+        st.write("### 🆚 Compare Cities")
+        comparison = load_comparison(data_version)
+        compare_cities = st.multiselect("Cities to compare", comparison.cities, default=most_polluted["City"].head(3).tolist())
+        compare_first, compare_last = comparison.dates[0].date(), comparison.dates[-1].date()
+        compare_dates = st.date_input("Compare dates", value=(compare_first, compare_last), min_value=compare_first, max_value=compare_last)
+        compare_pollutant = st.selectbox("Compare pollutant", comparison.pollutants, index=comparison.pollutants.index("AQI"))
+        # The date picker returns one date while the second is being picked
+        compare_start, compare_end = (compare_dates[0], compare_dates[-1]) if compare_dates else (compare_first, compare_last)
+        if len(compare_cities) < 2:
+            st.info("Select at least two cities to compare them.")
+        else:
+            compare_key = (tuple(compare_cities), compare_start, compare_end)
+            compare_args = (compare_cities, compare_pollutant, compare_start, compare_end)
+            show_plotly_chart(
+                lambda: px.line(comparison.aligned(*compare_args), title=f"Daily {compare_pollutant}", labels={"value": compare_pollutant}),
+                "compare_aligned", None, compare_pollutant, *compare_key,
+            )
+            show_plotly_chart(
+                lambda: px.imshow(comparison.correlations(*compare_args), text_auto=".2f", zmin=-1, zmax=1, color_continuous_scale="RdBu_r",
+                                  title=f"Correlation of Daily {compare_pollutant}"),
+                "compare_corr", None, compare_pollutant, *compare_key,
+            )
+            st.caption("City pairs by how closely one follows the other, at the lag (in days) where it follows most closely")
+            leads = cached_table(lambda: comparison.leads(*compare_args), "compare_leads", None, compare_pollutant, *compare_key)
+            st.dataframe(leads.style.format({"Lag (days)": "{:.0f}", "Correlation": "{:.2f}"}))
+
+            def draw_ranks():
+                ranks = comparison.ranks(*compare_args)
+                ranks.index = ranks.index.to_timestamp()
+                fig = px.line(ranks, markers=True, title=f"Monthly Rank by Average {compare_pollutant} (1 = most polluted)", labels={"value": "Rank"})
+                return fig.update_yaxes(autorange="reversed", dtick=1)
+            show_plotly_chart(draw_ranks, "compare_ranks", None, compare_pollutant, *compare_key)
+            st.caption("Places each city moved up the ranking (towards most polluted) in the last months")
+            rank_changes = cached_table(lambda: comparison.rank_changes(*compare_args).tail(12), "compare_rank_changes", None, compare_pollutant, *compare_key)
+            rank_changes.index = rank_changes.index.astype(str)
+            st.dataframe(rank_changes.style.format("{:+.0f}", na_rep="–"))
 
         # Pollutant Distribution
+        rerun.section("pollutant distribution")
         st.write("### 🌫️ Pollutant Distribution")
         pollutants = ["PM2.5", "PM10", "NO2", "SO2", "CO", "O3"]
         selected_pollutant = st.selectbox("Select a Pollutant", pollutants)
-        fig = px.box(df_filtered, x="City", y=selected_pollutant, title=f"{selected_pollutant} Levels Across Cities")
-        st.plotly_chart(fig)
+        show_plotly_chart(
+            lambda: px.box(filtered_data(), x="City", y=selected_pollutant, title=f"{selected_pollutant} Levels Across Cities"),
+            "pollutant_box", selected_city, selected_pollutant,
+        )
 
         # Correlation Heatmap
+        rerun.section("correlation heatmap")
         st.write("### 🔬 Correlation Between Pollutants")
-        numeric_df = df_filtered.select_dtypes(include=["float64", "int64"])
-        if not numeric_df.empty:
-            corr = numeric_df.corr()
-            fig, ax = plt.subplots(figsize=(8, 6))
-            sns.heatmap(corr, annot=True, cmap="coolwarm", fmt=".2f", ax=ax)
-            st.pyplot(fig)
+        corr = cube.corr(selected_city)
+        if not corr.empty:
+            def draw_heatmap():
+                fig, ax = plt.subplots(figsize=(8, 6))
+                sns.heatmap(corr, annot=True, cmap="coolwarm", fmt=".2f", ax=ax)
+                return fig
+            show_pyplot(draw_heatmap, "corr_heatmap", selected_city)
 
         # Seasonal AQI Patterns
+        rerun.section("seasonal")
         st.write("### 📅 Seasonal AQI Patterns")
-        df_filtered["Month"] = df_filtered["Date"].dt.month
-        monthly_aqi = df_filtered.groupby("Month")["AQI"].mean().reset_index()
-        fig = px.line(monthly_aqi, x="Month", y="AQI", title="Average AQI by Month", markers=True)
-        st.plotly_chart(fig)
+        monthly_aqi = cube.monthly_means(selected_city, "AQI")
+        show_plotly_chart(lambda: px.line(monthly_aqi, x="Month", y="AQI", title="Average AQI by Month", markers=True), "monthly_aqi", selected_city, "AQI")
 
         # Download Data Feature
+        rerun.section("download")
         st.write("### 📥 Download Filtered Data")
-        @st.cache_data
-        def convert_df(df):
-            return df.to_csv(index=False).encode("utf-8")
-
-        data_csv = convert_df(df_filtered)
+        from data_export import FORMATS
+        format_col, dates_col = st.columns(2)
+        export_format = format_col.selectbox("Format", list(FORMATS))
+        export_dates = dates_col.date_input(
+            "Date range",
+            value=(first_day.date(), last_day.date()),
+            min_value=first_day.date(),
+            max_value=last_day.date(),
+            key="export_dates",
+        )
+        export_columns = [c for c in load_table_index(data_version).columns if c not in ("City", "Date")]
+        export_columns = st.multiselect("Columns", export_columns, default=export_columns)
+        export_start, export_end = (export_dates[0], export_dates[-1]) if len(export_dates) else (None, None)
+        extension, mime = FORMATS[export_format]
         st.download_button(
-            label="Download CSV",
-            data=data_csv,
-            file_name="filtered_air_quality_data.csv",
-            mime="text/csv"
+            label=f"Download {export_format}",
+            data=deferred_export(None if selected_city == "All" else selected_city, export_start, export_end, ["City", "Date", *export_columns], export_format),
+            file_name=f"filtered_air_quality_data.{extension}",
+            mime=mime
         )
 
+        # Chart cache and rerun profile instrumentation
+        rerun.section("instrumentation")
+        with st.expander("⏱️ Chart cache"):
+            st.dataframe(load_figure_cache().stats())
+        with st.expander("⏱️ Rerun profile"):
+            st.dataframe(load_profiler().summary(), hide_index=True)
+
     # Sidebar Information
+    rerun.section("sidebar info")
     with st.sidebar.expander("ℹ️ More Information"):
         st.markdown("## 📌 About This Project")
         st.write(
@@ -298,12 +587,8 @@ elif page == "Dashboard":
 
 # Feedback form
 elif page == "Feedback":
-    
+    rerun.section("feedback")
     # Load secrets from secrets.toml
-    smtp_server = st.secrets["email"]["smtp_server"]
-    smtp_port = st.secrets["email"]["smtp_port"]
-    smtp_user = st.secrets["email"]["smtp_user"]
-    smtp_password = st.secrets["email"]["smtp_password"]
     sender_email = st.secrets["email"]["sender_email"]
     receiver_emails = st.secrets["email"]["receiver_emails"]
 
@@ -315,24 +600,19 @@ elif page == "Feedback":
     if st.button("Submit"):
         if name and email and message:
             try:
-                msg = MIMEMultipart()
-                msg["From"] = sender_email
-                msg["To"] = ", ".join(receiver_emails)
-                msg["Subject"] = f"Feedback from {name}"
                 body = f"Name: {name}\nEmail: {email}\n\nFeedback:\n{message}"
-                msg.attach(MIMEText(body, "plain"))
-
-                with smtplib.SMTP(smtp_server, smtp_port) as server:
-                    server.starttls()
-                    server.login(smtp_user, smtp_password)
-                    server.sendmail(sender_email, receiver_emails, msg.as_string())
+                # Returns once the message is saved; delivery and retries happen in the background
+                load_mail_worker().submit(sender_email, receiver_emails, f"Feedback from {name}", body)
 
                 st.success("✅ Thank you for your feedback! We've received your message.")
             except Exception as e:
-                st.error(f"❌ Failed to send feedback. Error: {str(e)}")
+                st.error(f"❌ Failed to save feedback. Error: {str(e)}")
         else:
             st.warning("⚠️ Please fill in all fields before submitting.")
 
+# Hand this rerun's timings to the profiler
+rerun.finish()
+
 
 
 
@@ -0,0 +1,235 @@
+# Benchmark: rerun latency of app.py with many sessions clicking through it at once, headless via AppTest
+#
+#   python benchmarks/bench_app_load.py [--sessions 1,4,8] [--processes 1] [--rounds 2] [--think 0]
+#
+# Each process stands for one Streamlit server: it runs --sessions sessions
+# in threads sharing its caches, after one unmeasured warm-up session.
+# The data is "data .csv" unless AQ_DATA_PATH says otherwise.
+# Every session is logged in with a session token and then, --rounds times,
+# opens the Dashboard, picks a city, a pollutant and a rolling-average
+# pollutant, pages the raw table, zooms the trend chart, and visits the
+# Feedback and Home pages; each of those is one rerun. Reported:
+#   client  - p50/p95/p99 of each step, as AppTest sees it (script plus
+#             AppTest's own handling of the result)
+#   server  - the app's own rerun profile (rerun_profiler.py) per section,
+#             read back from the AQ_PROFILE_LOG files of the processes
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+APP = os.path.join(ROOT, "app.py")
+# The Feedback page only reads the addresses; nothing is submitted
+SECRETS = {"email": {"sender_email": "bench@example.com", "receiver_emails": ["bench@example.com"]}}
+POLLUTANTS = ["PM2.5", "PM10", "NO2", "SO2", "CO", "O3"]
+STEPS = ["open", "dashboard", "city", "pollutant", "rolling pollutant", "table page", "zoom", "feedback", "home"]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def share_server_state():
+    """Let AppTest sessions in threads share what the sessions of one server share
+
+    AppTest runs one session at a time: every run compiles the script with a
+    fresh cache, and switches the process to test mode with a stand-in
+    Runtime and its secrets, undoing that when the run ends. Run side by
+    side, compiles race (CPython's compiler is not thread-safe) and one
+    session's run loses test mode, the Runtime or the secrets when another's
+    ends. Here all sessions use one script cache and one set of secrets, the
+    process stays in test mode, and the last stand-in Runtime stays available
+    between runs, as a server's would.
+    """
+    import streamlit as st
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.runtime.secrets import Secrets
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    config.set_option("global.appTest", True)
+    st.secrets = Secrets()
+    st.secrets._secrets = SECRETS
+
+    script_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+    last = []
+
+    def instance(cls):
+        if cls._instance is not None:
+            last[:] = [cls._instance]
+        if not last:
+            raise RuntimeError("Runtime hasn't been created!")
+        return cls._instance or last[0]
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or bool(last))
+
+
+def _widget(widgets, label):
+    widget = next((w for w in widgets if w.label == label), None)
+    if widget is None:
+        raise LookupError(f"no widget labelled {label!r} on the page")
+    return widget
+
+
+def session(token, seed, rounds, think, timings, errors):
+    """One user clicking through the app; appends (step, seconds) to timings"""
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    at = AppTest.from_file(APP, default_timeout=600)
+    # Logging in through the form would sleep a second before its rerun; this is the state it leaves behind
+    at.session_state["authenticated"] = True
+    at.session_state["session_token"] = token
+    at.session_state["theme"] = "light"
+
+    def step(name, action):
+        start = time.perf_counter()
+        action().run()
+        timings.append((name, time.perf_counter() - start))
+        errors.extend(f"{name}: {e.value}" for e in at.exception)
+        if think:
+            time.sleep(rng.uniform(0, 2 * think))
+
+    try:
+        clicks(at, rng, rounds, step)
+    except Exception as e:
+        # A widget that is missing or an exception in the app ends this session, not the whole run
+        errors.append(f"session stopped: {e!r}")
+
+
+def clicks(at, rng, rounds, step):
+    step("open", lambda: at)
+    full_range = None
+    for _ in range(rounds):
+        step("dashboard", lambda: _widget(at.button, "📊 Dashboard").click())
+        cities = [c for c in _widget(at.selectbox, "Select a City").options if c != "All"]
+        city = rng.choice(cities)
+        step("city", lambda: _widget(at.selectbox, "Select a City").select(city))
+        step("pollutant", lambda: _widget(at.selectbox, "Select a Pollutant").select(rng.choice(POLLUTANTS)))
+        step("rolling pollutant", lambda: _widget(at.selectbox, "Pollutant").select(rng.choice(["AQI", *POLLUTANTS[:5]])))
+        step("table page", lambda: at.number_input(key="raw_page").increment())
+        zoom = _widget(at.slider, "Zoom to dates")
+        # The slider starts out covering every date
+        full_range = full_range or zoom.value
+        first, last = full_range
+        start = first + (last - first) * rng.uniform(0, 0.7)
+        step("zoom", lambda: zoom.set_range(start, min(start + (last - first) * rng.uniform(0.1, 0.3), last)))
+        step("feedback", lambda: _widget(at.button, "💬 Feedback").click())
+        step("home", lambda: _widget(at.button, "🏠 Home").click())
+
+
+def worker(index, sessions, rounds, think, tmp, barrier, results):
+    warnings.filterwarnings("ignore")
+    os.environ["AQ_PROFILE_LOG"] = os.path.join(tmp, f"profile-{index}.jsonl")
+    os.environ["AQ_PROFILE_PROM"] = os.path.join(tmp, f"metrics-{index}.prom")
+    os.environ["AQ_USERS_PATH"] = os.path.join(tmp, "users.sqlite")
+    os.environ.setdefault("AQ_DATA_PATH", os.path.join(ROOT, "data .csv"))
+    from user_store import UserStore
+
+    share_server_state()
+
+    token = UserStore().issue_token("admin")
+    # Loads the data, builds the aggregates and renders the default charts, as the first visitor of a server would
+    session(token, -1 - index, 1, 0, [], [])
+
+    timings, errors = [], []
+    barrier.wait()
+    started = time.time()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(token, index * 1000 + i, rounds, think, timings, errors)) for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((timings, errors, time.perf_counter() - start, started))
+
+
+def run(sessions, processes, rounds, think):
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        barrier = context.Barrier(processes)
+        results = context.Queue()
+        procs = [context.Process(target=worker, args=(i, sessions, rounds, think, tmp, barrier, results)) for i in range(processes)]
+        for proc in procs:
+            proc.start()
+        reports = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+
+        records = []
+        for i in range(processes):
+            path = os.path.join(tmp, f"profile-{i}.jsonl")
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    records.extend(json.loads(line) for line in f)
+        # Reruns of the warm-up sessions are left out
+        started = min(report[3] for report in reports)
+        records = [r for r in records if r["time"] >= started]
+        prom_series = 0
+        for i in range(processes):
+            path = os.path.join(tmp, f"metrics-{i}.prom")
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    prom_series += sum(1 for line in f if line.strip() and not line.startswith("#"))
+    timings = [t for report in reports for t in report[0]]
+    errors = [e for report in reports for e in report[1]]
+    wall = max(report[2] for report in reports)
+    return timings, errors, wall, records, prom_series
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", default="1,4,8", help="concurrent sessions per process, comma separated")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--think", type=float, default=0.0, help="mean seconds a user waits between clicks")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPU, {args.processes} process(es), {args.rounds} round(s) of {len(STEPS) - 1} clicks per session\n")
+    for sessions in [int(n) for n in args.sessions.split(",")]:
+        timings, errors, wall, records, prom_series = run(sessions, args.processes, args.rounds, args.think)
+        total = sessions * args.processes
+        latencies = [t for _, t in timings]
+        print(f"== {total} concurrent session(s): {len(timings)} reruns in {wall:.1f} s, {len(timings) / wall:.2f} reruns/s, "
+              f"{len(errors)} exception(s)")
+        for error in errors[:3]:
+            print(f"   {error}")
+        print(f"{'client step':<22} {'reruns':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name in [*STEPS, "all"]:
+            values = latencies if name == "all" else [t for n, t in timings if n == name]
+            if values:
+                print(f"{name:<22} {len(values):>7} {percentile(values, 0.5) * 1000:>9.0f} {percentile(values, 0.95) * 1000:>9.0f} "
+                      f"{percentile(values, 0.99) * 1000:>9.0f}")
+
+        dashboard = [r for r in records if r["page"] == "Dashboard" and r["kind"] == "script"]
+        if dashboard:
+            print(f"\n{'server: Dashboard':<22} {'runs':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'cpu ms':>9} {'rss kB':>9}")
+            sections = {}
+            for record in dashboard:
+                sections.setdefault("(whole rerun)", []).append((record["ms"], record["cpu_ms"], record["rss_change_kb"] or 0))
+                for name, s in record["sections"].items():
+                    sections.setdefault(name, []).append((s["ms"], s["cpu_ms"], s["rss_change_kb"]))
+            for name, values in sections.items():
+                ms = [v[0] for v in values]
+                print(f"{name:<22} {len(ms):>7} {percentile(ms, 0.5):>9.1f} {percentile(ms, 0.95):>9.1f} {percentile(ms, 0.99):>9.1f} "
+                      f"{sum(v[1] for v in values) / len(values):>9.1f} {sum(v[2] for v in values) / len(values):>9.0f}")
+        hits = sum(r["caches"].get("figures", {}).get("hits", 0) for r in records)
+        misses = sum(r["caches"].get("figures", {}).get("misses", 0) for r in records)
+        print(f"\nfigure cache during the run: {hits} hits, {misses} misses; Prometheus file: {prom_series} series\n")
+
+
+if __name__ == "__main__":
+    main()
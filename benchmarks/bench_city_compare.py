@@ -0,0 +1,132 @@
+# Benchmark: comparing many cities over a period, CityComparison vs pandas, on synthetic stations
+#
+#   python benchmarks/bench_city_compare.py [--pandas-max-cities 200] [--max-lag 7]
+#
+# Stations get one row per day over five years (5% of days missing, 10% of
+# values missing), as in bench_daily_series.py. Each query compares every
+# station over the middle two years of one pollutant: the aligned daily
+# matrix, pairwise correlations, the best lag of every pair within
+# --max-lag days, and monthly ranks with their changes. pandas does the
+# same with a filter and pivot_table, DataFrame.corr(min_periods), one
+# shifted concat().corr() per lag, and groupby(Grouper).mean().rank(); it
+# is checked for parity on the smallest size. "build" is the one-off cost
+# of the engine's grid for the first pollutant; queries reuse it.
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_daily_series import make_stations
+from city_compare import MIN_OVERLAP_DAYS, CityComparison
+
+SIZES = [25, 100, 200, 400, 800]
+YEARS = 5
+POLLUTANT = "PM2.5"
+START, END = "2001-06-01", "2003-05-31"
+STEPS = ["aligned", "correlations", "lags", "ranks"]
+
+
+def with_engine(comparison, cities, max_lag):
+    return {
+        "aligned": lambda: comparison.aligned(cities, POLLUTANT, START, END),
+        "correlations": lambda: comparison.correlations(cities, POLLUTANT, START, END),
+        "lags": lambda: comparison.lags(cities, POLLUTANT, START, END, max_lag),
+        "ranks": lambda: (comparison.ranks(cities, POLLUTANT, START, END), comparison.rank_changes(cities, POLLUTANT, START, END)),
+    }
+
+
+def with_pandas(df, cities, max_lag):
+    def aligned():
+        rows = df[df["City"].isin(cities) & (df["Date"] >= START) & (df["Date"] <= END)]
+        # Shifting by rows only shifts by days on a full calendar
+        return rows.pivot_table(index="Date", columns="City", values=POLLUTANT).reindex(pd.date_range(START, END, name="Date"))
+
+    def lags():
+        matrix = aligned()
+        n = matrix.shape[1]
+        stack = []
+        for lag in range(-max_lag, max_lag + 1):
+            both = pd.concat([matrix, matrix.shift(-lag).add_suffix(" ahead")], axis=1)
+            stack.append(both.corr(min_periods=MIN_OVERLAP_DAYS).to_numpy()[:n, n:])
+        stack = np.stack(stack)
+        best = np.argmax(np.where(np.isnan(stack), -np.inf, stack), axis=0)
+        return best - max_lag, np.take_along_axis(stack, best[None], axis=0)[0]
+
+    def ranks():
+        rows = df[df["City"].isin(cities) & (df["Date"] >= START) & (df["Date"] <= END)]
+        means = rows.groupby([pd.Grouper(key="Date", freq="MS"), "City"])[POLLUTANT].mean().unstack()
+        ranks = means.rank(axis=1, ascending=False, method="first")
+        return ranks, ranks.shift() - ranks
+
+    return {
+        "aligned": aligned,
+        "correlations": lambda: aligned().corr(min_periods=MIN_OVERLAP_DAYS),
+        "lags": lags,
+        "ranks": ranks,
+    }
+
+
+def check_parity(engine, pandas):
+    mine, theirs = engine["aligned"](), pandas["aligned"]()
+    np.testing.assert_array_equal(mine.to_numpy(), theirs[mine.columns].to_numpy())
+    mine, theirs = engine["correlations"](), pandas["correlations"]()
+    np.testing.assert_allclose(mine.to_numpy(), theirs.loc[mine.index, mine.columns].to_numpy(), atol=1e-9)
+    (lag, corr), (their_lag, their_corr) = engine["lags"](), pandas["lags"]()
+    np.testing.assert_allclose(corr.to_numpy(), their_corr, atol=1e-9)
+    # Equal correlations at two lags (to rounding) may pick either; compare the lags where the best is clear
+    clear = ~np.isnan(their_corr) & ~np.eye(len(their_corr), dtype=bool)
+    assert (lag.to_numpy()[clear] == their_lag[clear]).mean() > 0.99
+    (ranks, changes), (their_ranks, their_changes) = engine["ranks"](), pandas["ranks"]()
+    np.testing.assert_array_equal(ranks.to_numpy(), their_ranks[ranks.columns].to_numpy())
+    np.testing.assert_array_equal(changes.to_numpy(), their_changes[changes.columns].to_numpy())
+
+
+def best_of(fn, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pandas-max-cities", type=int, default=200)
+    parser.add_argument("--max-lag", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPU, {YEARS} years, {POLLUTANT} from {START} to {END}, lags up to {args.max_lag} days; milliseconds\n")
+    print(f"{'cities':>6} {'rows':>10} {'build':>8} " + " ".join(f"{s:>13}" for s in STEPS) + f" {'query':>8} {'pandas':>9} {'speed-up':>9}")
+    for i, n in enumerate(SIZES):
+        df = make_stations(n, YEARS)
+        start = time.perf_counter()
+        comparison = CityComparison(df)
+        comparison.matrix(POLLUTANT)
+        build = (time.perf_counter() - start) * 1000
+        cities = comparison.cities
+
+        engine = with_engine(comparison, cities, args.max_lag)
+        steps = {name: best_of(fn) * 1000 for name, fn in engine.items()}
+        query = sum(steps.values())
+
+        pandas_ms = speed_up = "-"
+        if n <= args.pandas_max_cities:
+            pandas = with_pandas(df, cities, args.max_lag)
+            if i == 0:
+                check_parity(engine, pandas)
+            theirs = sum(best_of(fn, 1) for fn in pandas.values()) * 1000
+            pandas_ms, speed_up = f"{theirs:.0f}", f"{theirs / query:.0f}x"
+        print(f"{n:>6} {len(df):>10,} {build:>8.0f} " + " ".join(f"{steps[s]:>13.1f}" for s in STEPS)
+              + f" {query:>8.0f} {pandas_ms:>9} {speed_up:>9}")
+    print("\nparity: aligned matrix, correlations, best lags and monthly ranks match pandas on the first size")
+
+
+if __name__ == "__main__":
+    main()
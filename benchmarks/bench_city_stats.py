@@ -0,0 +1,104 @@
+# Benchmark: per-city chatbot answers, pandas filters over the frame vs the city stats table
+#
+#   python benchmarks/bench_city_stats.py ["data .csv"] [copies]
+#
+# The frame is tiled `copies` times (dates shifted by whole years) to show that
+# lookups stay flat as the data grows. Also checks that building the table in
+# two incremental batches gives the same statistics as building it at once.
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from city_stats import PERCENTILES, CityStats
+from data_store import read_csv
+
+QUERIES = [
+    ("AQI in Delhi", "Delhi", "AQI", None),
+    ("PM2.5 in Lucknow in 2019", "Lucknow", "PM2.5", 2019),
+    ("Mumbai air quality", "Mumbai", "AQI", None),
+    ("NO2 levels in Kolkata", "Kolkata", "NO2", None),
+]
+
+
+def pandas_answer(df, city, pollutant, year):
+    """What each question costs without the table: filter, then reduce"""
+    rows = df[df["City"] == city]
+    if year is not None:
+        rows = rows[rows["Date"].dt.year == year]
+    values = rows[pollutant].dropna()
+    return values.mean(), values.quantile(PERCENTILES).to_numpy(), values.max()
+
+
+def tile(df, copies):
+    parts = []
+    for i in range(copies):
+        part = df.copy()
+        part["Date"] = part["Date"] + pd.DateOffset(years=6 * i)
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def check_incremental(df):
+    shuffled = df.sample(frac=1, random_state=0)
+    half = len(shuffled) // 2
+    incremental = CityStats(shuffled.iloc[:half])
+    incremental.update(shuffled.iloc[half:])
+    full = CityStats(df)
+    assert full.entries.keys() == incremental.entries.keys()
+    for key, a in full.entries.items():
+        b = incremental.entries[key]
+        assert a["count"] == b["count"] and np.isclose(a["sum"], b["sum"]), key
+        assert np.allclose(a["percentiles"], b["percentiles"]), key
+        assert (a["worst_value"], a["latest_date"]) == (b["worst_value"], b["latest_date"]), key
+        assert a["years"].keys() == b["years"].keys(), key
+    assert full.buckets == incremental.buckets
+
+
+def main():
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "data .csv")
+    copies = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    base = read_csv(csv_path)
+    check_incremental(base)
+    print("incremental update matches a full build")
+
+    df = tile(base, copies)
+    stats, build = timed(lambda: CityStats(df), 1)
+    print(f"table build: {build * 1000:.0f} ms for {len(df):,} rows, {len(stats.entries):,} city/pollutant entries")
+
+    for city, pollutant, year in [(c, p, y) for _, c, p, y in QUERIES]:
+        expected, _ = timed(lambda: pandas_answer(df, city, pollutant, year), 1)
+        if year is None:
+            entry = stats.get(city, pollutant)
+            assert np.isclose(stats.mean(city, pollutant), expected[0])
+            assert np.allclose(entry["percentiles"], expected[1]) and entry["worst_value"] == expected[2]
+        else:
+            assert np.isclose(stats.mean(city, pollutant, year), expected[0])
+
+    print(f"\n{'query':<28} {'pandas ms':>10} {'table ms':>9}")
+    for query, city, pollutant, year in QUERIES:
+        _, old = timed(lambda: pandas_answer(df, city, pollutant, year), 3)
+        _, new = timed(lambda: stats.answer(query), 50)
+        print(f"{query:<28} {old * 1000:>10.2f} {new * 1000:>9.3f}")
+
+    batch = base.sample(n=min(1000, len(base)), random_state=1)
+    _, refresh = timed(lambda: stats.update(batch), 1)
+    print(f"\nincremental refresh of {len(batch):,} new rows: {refresh * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# Benchmark: rolling means and WHO exceedance streaks, DailySeries vs pandas, on synthetic stations
+#
+#   python benchmarks/bench_daily_series.py [--pandas-max-rows 2000000]
+#
+# Stations get one row per day (5% of days missing, 10% of values missing)
+# for every pollutant of the dataset. The table grows along both axes, more
+# stations and more years; time per row should stay flat if the cost is
+# linear. pandas does the same work with groupby().rolling("<w>D") and a
+# run-length pass for the streaks, and is checked for parity on the
+# smallest size. "append day" is the mean time to fold one new day for every
+# station into an existing series, over APPEND_DAYS days appended one at a
+# time (it includes the occasional regrowth of the day grid).
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from daily_series import WHO_LIMITS, WINDOWS, DailySeries
+from query_engine import POLLUTANTS
+
+COLUMNS = [p for p in POLLUTANTS if p != "Xylene"]
+
+SIZES = [(25, 5), (100, 5), (400, 5), (100, 10), (100, 20)]
+
+APPEND_DAYS = 60
+
+
+def make_stations(stations, years, seed=0):
+    rng = np.random.default_rng(seed)
+    days = pd.date_range("2000-01-01", periods=365 * years, freq="D")
+    cities = np.repeat([f"Station {i:04d}" for i in range(stations)], len(days))
+    dates = np.tile(days.to_numpy(), stations)
+    keep = rng.random(len(dates)) > 0.05
+    df = pd.DataFrame({"City": cities[keep], "Date": dates[keep]})
+    for column in COLUMNS:
+        values = rng.gamma(2.0, WHO_LIMITS.get(column, 20.0) / 1.5, len(df))
+        values[rng.random(len(df)) < 0.1] = np.nan
+        df[column] = values
+    return df
+
+
+def with_pandas(df):
+    """Rolling means per window and longest exceedance streak per city and WHO pollutant"""
+    indexed = df.set_index("Date")
+    rolling = {w: indexed.groupby("City")[COLUMNS].rolling(f"{w}D").mean() for w in WINDOWS}
+    streaks = {}
+    for city, part in indexed.groupby("City"):
+        grid = part.reindex(pd.date_range(part.index.min(), part.index.max()))
+        for pollutant, limit in WHO_LIMITS.items():
+            exceeded = grid[pollutant] > limit
+            runs = exceeded.groupby((~exceeded).cumsum()).cumsum()
+            streaks[city, pollutant] = int(runs.max())
+    return rolling, streaks
+
+
+def check_parity(df, series, rolling, streaks):
+    for city in list(series.cities)[:5]:
+        part = df[df["City"] == city].set_index("Date")
+        for pollutant in ["AQI", "PM2.5"]:
+            mine = series.rolling(city, pollutant).reindex(part.index)
+            for w in WINDOWS:
+                expected = rolling[w].loc[city, pollutant].to_numpy()
+                present = ~np.isnan(part[pollutant].to_numpy())
+                # pandas also reports means on days whose own value is missing; compare where it exists
+                np.testing.assert_allclose(mine[f"{w}-day"].to_numpy()[present], expected[present], rtol=1e-9)
+        for pollutant in WHO_LIMITS:
+            assert series.exceedances(city, pollutant)["longest"] == streaks[city, pollutant], (city, pollutant)
+
+
+def best_of(fn, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pandas-max-rows", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    print(f"{'stations':>8} {'years':>5} {'rows':>10} {'build s':>8} {'ns/row':>7} {'pandas s':>9} "
+          f"{'append day ms':>14} {'query ms':>9}")
+    for i, (stations, years) in enumerate(SIZES):
+        df = make_stations(stations, years)
+        build = best_of(lambda: DailySeries(df), 1 if len(df) > 1_000_000 else 3)
+        series = DailySeries(df)
+
+        pandas_s = "-"
+        if len(df) <= args.pandas_max_rows:
+            start = time.perf_counter()
+            rolling, streaks = with_pandas(df)
+            pandas_s = f"{time.perf_counter() - start:.2f}"
+            if i == 0:
+                check_parity(df, series, rolling, streaks)
+
+        last = df["Date"].max()
+        extra = make_stations(stations, 1, seed=1)
+        days = [extra[extra["Date"] == day] for day in np.sort(extra["Date"].unique())[:APPEND_DAYS]]
+        start = time.perf_counter()
+        for offset, day in enumerate(days, 1):
+            series.update(day.assign(Date=last + pd.Timedelta(days=offset)))
+        append_ms = (time.perf_counter() - start) * 1000 / len(days)
+
+        city = next(iter(series.cities))
+        start = time.perf_counter()
+        series.rolling(city, "PM2.5")
+        series.exceedance_table(city)
+        query_ms = (time.perf_counter() - start) * 1000
+        print(f"{stations:>8} {years:>5} {len(df):>10,} {build:>8.2f} {build / len(df) * 1e9:>7.0f} {pandas_s:>9} "
+              f"{append_ms:>14.1f} {query_ms:>9.2f}")
+    print("\nparity: rolling means and longest streaks match pandas on the first size")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Benchmark: full-dataset download, in-memory to_csv vs the streaming exporter
+#
+#   python benchmarks/bench_data_export.py ["data .csv"] [--copies 10]
+#
+# The dataset is tiled --copies times (each copy shifted by six years) to
+# stand in for a larger table. Every method runs in a fresh interpreter.
+# "first byte" is when the first bytes of the file are ready to send, and
+# "peak MB" is the highest resident memory above what the loaded frame
+# already used, sampled every millisecond.
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+METHODS = ["to_csv (old)", "CSV (gzip)", "Parquet", "Arrow IPC"]
+
+CHILD = r"""
+import gc, json, sys, threading, time
+import numpy as np, pandas as pd, psutil
+sys.path.insert(0, {root!r})
+from data_store import read_csv
+from data_export import iter_export
+
+df = read_csv({csv_path!r})
+df["Month"] = df["Date"].dt.month
+df = pd.concat([df.assign(Date=df["Date"] + pd.DateOffset(years=6 * i)) for i in range({copies})], ignore_index=True)
+df["City"] = df["City"].astype("category")
+rows, columns = np.arange(len(df)), list(df.columns)
+gc.collect()
+
+process = psutil.Process()
+baseline = peak = process.memory_info().rss
+done = False
+
+def sample():
+    global peak
+    while not done:
+        peak = max(peak, process.memory_info().rss)
+        time.sleep(0.001)
+
+sampler = threading.Thread(target=sample)
+sampler.start()
+start = time.perf_counter()
+if {method!r} == "to_csv (old)":
+    data = df.to_csv(index=False).encode("utf-8")
+    first = time.perf_counter()
+    size = len(data)
+    del data
+else:
+    first, size = None, 0
+    for chunk in iter_export(df, rows, columns, {method!r}):
+        first = first or time.perf_counter()
+        size += len(chunk)
+total = time.perf_counter() - start
+done = True
+sampler.join()
+print(json.dumps({{"rows": len(df), "first": first - start, "total": total, "size": size, "peak_mb": (peak - baseline) / 1024 / 1024}}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("csv_path", nargs="?", default=os.path.join(ROOT, "data .csv"))
+    parser.add_argument("--copies", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'method':<14} {'first byte s':>13} {'total s':>8} {'size MB':>8} {'peak MB':>8}")
+    for method in METHODS:
+        code = CHILD.format(root=ROOT, csv_path=os.path.abspath(args.csv_path), copies=args.copies, method=method)
+        result = json.loads(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout)
+        print(f"{method:<14} {result['first']:>13.3f} {result['total']:>8.2f} {result['size'] / 1024 / 1024:>8.1f} {result['peak_mb']:>8.0f}")
+    print(f"({result['rows']:,} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# Benchmark: cold-start time and memory of the CSV path vs the memory-mapped store
+#
+#   python benchmarks/bench_data_store.py ["data .csv"] [--scales 1 10 100]
+#
+# Each measurement runs in a fresh interpreter so nothing is shared with the parent.
+# Memory figures come from /proc, so the benchmark needs Linux.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CHILD = r"""
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+os.environ["AQ_CACHE_DIR"] = {cache_dir!r}
+start = time.perf_counter()
+import pandas as pd
+import data_store
+if {mode!r} == "csv":
+    df = data_store.read_csv({csv_path!r})
+else:
+    df = data_store.load_dataset({csv_path!r})
+df["Month"] = df["Date"].dt.month
+elapsed = time.perf_counter() - start
+def read_kb(path, keys):
+    with open(path) as f:
+        fields = dict(line.split(":", 1) for line in f if ":" in line)
+    return sum(int(fields[k].split()[0]) for k in keys if k in fields)
+# Peak RSS of this process, and the part of the current RSS not shareable with other workers
+print(json.dumps({{"seconds": elapsed, "max_rss_mb": read_kb("/proc/self/status", ["VmHWM"]) / 1024,
+                   "private_mb": read_kb("/proc/self/smaps_rollup", ["Private_Clean", "Private_Dirty"]) / 1024,
+                   "rows": len(df)}}))
+"""
+
+
+def make_scaled_csv(csv_path, scale, out_dir):
+    """Write a copy of csv_path with its rows repeated scale times"""
+    if scale == 1:
+        return csv_path
+    out_path = os.path.join(out_dir, f"data_x{scale}.csv")
+    with open(csv_path) as src:
+        header = src.readline()
+        body = src.read()
+    if not body.endswith("\n"):
+        body += "\n"
+    with open(out_path, "w") as dst:
+        dst.write(header)
+        for _ in range(scale):
+            dst.write(body)
+    return out_path
+
+
+def run_child(mode, csv_path, cache_dir):
+    code = CHILD.format(root=ROOT, cache_dir=cache_dir, mode=mode, csv_path=csv_path)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare CSV and columnar store cold starts")
+    parser.add_argument("csv_path", nargs="?", default=os.path.join(ROOT, "data .csv"))
+    parser.add_argument("--scales", nargs="+", type=int, default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "cache")
+        os.environ["AQ_CACHE_DIR"] = cache_dir
+        import data_store
+        data_store.CACHE_DIR = cache_dir
+
+        print(f"{'scale':>6} {'rows':>10} {'mode':>6} {'cold s':>8} {'max RSS MB':>11} {'private MB':>11}")
+        for scale in args.scales:
+            csv_path = make_scaled_csv(args.csv_path, scale, tmp)
+            start = time.perf_counter()
+            data_store.build_store(csv_path)
+            build_seconds = time.perf_counter() - start
+            for mode in ("csv", "store"):
+                runs = [run_child(mode, csv_path, cache_dir) for _ in range(args.repeat)]
+                best = min(runs, key=lambda r: r["seconds"])
+                print(f"{scale:>5}x {best['rows']:>10} {mode:>6} {best['seconds']:>8.3f} {best['max_rss_mb']:>11.1f} {best['private_mb']:>11.1f}")
+            print(f"{'':>6} {'':>10} {'build':>6} {build_seconds:>8.3f}  (one-off conversion)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Benchmark: "AQI Trends Over Time" payload and build time with and without downsampling
+#
+#   python benchmarks/bench_downsample.py ["data .csv"] [--scales 1 10 100]
+#
+# A scale of k extends every city's series k times along the time axis, standing in
+# for denser station data. "payload" is the Plotly JSON Streamlit sends to the browser
+# and "build" the server-side time to make the figure and serialize it. Browser paint
+# time is not measured here; it grows with the number of points shipped.
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+import plotly.express as px
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data_store import read_csv
+from downsample import CHART_WIDTH_PX, SeriesDownsampler
+
+
+def stretch(df, scale):
+    """Repeat each city's series scale times, shifting dates past the previous copy"""
+    if scale == 1:
+        return df
+    span = df["Date"].max() - df["Date"].min() + pd.Timedelta(days=1)
+    copies = [df.assign(Date=df["Date"] + span * k) for k in range(scale)]
+    return pd.concat(copies, ignore_index=True)
+
+
+def measure(frame):
+    start = time.perf_counter()
+    fig = px.line(frame, x="Date", y="AQI", color="City", title="AQI Trends Over Time")
+    payload = fig.to_json()
+    return len(payload.encode("utf-8")), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure trend chart payloads")
+    parser.add_argument("csv_path", nargs="?", default=os.path.join(ROOT, "data .csv"))
+    parser.add_argument("--scales", nargs="+", type=int, default=[1, 10, 100])
+    parser.add_argument("--width", type=int, default=CHART_WIDTH_PX)
+    args = parser.parse_args()
+
+    base = read_csv(args.csv_path)
+    print(f"{'scale':>6} {'filter':>7} {'points':>10} {'payload MB':>11} {'build s':>8} {'':>3} {'points':>8} {'payload MB':>11} {'build s':>8} {'cached s':>9}")
+    for scale in args.scales:
+        df = stretch(base, scale)
+        downsampler = SeriesDownsampler(df)
+        for label, cities in (("All", None), ("1 city", downsampler.groups[:1])):
+            full = df if cities is None else df[df["City"].isin(cities)]
+            full_bytes, full_seconds = measure(full)
+
+            start = time.perf_counter()
+            reduced = downsampler.frame(cities, budget=args.width)
+            reduced_bytes, _ = measure(reduced)
+            cold = time.perf_counter() - start
+
+            start = time.perf_counter()
+            measure(downsampler.frame(cities, budget=args.width))
+            cached = time.perf_counter() - start
+            print(f"{scale:>5}x {label:>7} {len(full):>10} {full_bytes / 1e6:>11.2f} {full_seconds:>8.2f} {'->':>3} "
+                  f"{len(reduced):>8} {reduced_bytes / 1e6:>11.2f} {cold:>8.2f} {cached:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# Benchmark: Dataset Explorer charts rendered on every rerun vs served from the figure cache
+#
+#   python benchmarks/bench_figure_cache.py ["data .csv"] [--reruns 300] [--cache-mb 64]
+#
+# "Render" is what reaches the browser: Plotly figures are built and turned
+# into the JSON spec st.plotly_chart sends, the heatmap into the PNG st.pyplot
+# sends. Also checks the per-city correlation sums against pandas, including
+# after incremental updates, and replays random filter changes to report the
+# hit rate for a given cache size.
+import argparse
+import os
+import random
+import sys
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+import seaborn as sns
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data_store import read_csv
+from figure_cache import FigureCache, plotly_figure, plotly_payload, png_payload
+from rollups import CorrStats, build_cube
+
+POLLUTANTS = ["PM2.5", "PM10", "NO2", "SO2", "CO", "O3"]
+
+
+def best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def charts(df, cube, city, pollutant):
+    """(name, builder, kind) of every cached chart for one filter, as app.py draws them"""
+    df_filtered = df if city == "All" else df[df["City"] == city]
+
+    def heatmap():
+        fig, ax = plt.subplots(figsize=(8, 6))
+        sns.heatmap(cube.corr(city), annot=True, cmap="coolwarm", fmt=".2f", ax=ax)
+        return fig
+
+    return [
+        ("city_aqi_bar", lambda: px.bar(cube.city_means("AQI"), x="City", y="AQI", color="AQI", height=600), "plotly"),
+        ("pollutant_box", lambda: px.box(df_filtered, x="City", y=pollutant), "plotly"),
+        ("corr_heatmap", heatmap, "png"),
+        ("monthly_aqi", lambda: px.line(cube.monthly_means(city, "AQI"), x="Month", y="AQI", markers=True), "plotly"),
+    ]
+
+
+def check_corr(df, cube):
+    columns = cube.corr_columns
+    for cities in [None, ["Delhi"], ["Delhi", "Mumbai", "Chennai"], cube.cities[:10]]:
+        rows = df if cities is None else df[df["City"].isin(cities)]
+        pd.testing.assert_frame_equal(rows[columns].corr(), cube.corr_stats.corr(cities), rtol=1e-9, atol=1e-9)
+
+    # Built from the first 80% of days, then the rest folded in, then one city's rows replaced
+    order = df.sort_values("Date", kind="stable")
+    cut = int(len(order) * 0.8)
+    stats = CorrStats.from_frame(order.iloc[:cut], columns)
+    start = time.perf_counter()
+    stats.update(order.iloc[cut:])
+    update_ms = (time.perf_counter() - start) * 1000
+    pd.testing.assert_frame_equal(df[columns].corr(), stats.corr(), rtol=1e-9, atol=1e-9)
+
+    delhi = df[df["City"] == "Delhi"]
+    corrected = delhi.copy()
+    corrected["PM2.5"] = corrected["PM2.5"] * 1.1
+    stats.update(delhi, sign=-1)
+    stats.update(corrected)
+    expected = pd.concat([df[df["City"] != "Delhi"], corrected])[columns].corr()
+    pd.testing.assert_frame_equal(expected, stats.corr(), rtol=1e-9, atol=1e-9)
+    return update_ms, len(order) - cut
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("csv_path", nargs="?", default=os.path.join(ROOT, "data .csv"))
+    parser.add_argument("--reruns", type=int, default=300)
+    parser.add_argument("--cache-mb", type=float, default=64)
+    args = parser.parse_args()
+
+    df = read_csv(args.csv_path)
+    df["Month"] = df["Date"].dt.month
+    cube = build_cube(df)
+
+    update_ms, new_rows = check_corr(df, cube)
+    print(f"correlation parity: per-city sums match pandas .corr(), also after adding {new_rows:,} rows "
+          f"({update_ms:.1f} ms) and replacing one city's rows")
+    columns = cube.corr_columns
+    group = ["Delhi", "Mumbai", "Chennai"]
+    pandas_ms = best_of(lambda: df[df["City"].isin(group)][columns].corr(), 20)
+    sums_ms = best_of(lambda: cube.corr_stats.corr(group), 20)
+    print(f"corr of {len(group)} cities: pandas {pandas_ms:.2f} ms, from sums {sums_ms:.3f} ms\n")
+
+    # Per chart: rendered on every rerun (the old path) vs a cache hit turned back into what Streamlit sends
+    cache = FigureCache()
+    print(f"{'chart':<16} {'render ms':>10} {'hit ms':>8} {'payload KB':>11}")
+    for name, build, kind in charts(df, cube, "All", "PM2.5"):
+        if kind == "plotly":
+            render = lambda: pio.to_json(build().to_dict(), validate=False)
+            payload = cache.get((name, "All"), lambda: plotly_payload(build()))
+            hit = lambda: pio.to_json(plotly_figure(cache.get((name, "All"), None)).to_dict(), validate=False)
+        else:
+            render = lambda: png_payload(build())
+            payload = cache.get((name, "All"), lambda: png_payload(build()))
+            hit = lambda: cache.get((name, "All"), None)
+        print(f"{name:<16} {best_of(render, 3):>10.1f} {best_of(hit, 20):>8.2f} {len(payload) / 1024:>11.0f}")
+
+    # Random filter changes: a few popular cities get most of the traffic
+    cities = ["All"] + cube.cities
+    weights = [1 / (i + 1) for i in range(len(cities))]
+    random.seed(0)
+    cache = FigureCache(int(args.cache_mb * 1024 * 1024))
+    start = time.perf_counter()
+    for _ in range(args.reruns):
+        city = random.choices(cities, weights)[0]
+        pollutant = random.choice(POLLUTANTS)
+        for name, build, kind in charts(df, cube, city, pollutant):
+            pollutant_key = pollutant if name == "pollutant_box" else "AQI"
+            city_key = None if name == "city_aqi_bar" else city
+            render = plotly_payload if kind == "plotly" else png_payload
+            cache.get((name, city_key, pollutant_key, "v1"), lambda: render(build()))
+    elapsed = time.perf_counter() - start
+    stats = cache.stats()
+    hits, misses = sum(s["hits"] for s in stats), sum(s["misses"] for s in stats)
+    print(f"\n{args.reruns} reruns with random filters, {args.cache_mb:g} MB cache: hit rate {hits / (hits + misses):.0%}, "
+          f"{cache.evictions} evictions, {cache.bytes / 1024 / 1024:.1f} MB held, {elapsed / args.reruns * 1000:.0f} ms per rerun")
+    print(pd.DataFrame(stats).to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+
+if __name__ == "__main__":
+    main()
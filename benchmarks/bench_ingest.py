@@ -0,0 +1,129 @@
+# Benchmark: cleaning the raw city-day file, notebook steps vs the incremental pipeline
+#
+#   python benchmarks/bench_ingest.py ["data .csv"] [copies]
+#
+# No raw file ships with the repo, so one is made from the cleaned CSV: every
+# numeric column loses 20% of its values and Xylene is added back. `copies`
+# tiles it with dates shifted by whole years. The notebook path is the
+# cleaned-data.ipynb cells (global-mean fill, KNNImputer over the whole table,
+# Series.apply bucketing); the pipeline runs once in full, then again after the
+# last 30 days are appended.
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data_store import load_dataset
+from ingest import IMPUTE_COLUMNS, aqi_bucket, ingest
+
+
+def make_raw(csv_path, copies):
+    df = pd.read_csv(csv_path)
+    df["Date"] = pd.to_datetime(df["Date"])
+    rng = np.random.default_rng(0)
+    df.insert(df.columns.get_loc("AQI"), "Xylene", rng.gamma(2.0, 2.0, len(df)).round(2))
+    parts = []
+    for i in range(copies):
+        part = df.copy()
+        part["Date"] = part["Date"] + pd.DateOffset(years=6 * i)
+        parts.append(part)
+    # Shifting 29 February lands on 28 February; keep one row per city and day
+    raw = pd.concat(parts, ignore_index=True).drop_duplicates(["City", "Date"])
+    for column in IMPUTE_COLUMNS + ["Xylene"]:
+        raw.loc[rng.random(len(raw)) < 0.2, column] = np.nan
+    return raw
+
+
+def assign_aqi_bucket(aqi):
+    if aqi <= 50:
+        return 'Good'
+    elif aqi <= 100:
+        return 'Satisfactory'
+    elif aqi <= 200:
+        return 'Moderate'
+    elif aqi <= 300:
+        return 'Poor'
+    elif aqi <= 400:
+        return 'Very Poor'
+    else:
+        return 'Severe'
+
+
+def notebook(raw_path):
+    from sklearn.impute import KNNImputer
+
+    df = pd.read_csv(raw_path)
+    df['Date'] = pd.to_datetime(df['Date'])
+    for column in ['PM2.5', 'PM10', 'NO', 'NO2', 'NOx', 'NH3', 'CO', 'SO2', 'O3', 'Benzene', 'Toluene', 'Xylene']:
+        df.loc[:, column] = df[column].fillna(df[column].mean().round(2))
+    df['AQI'] = df['AQI'].fillna(df['AQI'].median())
+    columns_to_impute = ['PM2.5', 'PM10', 'NO2', 'SO2', 'O3', 'AQI']
+    df[columns_to_impute] = KNNImputer(n_neighbors=5).fit_transform(df[columns_to_impute])
+    df['AQI_Bucket'] = df['AQI'].apply(assign_aqi_bucket)
+    return df
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "data .csv")
+    copies = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    work = tempfile.mkdtemp(prefix="bench_ingest_")
+    try:
+        raw = make_raw(csv_path, copies)
+        last_month = raw["Date"] > raw["Date"].max() - pd.Timedelta(days=30)
+        raw_path, earlier_path = os.path.join(work, "city_day.csv"), os.path.join(work, "earlier.csv")
+        raw.to_csv(raw_path, index=False)
+        raw[~last_month].to_csv(earlier_path, index=False)
+        print(f"raw file: {len(raw):,} rows, {raw[IMPUTE_COLUMNS].isna().mean().mean():.0%} of values missing\n")
+
+        aqi = raw["AQI"].fillna(raw["AQI"].median())
+        old_buckets, apply_seconds = timed(lambda: aqi.apply(assign_aqi_bucket))
+        new_buckets, digitize_seconds = timed(lambda: aqi_bucket(aqi.to_numpy()))
+        assert (old_buckets.to_numpy() == np.asarray(new_buckets).astype(object)).all()
+        print(f"bucketing: Series.apply {apply_seconds * 1000:.1f} ms, np.digitize {digitize_seconds * 1000:.1f} ms")
+
+        cleaned, seconds = timed(lambda: notebook(raw_path))
+        print(f"{'notebook (full table)':<30} {seconds:>7.2f} s {len(raw) / seconds:>12,.0f} rows/s")
+
+        full = os.path.join(work, "full")
+        result = ingest(raw_path, full)
+        print(f"{'pipeline, first run':<30} {result['seconds']:>7.2f} s {result['rows_per_second']:>12,.0f} rows/s")
+        result = ingest(raw_path, full)
+        print(f"{'pipeline, nothing new':<30} {result['seconds']:>7.2f} s {result['rows_per_second']:>12,.0f} rows/s")
+
+        incremental = os.path.join(work, "incremental")
+        ingest(earlier_path, incremental)
+        result = ingest(raw_path, incremental)
+        print(f"{'pipeline, last 30 days added':<30} {result['seconds']:>7.2f} s {result['rows_per_second']:>12,.0f} rows/s"
+              f"  ({result['rows_changed']:,} new rows, {result['rows_written']:,} written)")
+
+        a, b = load_dataset(directory=full), load_dataset(directory=incremental)
+        assert not a[IMPUTE_COLUMNS].isna().any().any() and (a[["City", "Date"]] == b[["City", "Date"]]).all().all()
+        # Only months with no reading at all fall back to the city mean, which moves as days are added
+        differ = ~np.isclose(a[IMPUTE_COLUMNS].to_numpy(), b[IMPUTE_COLUMNS].to_numpy(), rtol=0, atol=1e-9)
+        print(f"\nno gaps left; incremental run matches a full run except {differ.mean():.3%} of values "
+              f"(city-mean fallbacks for months with no readings)")
+        truth = pd.read_csv(csv_path)
+        if copies == 1:
+            held_out = raw["PM2.5"].isna().to_numpy()
+            for name, frame in [("notebook", cleaned), ("pipeline", a)]:
+                error = np.abs(frame["PM2.5"].to_numpy()[held_out] - truth["PM2.5"].to_numpy()[held_out]).mean()
+                print(f"PM2.5 mean absolute error on removed values, {name}: {error:.2f}")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Benchmark: hit rate and latency of canned-answer matching on question variants
+#
+#   python benchmarks/bench_intent_matcher.py ["data .csv"]
+#
+# The canned questions are read from chatbot.py without importing it (importing
+# starts the Streamlit UI). Variants add punctuation, contractions, casing, filler
+# words and typos; negatives are questions no canned answer should claim.
+import ast
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from intent_matcher import THRESHOLD, IntentMatcher
+
+NEGATIVES = [
+    "what is the aqi in pune", "what is the aqi in london", "who built this dashboard",
+    "how do i reset my password", "show me the pm10 trend for 2018", "what is the weather tomorrow",
+    "which month is worst for lucknow", "what is the capital of india", "how many rows are in the dataset",
+    "what is the no2 level in delhi in 2019", "compare delhi and mumbai", "tell me a joke",
+    "what is the safe level of pm10", "what is the safe level of no2", "what are the effects of pm10 on health",
+    "which city has the best air quality",
+]
+
+
+def canned_questions():
+    tree = ast.parse(open(os.path.join(ROOT, "chatbot.py"), encoding="utf-8").read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and getattr(node.targets[0], "id", None) == "predefined_responses":
+            return ast.literal_eval(node.value)
+    raise SystemExit("predefined_responses not found in chatbot.py")
+
+
+def typo(text, rng):
+    words = text.split()
+    candidates = [i for i, w in enumerate(words) if len(w) >= 5]
+    if not candidates:
+        return text
+    i = rng.choice(candidates)
+    w = words[i]
+    j = rng.randrange(1, len(w) - 1)
+    words[i] = w[:j] + w[j + 1] + w[j] + w[j + 2:]
+    return " ".join(words)
+
+
+def variants(question, rng):
+    capitalised = question[0].upper() + question[1:]
+    return [
+        question,
+        capitalised + "?",
+        capitalised.replace("what is", "What's") + "?",
+        "Can you tell me " + question + "?",
+        question.upper(),
+        typo(question, rng),
+        "please, " + question + " ??",
+    ]
+
+
+def main():
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "data .csv")
+    cities = pd.read_csv(csv_path, usecols=["City"])["City"].unique()
+    responses = canned_questions()
+
+    start = time.perf_counter()
+    matcher = IntentMatcher(responses, entities=cities)
+    print(f"index build: {(time.perf_counter() - start) * 1000:.1f} ms for {len(responses)} canned questions")
+
+    rng = random.Random(3)
+    corpus = [(v, responses[q]) for q in responses for v in variants(q, rng)] + [(q, None) for q in NEGATIVES]
+
+    exact_hits = sum(1 for text, expected in corpus if expected is not None and responses.get(text) == expected)
+    correct = wrong = missed = false_positive = 0
+    timings = []
+    for text, expected in corpus:
+        start = time.perf_counter()
+        got = matcher.match(text)
+        timings.append(time.perf_counter() - start)
+        if expected is None:
+            false_positive += got is not None
+        elif got == expected:
+            correct += 1
+        elif got is None:
+            missed += 1
+        else:
+            wrong += 1
+
+    positives = sum(1 for _, expected in corpus if expected is not None)
+    timings.sort()
+    print(f"threshold {THRESHOLD}: {len(corpus)} questions ({positives} variants, {len(NEGATIVES)} negatives)")
+    print(f"exact string match (old): {exact_hits / positives:.1%} of variants answered")
+    print(f"intent matcher          : {correct / positives:.1%} correct, {wrong} wrong answer, {missed} missed, "
+          f"{false_positive}/{len(NEGATIVES)} negatives claimed")
+    print(f"latency: p50 {timings[len(timings) // 2] * 1e6:.0f} us, p99 {timings[int(len(timings) * 0.99)] * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
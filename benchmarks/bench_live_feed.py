@@ -0,0 +1,195 @@
+# Benchmark: live feed latency from a row being written to it being on screen, at sustained rates
+#
+#   python benchmarks/bench_live_feed.py [--rates 10,100,1000,5000] [--seconds 5] [--refresh 2.0]
+#
+# Starts from "data .csv" with the aggregates the app keeps live (rollup cube,
+# daily series, city stats) and feeds synthetic readings for the next days
+# of every city, through a tailed CSV file and through the local HTTP feed.
+#   applied   - written by the producer -> in the dataset and every aggregate
+#   on screen - written -> the end of the first live panel redraw that shows it.
+#               A viewer thread redraws like an open session's fragment: every
+#               --refresh seconds it reads the latest rows and builds the
+#               panel's Plotly chart (what a cache miss costs). The browser's
+#               share (websocket delta and paint) is not included.
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from city_compare import CityComparison
+from city_stats import CityStats
+from daily_series import DailySeries
+from data_store import frame_to_table, read_csv
+from downsample import SeriesDownsampler
+from figure_cache import plotly_payload
+from live_feed import REFRESH_SECONDS, FeedServer, FileTail, HTTPSource, LiveDataset, LiveFeed
+from query_engine import QueryEngine
+from rollups import build_cube
+from table_view import TableIndex
+
+COLUMNS = ["City", "Date", "PM2.5", "PM10", "NO", "NO2", "NOx", "NH3", "CO", "SO2", "O3", "Benzene", "Toluene", "AQI"]
+
+# How often the producer writes whatever rows are due
+TICK_SECONDS = 0.005
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def load_base():
+    df = frame_to_table(read_csv(os.path.join(ROOT, "data .csv"))).to_pandas()
+    df["Month"] = df["Date"].dt.month
+    return df
+
+
+def make_rows(df, n, seed=0):
+    """n readings for the days after the dataset ends, every city once per day"""
+    rng = np.random.default_rng(seed)
+    cities = sorted(df["City"].astype(str).unique())
+    first = df["Date"].max() + pd.Timedelta(days=1)
+    index = np.arange(n)
+    rows = pd.DataFrame({
+        "City": np.array(cities)[index % len(cities)],
+        "Date": (first + pd.to_timedelta(index // len(cities), unit="D")).strftime("%Y-%m-%d"),
+    })
+    for column in COLUMNS[2:]:
+        rows[column] = np.round(rng.gamma(2.0, df[column].mean() / 2.0, n), 2)
+    return rows
+
+
+class Recorder:
+    """Times each row was written and applied, and when each viewer redraw started and ended"""
+
+    def __init__(self, dataset):
+        self.written = {}
+        self.applied = {}
+        self.redraws = []
+        append = dataset.append
+
+        def timed_append(rows):
+            n = append(rows)
+            now = time.perf_counter()
+            for key in zip(rows["City"].astype(str), pd.to_datetime(rows["Date"]).dt.strftime("%Y-%m-%d")):
+                self.applied.setdefault(key, now)
+            return n
+        dataset.append = timed_append
+
+
+def produce(rows, rate, write, recorder):
+    keys = list(zip(rows["City"], rows["Date"]))
+    start = time.perf_counter()
+    sent = 0
+    while sent < len(rows):
+        due = min(len(rows), int((time.perf_counter() - start) * rate) + 1)
+        if due > sent:
+            now = time.perf_counter()
+            for key in keys[sent:due]:
+                recorder.written[key] = now
+            write(rows.iloc[sent:due])
+            sent = due
+        time.sleep(TICK_SECONDS)
+
+
+def view(dataset, refresh, recorder, stop):
+    import plotly.express as px
+
+    while not stop.is_set():
+        start = time.perf_counter()
+        dataset.latest("All")
+        plotly_payload(px.line(dataset.recent("All"), x="Date", y="AQI", color="City"))
+        recorder.redraws.append((start, time.perf_counter()))
+        stop.wait(max(0.0, refresh - (time.perf_counter() - start)))
+
+
+def run(base, source_name, rate, seconds, refresh):
+    rows = make_rows(base, max(int(rate * seconds), 1))
+    dataset = LiveDataset(base)
+    # The aggregates the Dashboard and chatbot register with a live feed
+    for name, build in [("cube", build_cube), ("daily_series", DailySeries), ("city_stats", CityStats), ("city_compare", CityComparison),
+                        ("downsampler", SeriesDownsampler), ("table_index", TableIndex), ("query_engine", QueryEngine)]:
+        dataset.aggregate(name, build)
+    recorder = Recorder(dataset)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = None
+        if source_name == "file":
+            path = os.path.join(tmp, "feed.csv")
+            rows.head(0).to_csv(path, index=False)
+            source = FileTail(path)
+            out = open(path, "a", newline="")
+
+            def write(part):
+                part.to_csv(out, header=False, index=False)
+                out.flush()
+        else:
+            server = FeedServer()
+            source = HTTPSource(server.url)
+
+            def write(part):
+                server.publish(json.loads(part.to_json(orient="records")))
+
+        feed = LiveFeed(source, dataset).start()
+        stop = threading.Event()
+        viewer = threading.Thread(target=view, args=(dataset, refresh, recorder, stop), daemon=True)
+        viewer.start()
+        produce(rows, rate, write, recorder)
+        deadline = time.perf_counter() + 30
+        while len(recorder.applied) < len(rows) and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        time.sleep(refresh * 1.5)
+        stop.set()
+        viewer.join()
+        feed.stop()
+        if server is not None:
+            server.close()
+        else:
+            out.close()
+
+    applied, shown = [], []
+    redraw_starts = np.array([s for s, _ in recorder.redraws])
+    redraw_ends = np.array([e for _, e in recorder.redraws])
+    for key, written in recorder.written.items():
+        if key not in recorder.applied:
+            continue
+        done = recorder.applied[key]
+        applied.append(done - written)
+        i = np.searchsorted(redraw_starts, done)
+        if i < len(redraw_ends):
+            shown.append(redraw_ends[i] - written)
+    redraw_ms = np.median([e - s for s, e in recorder.redraws]) * 1000
+    return len(rows), len(recorder.applied), applied, shown, redraw_ms, feed.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rates", default="10,100,1000,5000", help="rows per second, comma separated")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--refresh", type=float, default=REFRESH_SECONDS, help="seconds between live panel redraws")
+    args = parser.parse_args()
+
+    base = load_base()
+    print(f"{len(base):,} base rows, panel redraw every {args.refresh:g} s, {os.cpu_count()} CPU\n")
+    print(f"{'source':<6} {'rows/s':>7} {'rows':>7} {'applied p50/p95/p99 ms':>24} {'on screen p50/p95/p99 ms':>26} "
+          f"{'batch ms':>9} {'redraw ms':>10}")
+    for source_name in ["file", "http"]:
+        for rate in [float(r) for r in args.rates.split(",")]:
+            n, received, applied, shown, redraw_ms, stats = run(base, source_name, rate, args.seconds, args.refresh)
+            assert received == n, f"{source_name} at {rate:g} rows/s: {received} of {n} rows applied"
+            a = "/".join(f"{percentile(applied, q) * 1000:.0f}" for q in (0.5, 0.95, 0.99))
+            s = "/".join(f"{percentile(shown, q) * 1000:.0f}" for q in (0.5, 0.95, 0.99))
+            print(f"{source_name:<6} {rate:>7g} {n:>7,} {a:>24} {s:>26} {stats['apply_ms']:>9.1f} {redraw_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Benchmark: time to first token and cache hit rate for chatbot LLM calls, using the stub backend
+#
+#   python benchmarks/bench_llm_backend.py [--questions 200] [--first-token 0.3] [--token 0.02]
+#
+# "blocking" is the old behaviour: nothing is shown until the whole answer has arrived.
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from llm_backend import LLMClient, ResponseCache, StubBackend
+
+TOPICS = ["dashboard filters", "the Power BI report", "PM2.5 health effects", "seasonal AQI patterns",
+          "ozone formation", "the correlation heatmap", "AQI buckets", "crop burning", "monsoon effects",
+          "downloading data", "WHO limits", "traffic emissions"]
+
+
+def question_stream(count, seed=7):
+    """Questions with a skewed popularity and varied spelling, like real chat traffic"""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(TOPICS))]
+    for _ in range(count):
+        topic = rng.choices(TOPICS, weights)[0]
+        question = rng.choice(["Tell me about {}", "tell me about  {}", "TELL ME ABOUT {}", "Explain {}"]).format(topic)
+        yield f"You are an AI assistant.\n    Question: {question}\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure LLM time to first token and cache hits")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--first-token", type=float, default=0.3)
+    parser.add_argument("--token", type=float, default=0.02)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = StubBackend(token_delay=args.token, first_token_delay=args.first_token)
+        client = LLMClient(backend, cache=ResponseCache(os.path.join(tmp, "cache.sqlite")))
+        blocking, streamed, cached = [], [], []
+        for prompt in question_stream(args.questions):
+            hits_before = client.hits
+            start = time.perf_counter()
+            chunks = client.stream(prompt)
+            next(chunks)
+            first = time.perf_counter() - start
+            for _ in chunks:
+                pass
+            total = time.perf_counter() - start
+            if client.hits > hits_before:
+                cached.append(first)
+            else:
+                streamed.append(first)
+                blocking.append(total)
+
+    def ms(values):
+        if not values:
+            return "n/a"
+        return f"p50 {statistics.median(values) * 1000:8.1f} ms   max {max(values) * 1000:8.1f} ms"
+
+    print(f"questions: {args.questions}, backend calls: {backend.calls}, cache hit rate: {client.hit_rate():.1%}")
+    print(f"blocking (old), first text : {ms(blocking)}")
+    print(f"streamed miss, first token : {ms(streamed)}")
+    print(f"cache hit, first token     : {ms(cached)}")
+
+
+if __name__ == "__main__":
+    main()
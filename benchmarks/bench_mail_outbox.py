@@ -0,0 +1,194 @@
+# Benchmark: feedback submission latency and burst throughput, smtplib per request vs the outbox
+#
+#   python benchmarks/bench_mail_outbox.py [--messages 200] [--handshake-ms 50]
+#
+# Runs against a local aiosmtpd server (pip install aiosmtpd) with AUTH enabled.
+# --handshake-ms delays each EHLO to stand in for the TLS and network round
+# trips of a real mail server. Also checks retries on 4xx replies, permanent
+# failures on 5xx, and that mail queued while the server is down is delivered
+# by a fresh worker once it is back.
+import argparse
+import logging
+import asyncio
+import os
+import smtplib
+import socket
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+from mail_outbox import DeliveryWorker, Outbox, SMTPPool
+
+# aiosmtpd warns about AUTH without TLS and logs every session; neither matters for a local benchmark
+warnings.filterwarnings("ignore", module="aiosmtpd")
+logging.getLogger("mail.log").setLevel(logging.ERROR)
+
+SENDER = "dashboard@example.com"
+RECIPIENTS = ["team@example.com"]
+
+
+class Handler:
+    def __init__(self, handshake_delay):
+        self.handshake_delay = handshake_delay
+        self.received = 0
+        self.transient_failures = 0
+        self.lock = threading.Lock()
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.handshake_delay)
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.endswith("@invalid.example"):
+            return "550 5.1.1 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        with self.lock:
+            if self.transient_failures:
+                self.transient_failures -= 1
+                return "451 4.3.0 Try again later"
+            self.received += 1
+        return "250 OK"
+
+
+def authenticator(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(handler, port):
+    controller = Controller(handler, hostname="127.0.0.1", port=port, authenticator=authenticator,
+                            auth_required=True, auth_require_tls=False)
+    controller.start()
+    return controller
+
+
+def send_directly(port, i):
+    """What the Feedback page used to do for every submission"""
+    msg = MIMEMultipart()
+    msg["From"] = SENDER
+    msg["To"] = ", ".join(RECIPIENTS)
+    msg["Subject"] = f"Feedback from user {i}"
+    msg.attach(MIMEText(f"Name: user {i}\n\nFeedback:\nmessage {i}", "plain"))
+    with smtplib.SMTP("127.0.0.1", port) as server:
+        server.login("user", "secret")
+        server.sendmail(SENDER, RECIPIENTS, msg.as_string())
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def wait_for(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--handshake-ms", type=float, default=50)
+    args = parser.parse_args()
+    n = args.messages
+
+    handler = Handler(args.handshake_ms / 1000)
+    port = free_port()
+    controller = start_server(handler, port)
+    work = tempfile.mkdtemp(prefix="bench_mail_")
+    try:
+        pool = lambda: SMTPPool("127.0.0.1", port, "user", "secret", starttls=False)
+
+        # Old path: a full handshake inside every request
+        latencies = []
+        for i in range(n):
+            start = time.perf_counter()
+            send_directly(port, i)
+            latencies.append(time.perf_counter() - start)
+        assert handler.received == n
+        direct_total = sum(latencies)
+        print(f"{n} submissions, {args.handshake_ms:.0f} ms handshake\n")
+        print(f"{'path':<26} {'p50 ms':>8} {'p99 ms':>8} {'delivered/s':>12} {'connections':>12}")
+        print(f"{'smtplib per request':<26} {percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f} "
+              f"{n / direct_total:>12.0f} {n:>12}")
+
+        # Outbox: the request only waits for the SQLite insert; a burst from 8 concurrent sessions
+        for threads in (1, 2):
+            handler.received = 0
+            worker = DeliveryWorker(Outbox(os.path.join(work, f"burst{threads}.sqlite")), pool(), threads=threads).start()
+            latencies = []
+            lock = threading.Lock()
+
+            def submit_many(ids):
+                for i in ids:
+                    start = time.perf_counter()
+                    worker.submit(SENDER, RECIPIENTS, f"Feedback from user {i}", f"message {i}")
+                    with lock:
+                        latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            sessions = [threading.Thread(target=submit_many, args=(range(s, n, 8),)) for s in range(8)]
+            for t in sessions:
+                t.start()
+            for t in sessions:
+                t.join()
+            assert wait_for(lambda: handler.received == n)
+            drained = time.perf_counter() - start
+            worker.stop()
+            assert worker.outbox.counts() == {"sent": n}
+            print(f"{f'outbox, {threads} worker thread(s)':<26} {percentile(latencies, 0.5) * 1000:>8.1f} "
+                  f"{percentile(latencies, 0.99) * 1000:>8.1f} {n / drained:>12.0f} {worker.pool.opened:>12}")
+
+        # Transient 4xx replies are retried with backoff; 5xx recipients fail permanently
+        handler.received, handler.transient_failures = 0, 5
+        worker = DeliveryWorker(Outbox(os.path.join(work, "retry.sqlite")), pool(), backoff=0.05).start()
+        for i in range(10):
+            worker.submit(SENDER, RECIPIENTS, f"retry {i}", "body")
+        worker.submit(SENDER, ["nobody@invalid.example"], "bounce", "body")
+        assert wait_for(lambda: worker.outbox.counts() == {"sent": 10, "failed": 1})
+        worker.stop()
+        print(f"\nretries: 5 transient failures retried ({worker.retried} retries), 10/10 delivered, 1 permanent failure recorded")
+
+        # Mail accepted while the server is down waits on disk for the next worker
+        controller.stop()
+        path = os.path.join(work, "outage.sqlite")
+        worker = DeliveryWorker(Outbox(path), pool(), backoff=0.05).start()
+        for i in range(20):
+            worker.submit(SENDER, RECIPIENTS, f"outage {i}", "body")
+        time.sleep(0.3)
+        worker.stop()
+        pending = Outbox(path).counts().get("pending", 0)
+        handler.received = 0
+        controller = start_server(handler, port)
+        worker = DeliveryWorker(Outbox(path), pool(), backoff=0.05).start()
+        assert wait_for(lambda: handler.received == 20)
+        worker.stop()
+        print(f"outage: {pending} messages kept while the server was down, all 20 delivered by a new worker")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Benchmark: chatbot dataset lookups, row-by-row string scan vs the token index
+#
+#   python benchmarks/bench_query_engine.py ["data .csv"]
+#
+# The old path is the df.apply(row.to_string()) scan chatbot.search_dataset used to run.
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data_store import read_csv
+from query_engine import QueryEngine
+
+QUERIES = [
+    "delhi",
+    "severe",
+    "2019-11-03",
+    "PM2.5 in Delhi in 2019",
+    "worst month for Lucknow",
+    "best city for NO2 in 2018",
+    "highest AQI in Mumbai",
+    "Very Poor days in Kolkata",
+]
+
+
+def scan(df, query):
+    query = query.lower()
+    results = df[df.apply(lambda row: query in row.to_string().lower(), axis=1)]
+    return results.to_string(index=False) if not results.empty else None
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "data .csv")
+    df = read_csv(csv_path)
+    df["Month"] = df["Date"].dt.month
+
+    engine, build = timed(lambda: QueryEngine(df), 1)
+    print(f"index build: {build * 1000:.0f} ms, {len(engine.index):,} tokens over {len(df):,} rows\n")
+    print(f"{'query':<28} {'scan ms':>9} {'scan chars':>11} {'index ms':>9} {'index chars':>12}")
+    for query in QUERIES:
+        old, old_seconds = timed(lambda: scan(df, query), 1)
+        new, new_seconds = timed(lambda: engine.answer(query), 20)
+        print(f"{query:<28} {old_seconds * 1000:>9.0f} {len(old or ''):>11,} {new_seconds * 1000:>9.2f} {len(new or ''):>12,}")
+
+
+if __name__ == "__main__":
+    main()
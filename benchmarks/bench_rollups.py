@@ -0,0 +1,83 @@
+# Benchmark: Dataset Explorer aggregates from the rollup cube vs pandas on the full frame
+#
+#   python benchmarks/bench_rollups.py ["data .csv"]
+#
+# Times the cube's build, update() with the last APPEND_DAYS days (and one
+# whole city) a day at a time, and each widget's answer against the pandas
+# call it replaces. Parity with those calls is checked by tests/test_rollups.py.
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data_store import read_csv
+from rollups import build_cube
+
+APPEND_DAYS = 30
+
+
+def best_of(fn, repeat=50):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(ROOT, "data .csv")
+    df = read_csv(csv_path)
+    df["Month"] = df["Date"].dt.month
+
+    start = time.perf_counter()
+    cube = build_cube(df)
+    print(f"cube build: {(time.perf_counter() - start) * 1000:.1f} ms for {len(df)} rows, {len(cube.cell_city)} cells")
+
+    # A cube that receives the last days and one city through update()
+    cutoff = df["Date"].max() - pd.Timedelta(days=APPEND_DAYS)
+    late_city = cube.cities[-1]
+    base = df[(df["Date"] <= cutoff) & (df["City"] != late_city)]
+    grown = build_cube(base)
+    appended = df.drop(base.index)
+    timings = []
+    for _, day in appended.groupby("Date", sort=True):
+        start = time.perf_counter()
+        grown.update(day)
+        timings.append(time.perf_counter() - start)
+    print(f"update: {len(timings)} daily update() calls ({len(appended)} rows, incl. all of {late_city}); "
+          f"{np.median(timings) * 1000:.2f} ms per day")
+
+    # Approximate path for arbitrary city groups
+    group = cube.cities[:3]
+    exact = df[df["City"].isin(group)].describe().loc[["25%", "50%", "75%"], "AQI"].to_numpy(float)
+    approx = cube.describe(group).loc[["25%", "50%", "75%"], "AQI"].to_numpy(float)
+    print(f"sketched quartiles for {group}: max relative error {np.max(np.abs(approx - exact) / exact):.2%}")
+
+    print(f"\n{'widget':<16} {'pandas ms':>10} {'cube ms':>9} {'cube cold ms':>13}")
+    city = "Delhi" if "Delhi" in cube.cities else cube.cities[0]
+    df_filtered = df[df["City"] == city]
+    widgets = [
+        ("city means", lambda: df.groupby("City", observed=True)["AQI"].mean().reset_index(), lambda c: c.city_means("AQI")),
+        ("top/bottom 5", lambda: df.groupby("City", observed=True)["AQI"].mean().reset_index().nlargest(5, "AQI"), lambda c: c.top_cities(5, "AQI")),
+        ("describe", lambda: df_filtered.describe(), lambda c: c.describe(city)),
+        ("monthly mean", lambda: df_filtered.groupby("Month")["AQI"].mean().reset_index(), lambda c: c.monthly_means(city, "AQI")),
+        ("corr", lambda: df_filtered.select_dtypes(include=["float64", "int64"]).corr(), lambda c: c.corr(city)),
+    ]
+    for name, pandas_fn, cube_fn in widgets:
+        cold = []
+        for _ in range(5):
+            cube._memo.clear()
+            start = time.perf_counter()
+            cube_fn(cube)
+            cold.append(time.perf_counter() - start)
+        print(f"{name:<16} {best_of(pandas_fn, 10):>10.3f} {best_of(lambda: cube_fn(cube)):>9.3f} {min(cold) * 1000:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
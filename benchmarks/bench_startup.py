@@ -0,0 +1,109 @@
+# Benchmark: cold start per page, measured headless with Streamlit's AppTest
+#
+#   python benchmarks/bench_startup.py [baseline-git-ref] [--csv "data .csv"]
+#
+# Every page is rendered in a fresh interpreter. "imports" is the time taken by
+# app.py's module-level import lines (chatbot included), "first render" the
+# first AppTest run of a page and "rerun" a second run in the same process.
+# The last column lists which of pandas, plotly.express, matplotlib, seaborn
+# and smtplib ended up loaded (Streamlit itself already imports plotly). With
+# a git ref, that revision is exported to a temporary directory and measured
+# first.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = ["Login", "Home", "Dashboard", "Feedback"]
+
+HEAVY_MODULES = ["pandas", "plotly.express", "matplotlib", "seaborn", "smtplib"]
+
+CHILD = r"""
+import json, os, sys, time
+os.chdir({tree!r})
+sys.path.insert(0, {tree!r})
+start = time.perf_counter()
+import streamlit
+from streamlit.testing.v1 import AppTest
+streamlit_seconds = time.perf_counter() - start
+
+at = AppTest.from_file(os.path.join({tree!r}, "app.py"), default_timeout=600)
+at.secrets["email"] = {{"smtp_server": "localhost", "smtp_port": 25, "smtp_user": "u", "smtp_password": "p",
+                        "sender_email": "a@example.com", "receiver_emails": ["b@example.com"]}}
+at.secrets["GOOGLE_API_KEY"] = "unused"
+if {page!r} != "Login":
+    at.session_state["authenticated"] = True
+    at.session_state["users"] = {{"admin": "password123"}}
+    at.session_state["theme"] = "light"
+    at.session_state["page"] = {page!r}
+
+start = time.perf_counter()
+at.run()
+first = time.perf_counter() - start
+errors = [str(e.value)[:200] for e in at.exception]
+start = time.perf_counter()
+at.run()
+rerun = time.perf_counter() - start
+with open("/proc/self/status") as f:
+    peak = next(int(line.split()[1]) for line in f if line.startswith("VmHWM")) / 1024
+print(json.dumps({{"streamlit": streamlit_seconds, "first": first, "rerun": rerun, "peak_mb": peak, "errors": errors,
+                   "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+IMPORT_CHILD = r"""
+import os, sys, time
+os.chdir({tree!r})
+sys.path.insert(0, {tree!r})
+import streamlit
+# Module-level imports of app.py, without running the page script
+source = open("app.py", encoding="utf-8").read().split("# Load Dataset")[0].split("# Heavy libraries")[0]
+lines = [l for l in source.splitlines() if l.startswith(("import ", "from "))]
+start = time.perf_counter()
+for line in lines:
+    exec(line)
+print(time.perf_counter() - start)
+"""
+
+
+def run(code, env):
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    return out.stdout.strip().splitlines()[-1]
+
+
+def measure(tree, label, env):
+    import_seconds = float(run(IMPORT_CHILD.format(tree=tree), env))
+    print(f"\n{label}: app.py imports {import_seconds * 1000:.0f} ms")
+    print(f"{'page':<10} {'first render s':>15} {'rerun ms':>9} {'peak MB':>8}  heavy modules")
+    for page in PAGES:
+        result = json.loads(run(CHILD.format(tree=tree, page=page, heavy=HEAVY_MODULES), env))
+        print(f"{page:<10} {result['first']:>15.2f} {result['rerun'] * 1000:>9.0f} {result['peak_mb']:>8.0f}  "
+              f"{', '.join(result['heavy']) or '-'}" + (f"  ERROR {result['errors']}" if result["errors"] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("baseline", nargs="?", help="git revision to measure first, e.g. HEAD~1")
+    parser.add_argument("--csv", default=os.path.join(ROOT, "data .csv"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as work:
+        env = dict(os.environ, AQ_DATA_PATH=os.path.abspath(args.csv), AQ_CACHE_DIR=os.path.join(work, "cache"),
+                   AQ_PARTITIONS_DIR=os.path.join(work, "partitions"), AQ_LLM_BACKEND="stub")
+        # Build the columnar store up front so no page pays for the one-off conversion
+        subprocess.run([sys.executable, "-c", f"import sys; sys.path.insert(0, {ROOT!r}); import data_store; data_store.open_table({env['AQ_DATA_PATH']!r})"],
+                       env=env, check=True)
+        if args.baseline:
+            tree = os.path.join(work, "baseline")
+            os.makedirs(tree)
+            archive = subprocess.run(["git", "-C", ROOT, "archive", args.baseline], capture_output=True, check=True).stdout
+            subprocess.run(["tar", "-x", "-C", tree], input=archive, check=True)
+            measure(tree, f"baseline ({args.baseline})", env)
+        measure(ROOT, "working tree", env)
+
+
+if __name__ == "__main__":
+    main()
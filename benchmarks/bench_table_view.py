@@ -0,0 +1,76 @@
+# Benchmark: bytes serialized and latency per rerun for the Dataset Explorer tables
+#
+#   python benchmarks/bench_table_view.py ["data .csv"] [--scales 1 10 100]
+#
+# "before" is st.dataframe(df) plus st.dataframe(df_filtered); "after" is one page of
+# each from TableIndex. Streamlit ships tables as Arrow IPC, so bytes are measured that way.
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data_store import CATEGORICAL_COLUMNS, read_csv
+from table_view import TableIndex
+
+
+def arrow_bytes(frame):
+    table = pa.Table.from_pandas(frame)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().size
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure table serialization per rerun")
+    parser.add_argument("csv_path", nargs="?", default=os.path.join(ROOT, "data .csv"))
+    parser.add_argument("--scales", nargs="+", type=int, default=[1, 10, 100])
+    args = parser.parse_args()
+
+    base = read_csv(args.csv_path)
+    # Same dtypes as the columnar store the app loads from
+    for column in CATEGORICAL_COLUMNS:
+        base[column] = base[column].astype("category")
+    city = "Delhi" if "Delhi" in set(base["City"]) else base["City"].iloc[0]
+    print(f"{'scale':>6} {'rows':>10} {'index MB':>9} {'case':<26} {'bytes':>12} {'ms':>9}")
+    for scale in args.scales:
+        df = pd.concat([base] * scale, ignore_index=True) if scale > 1 else base
+        table_index, build = timed(lambda: TableIndex(df))
+        index_mb = sum(a.nbytes for a in (table_index.by_city_date, table_index.city_dates, table_index.by_date, table_index.dates)) / 1e6
+
+        def before():
+            return arrow_bytes(df) + arrow_bytes(df[df["City"] == city])
+
+        cases = [("before: full + filtered", before)]
+        for label, kwargs in [
+            ("after: first pages", {}),
+            ("after: sorted by AQI desc", {"sort_by": "AQI", "ascending": False}),
+            ("after: date range, page 10", {"start": "2018-01-01", "end": "2018-12-31", "page": 10}),
+        ]:
+            def after(kwargs=kwargs):
+                raw, _ = table_index.page(**kwargs)
+                filtered, _ = table_index.page(city, **kwargs)
+                return arrow_bytes(raw) + arrow_bytes(filtered)
+            cases.append((label, after))
+
+        print(f"{scale:>5}x {len(df):>10} {index_mb:>9.1f} {'index build':<26} {'':>12} {build * 1000:>9.1f}")
+        for label, fn in cases:
+            fn()
+            size, seconds = min((timed(fn) for _ in range(3)), key=lambda r: r[1])
+            print(f"{'':>6} {'':>10} {'':>9} {label:<26} {size:>12,} {seconds * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
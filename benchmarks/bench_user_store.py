@@ -0,0 +1,129 @@
+# Benchmark: concurrent logins against the shared user store, from several worker processes
+#
+#   python benchmarks/bench_user_store.py [--users 40] [--processes 4] [--threads 4] [--reruns 20]
+#
+# Every process opens its own UserStore on one SQLite file, as separate
+# Streamlit workers would. Measured per process and thread:
+#   first login   - password checked with scrypt
+#   repeat login  - same password again, answered from the verified-hash cache
+#   token check   - what every rerun of a logged-in session costs
+#   scrypt rerun  - the alternative of checking the password on every rerun
+# Also checks that tokens issued by one process are accepted by the others
+# and that a username registered by all processes at once is created exactly once.
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from user_store import UserStore
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def timed(fn, items):
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def worker(path, users, threads, reruns, barrier, results, tokens_in, tokens_out):
+    store = UserStore(path)
+    uncached = UserStore(path, cache_size=0)
+    barrier.wait()
+    # Every process logs in every user, threads splitting the users between them
+    parts = [users[i::threads] for i in range(threads)]
+    phases = {}
+
+    def run_phase(name, fn, per_thread):
+        latencies = []
+        lock = threading.Lock()
+
+        def run(items):
+            measured = timed(fn, items)
+            with lock:
+                latencies.extend(measured)
+
+        start = time.perf_counter()
+        pool = [threading.Thread(target=run, args=(items,)) for items in per_thread]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        phases[name] = (latencies, time.perf_counter() - start)
+
+    tokens = {}
+    run_phase("first login", lambda user: tokens.__setitem__(user, store.login(user, f"pw-{user}")), parts)
+    run_phase("repeat login", lambda user: store.login(user, f"pw-{user}"), parts)
+    run_phase("token check", lambda token: store.verify_token(token), [[tokens[u] for u in part] * reruns for part in parts])
+    run_phase("scrypt rerun", lambda user: uncached.authenticate(user, f"pw-{user}"), [part[:2] for part in parts])
+
+    tokens_out.put(tokens)
+    foreign = tokens_in.get()
+    accepted = sum(store.verify_token(token) == user for user, token in foreign.items())
+    race = sum(store.register(f"race-{i}", "pw") for i in range(10))
+    results.put((phases, accepted, len(foreign), race, store.scrypt_checks, store.cache_hits))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=40)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "users.sqlite")
+        store = UserStore(path)
+        users = [f"user{i}" for i in range(args.users)]
+        start = time.perf_counter()
+        for user in users:
+            store.register(user, f"pw-{user}")
+        print(f"registered {len(users)} users in {time.perf_counter() - start:.2f} s "
+              f"({os.cpu_count()} CPU, {args.processes} processes x {args.threads} threads)\n")
+
+        barrier = multiprocessing.Barrier(args.processes)
+        results = multiprocessing.Queue()
+        # Each process passes its tokens to the next one, which must accept them
+        queues = [multiprocessing.Queue() for _ in range(args.processes)]
+        procs = [
+            multiprocessing.Process(target=worker, args=(path, users, args.threads, args.reruns, barrier, results,
+                                                         queues[i], queues[(i + 1) % args.processes]))
+            for i in range(args.processes)
+        ]
+        for proc in procs:
+            proc.start()
+        reports = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+
+    print(f"{'phase':<14} {'calls':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'per s':>10}")
+    for name in ["first login", "repeat login", "token check", "scrypt rerun"]:
+        latencies = [x for phases, *_ in reports for x in phases[name][0]]
+        wall = max(phases[name][1] for phases, *_ in reports)
+        print(f"{name:<14} {len(latencies):>7} {percentile(latencies, 0.5) * 1000:>9.3f} {percentile(latencies, 0.95) * 1000:>9.3f} "
+              f"{percentile(latencies, 0.99) * 1000:>9.3f} {len(latencies) / wall:>10.0f}")
+
+    accepted = sum(r[1] for r in reports)
+    offered = sum(r[2] for r in reports)
+    created = sum(r[3] for r in reports)
+    print(f"\ntokens from another process accepted: {accepted}/{offered}")
+    print(f"usernames registered by all processes at once: {created} created for 10 names")
+    print(f"scrypt checks {sum(r[4] for r in reports)}, verified-cache hits {sum(r[5] for r in reports)}")
+    assert accepted == offered and created == 10
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,38 @@
-import pandas as pd
+import os
 import streamlit as st
-import google.generativeai as genai
-
-# Load API key securely from Streamlit secrets
-GOOGLE_API_KEY = st.secrets["GOOGLE_API_KEY"]
-genai.configure(api_key=GOOGLE_API_KEY)
-model = genai.GenerativeModel("gemini-1.5-pro")  # model
-
-# Load dataset from app.py
-@st.cache_data
-def load_data():
-    file_path = r"C:\Users\RISHIRAJ\OneDrive\Desktop\final_cleaned_city_day.csv"
-    df = pd.read_csv(file_path)
-    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
-    df["Month"] = df["Date"].dt.month
-    return df
-
-df = load_data()  # Load dataset
+# Shared with app.py, so the dataset is only loaded once per process
+from shared_data import city_names, current_version, live_aggregate, load_daily_series, load_data
+
+# The chatbot's dependencies are imported inside the loaders below, so importing
+# this module (every page does, for the sidebar button) stays cheap
+
+# LLM client with streaming, timeouts, retries and a persistent response cache
+# Set AQ_LLM_BACKEND=stub to use the offline stub instead of Gemini
+@st.cache_resource
+def load_llm_client():
+    from llm_backend import GeminiBackend, LLMClient, ResponseCache, StubBackend
+
+    if os.environ.get("AQ_LLM_BACKEND") == "stub":
+        backend = StubBackend()
+    else:
+        # Load API key securely from Streamlit secrets
+        backend = GeminiBackend(st.secrets["GOOGLE_API_KEY"])
+    return LLMClient(backend, cache=ResponseCache())
+
+# Token index over the dataset, built once and shared by all sessions; with a live feed new rows are indexed as they arrive
+@st.cache_resource(max_entries=1)
+def load_query_engine(version):
+    from query_engine import QueryEngine
+    engine = live_aggregate(version, "query_engine", QueryEngine)
+    return QueryEngine(load_data(version)) if engine is None else engine
+
+# Per-city statistics (latest, mean, percentiles, worst day, categories, yearly trend)
+@st.cache_resource(max_entries=1)
+def load_city_stats(version):
+    from city_stats import CityStats
+    # With a live feed the statistics follow the new rows instead of being rebuilt
+    stats = live_aggregate(version, "city_stats", CityStats)
+    return CityStats(load_data(version)) if stats is None else stats
 
 # predefined questions for faster responses
 predefined_responses = {
@@ -44,13 +60,18 @@ predefined_responses = {
     "what are the different aqi categories": "AQI categories range from Good (0-50) to Hazardous (300+), indicating different levels of health risk.",
 }
 
-# Auto-generate city-specific AQI responses
-for city in df["City"].unique():
-    predefined_responses[f"what is the aqi in {city.lower()}"] = f"The AQI in {city} varies daily. Check the dataset for specific values."
+# Fuzzy matcher over the canned questions, so rephrased questions and typos still hit;
+# it only depends on the city names, so new rows for known cities do not rebuild it
+@st.cache_resource(max_entries=1)
+def load_intent_matcher(cities):
+    from intent_matcher import IntentMatcher
+    return IntentMatcher(predefined_responses, entities=cities)
 
 def search_dataset(query):
     """Search dataset for relevant data or predefined responses"""
-    query = query.lower()
+    # The answers below tell the pollutant NO from the word "no" by its case, so they get the question as typed
+    question, query = query, query.lower()
+    version = current_version()
 
     # First, check predefined responses
     if query in predefined_responses:
@@ -58,26 +79,36 @@ def search_dataset(query):
 
     # Get list of cities
     if "list of cities" in query:
-        unique_cities = df["City"].unique().tolist()
+        unique_cities = city_names(version)
         return f"The dataset contains air quality data for:\n\n{', '.join(unique_cities)}"
 
     # Find the most polluted city
     elif "most polluted city" in query:
-        most_polluted = df.loc[df["AQI"].idxmax()]
-        return f"The most polluted city is **{most_polluted['City']}** with an AQI of **{most_polluted['AQI']}** on {most_polluted['Date'].date()}."
+        city, aqi, date = load_city_stats(version).extreme("AQI", highest=True)
+        return f"The most polluted city is **{city}** with an AQI of **{aqi}** on {date.date()}."
 
     # Find the least polluted city
     elif "least polluted city" in query:
-        least_polluted = df.loc[df["AQI"].idxmin()]
-        return f"The least polluted city is **{least_polluted['City']}** with an AQI of **{least_polluted['AQI']}** on {least_polluted['Date'].date()}."
+        city, aqi, date = load_city_stats(version).extreme("AQI", highest=False)
+        return f"The least polluted city is **{city}** with an AQI of **{aqi}** on {date.date()}."
 
-    # Check dataset for matching data
-    results = df[df.apply(lambda row: query in row.to_string().lower(), axis=1)]
-    
-    if not results.empty:
-        return results.to_string(index=False)
+    # Rolling means and WHO guideline exceedances: "30-day average AQI in Delhi", "PM10 limit in Patna in 2019"
+    series = load_daily_series(version).answer(question)
+    if series is not None:
+        return series
+
+    # City statistics: "AQI in Delhi", "PM2.5 in Lucknow in 2019"
+    stats = load_city_stats(version).answer(question)
+    if stats is not None:
+        return stats
 
-    return None  # Return None if no dataset match
+    # Then predefined responses again, tolerating punctuation, rephrasing and typos
+    canned = load_intent_matcher(city_names(version)).match(query)
+    if canned is not None:
+        return canned
+
+    # Check dataset for matching data through the token index
+    return load_query_engine(version).answer(question)  # None if no dataset match
 
 def chatbot_ui():
     """Chatbot UI for Air Quality Assistant"""
@@ -99,7 +130,7 @@ def chatbot_ui():
             # First, check predefined responses & dataset
             bot_response = search_dataset(user_query)
 
-            if bot_response is None:  # If no dataset match, use AI model
+            if bot_response is None:  # If no dataset match, stream the AI model's answer
                 prompt = f"""
                 You are an AI assistant helping users understand an air quality dataset and Power BI dashboard.
                 - Dataset contains air quality metrics for multiple cities.
@@ -109,11 +140,11 @@ def chatbot_ui():
 
                 Question: {user_query}
                 """
-                response = model.generate_content(prompt)
-                bot_response = response.text
-
-            with st.chat_message("assistant"):
-                st.markdown(bot_response)
+                with st.chat_message("assistant"):
+                    bot_response = st.write_stream(load_llm_client().stream(prompt))
+            else:
+                with st.chat_message("assistant"):
+                    st.markdown(bot_response)
 
             st.session_state.messages.append({"role": "user", "content": user_query})
             st.session_state.messages.append({"role": "assistant", "content": bot_response})
@@ -121,8 +152,6 @@ def chatbot_ui():
         except Exception as e:
             st.error(f"Error fetching response: {e}")
 
-chatbot_ui()
-
 def chatbot_button():
     """Button to toggle chatbot visibility, only on allowed pages."""
     
@@ -143,7 +172,3 @@ def chatbot_button():
 
         if st.session_state.show_chatbot:
             chatbot_ui()  # Load chatbot UI only when button is clicked
-
-# Call chatbot button in the main sidebar
-chatbot_button()
-
@@ -0,0 +1,266 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+from query_engine import POLLUTANTS
+
+# Pairs of cities with fewer common days than this get no correlation
+MIN_OVERLAP_DAYS = 30
+
+# Lags tried by lags(), in days either way
+MAX_LAG_DAYS = 7
+
+# Spare days allocated when the grid is laid out, so appending a day at a time rarely lays it out again
+GROWTH_DAYS = 31
+
+DAY = np.timedelta64(1, "D")
+
+
+class CityComparison:
+    """Any set of cities compared over any period, read from one city × day matrix per pollutant
+
+    The matrix holds every city on one calendar-day grid (missing days are
+    NaN) with running sums and counts along the days, and is built the first
+    time a pollutant is asked for. A period is a slice of the day axis, i.e.
+    a view; only the rows of the chosen cities are gathered, once per query.
+    Period means for every city are two lookups in the running sums, so
+    ranking hundreds of cities per month costs one subtraction per cell.
+    Pairwise correlations, over the days both cities have a reading, are
+    matrix products over the masked values, one set per lag tried. update()
+    writes new days into the built matrices; a new city, or a day outside
+    the grid's spare room, lays the grid out again.
+    """
+
+    def __init__(self, df=None):
+        self.pollutants = []
+        self.cities = []
+        self.city_index = {}
+        self.start = np.datetime64("1970-01-01", "D")
+        self.n_days = 0
+        self._capacity = 0
+        self._parts = []
+        self._matrices = {}
+        if df is not None:
+            self.update(df)
+
+    def update(self, rows):
+        """Write rows (same columns as the dataset) into the grid; a (city, day) written again keeps the last row"""
+        rows = rows[rows["City"].notna() & rows["Date"].notna()]
+        if not len(rows):
+            return
+        self.pollutants = [p for p in POLLUTANTS if p in self.pollutants or p in rows.columns]
+        self._parts.append(rows)
+        days = rows["Date"].to_numpy().astype("datetime64[D]")
+        cities = rows["City"].astype(str)
+        if (not self.cities or not cities.isin(self.city_index).all()
+                or days.min() < self.start or days.max() >= self.start + self._capacity):
+            self._layout()
+            return
+        self.n_days = max(self.n_days, int((days.max() - self.start) / DAY) + 1)
+        cells = self._cells_of(cities, days)
+        first = int((days.min() - self.start) / DAY)
+        for pollutant, (values, sums, counts) in self._matrices.items():
+            if pollutant in rows.columns:
+                values.reshape(-1)[cells] = rows[pollutant].to_numpy(dtype=np.float64, na_value=np.nan)
+            _accumulate(values, sums, counts, first, self.n_days)
+
+    def copy(self):
+        """Independent copy to update() while readers go on using this one; the rows seen so far are shared"""
+        other = copy.copy(self)
+        # Sessions may merge the parts or add matrices meanwhile; each is taken in one step
+        other._parts = list(self._parts)
+        other._matrices = {pollutant: tuple(a.copy() for a in arrays) for pollutant, arrays in dict(self._matrices).items()}
+        return other
+
+    def _layout(self):
+        """Lay the grid out for every row so far, with spare days for the ones to come"""
+        frame = pd.concat(self._parts, ignore_index=True) if len(self._parts) > 1 else self._parts[0]
+        self._parts = [frame]
+        days = frame["Date"].to_numpy().astype("datetime64[D]")
+        self.start = days.min()
+        self.n_days = int((days.max() - self.start) / DAY) + 1
+        self._capacity = self.n_days + GROWTH_DAYS
+        self.cities = sorted(frame["City"].astype(str).unique())
+        self.city_index = {city: i for i, city in enumerate(self.cities)}
+        self._matrices = {}
+
+    def _cells_of(self, cities, days):
+        """Flat positions in the grid of each row's (city, day)"""
+        codes = cities.map(self.city_index).to_numpy(dtype=np.int64)
+        return codes * self._capacity + ((days - self.start) / DAY).astype(np.int64)
+
+    @property
+    def dates(self):
+        return pd.DatetimeIndex(self.start + np.arange(self.n_days) * DAY, name="Date")
+
+    def _matrix(self, pollutant):
+        """(values, running sums, running counts) of pollutant; sums and counts have a leading zero column"""
+        if pollutant not in self._matrices:
+            frame = pd.concat(self._parts, ignore_index=True) if len(self._parts) > 1 else self._parts[0]
+            self._parts = [frame]
+            cells = self._cells_of(frame["City"].astype(str), frame["Date"].to_numpy().astype("datetime64[D]"))
+            values = np.full(len(self.cities) * self._capacity, np.nan)
+            if pollutant in frame.columns:
+                values[cells] = frame[pollutant].to_numpy(dtype=np.float64, na_value=np.nan)
+            values = values.reshape(len(self.cities), self._capacity)
+            sums = np.zeros((len(self.cities), self._capacity + 1))
+            counts = np.zeros((len(self.cities), self._capacity + 1), dtype=np.int64)
+            _accumulate(values, sums, counts, 0, self.n_days)
+            self._matrices[pollutant] = (values, sums, counts)
+        return self._matrices[pollutant]
+
+    def _span(self, start=None, end=None):
+        """Positions [i, j) of the days from start to end, both included"""
+        i = 0 if start is None else int(self.dates.searchsorted(pd.Timestamp(start)))
+        j = self.n_days if end is None else int(self.dates.searchsorted(pd.Timestamp(end), side="right"))
+        return i, max(i, j)
+
+    def _rows_of(self, cities):
+        if cities is None:
+            return slice(None), list(self.cities)
+        cities = [c for c in cities if c in self.city_index]
+        return np.array([self.city_index[c] for c in cities], dtype=np.int64), cities
+
+    def matrix(self, pollutant="AQI", start=None, end=None):
+        """Every city's days from start to end as a read-only (city × day) view, without copying"""
+        values = self._matrix(pollutant)[0]
+        i, j = self._span(start, end)
+        view = values[:, i:j]
+        view.flags.writeable = False
+        return view
+
+    # ------------ Queries ------------
+
+    def aligned(self, cities=None, pollutant="AQI", start=None, end=None):
+        """Daily readings of the cities side by side: one row per day of the period, one column per city"""
+        rows, cities = self._rows_of(cities)
+        i, j = self._span(start, end)
+        block = self._matrix(pollutant)[0][rows, i:j]
+        return pd.DataFrame(block.T, index=self.dates[i:j], columns=pd.Index(cities, name="City"))
+
+    def period_means(self, cities=None, pollutant="AQI", start=None, end=None):
+        """Mean of each city over the period; same as filtering the rows and grouping by city"""
+        rows, cities = self._rows_of(cities)
+        i, j = self._span(start, end)
+        _, sums, counts = self._matrix(pollutant)
+        total, n = sums[rows, j] - sums[rows, i], counts[rows, j] - counts[rows, i]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return pd.Series(np.where(n > 0, total / n, np.nan), index=pd.Index(cities, name="City"), name=pollutant)
+
+    def correlations(self, cities=None, pollutant="AQI", start=None, end=None, min_days=MIN_OVERLAP_DAYS):
+        """Pearson correlation of every pair of cities over the days both have a reading (as DataFrame.corr())"""
+        rows, cities = self._rows_of(cities)
+        i, j = self._span(start, end)
+        block = self._matrix(pollutant)[0][rows, i:j]
+        corr = _lagged_corr(*_masked(block), 0, min_days)
+        return pd.DataFrame(corr, index=pd.Index(cities, name="City"), columns=pd.Index(cities, name="City"))
+
+    def lags(self, cities=None, pollutant="AQI", start=None, end=None, max_lag=MAX_LAG_DAYS, min_days=MIN_OVERLAP_DAYS):
+        """For every pair (a, b), the lag in days at which b follows a most closely, and the correlation there
+
+        A lag of 2 means b's readings correlate best with a's from two days
+        earlier, i.e. a leads; negative lags mean b leads. Returns two
+        city × city frames, lag days and correlation at that lag.
+
+        The cost is six cities × cities × days matrix products per lag, run
+        at BLAS speed already: about 0.3 s for 400 cities over two years and
+        1.3 s for 800 on one core, growing with the square of the cities.
+        Stacking the products into fewer calls does no less arithmetic, and
+        an FFT over the days answers every lag at once for about the cost of
+        log2(days) lags, more than the eight computed by default; callers that
+        show the result on every rerun cache it (see app.py).
+        """
+        rows, cities = self._rows_of(cities)
+        i, j = self._span(start, end)
+        values, present = _masked(self._matrix(pollutant)[0][rows, i:j])
+        # corr(a(t), b(t + lag)) for lag >= 0; a negative lag is the transpose of the positive one
+        ahead = [_lagged_corr(values, present, lag, min_days) for lag in range(max_lag + 1)]
+        stack = np.stack([c.T for c in ahead[:0:-1]] + ahead)
+        filled = np.where(np.isnan(stack), -np.inf, stack)
+        best = np.argmax(filled, axis=0)
+        best_corr = np.take_along_axis(stack, best[None], axis=0)[0]
+        lag = np.where(np.isnan(best_corr), np.nan, best - max_lag)
+        np.fill_diagonal(lag, 0)
+        index = pd.Index(cities, name="City")
+        return (pd.DataFrame(lag, index=index, columns=index.rename("Follower")),
+                pd.DataFrame(best_corr, index=index, columns=index.rename("Follower")))
+
+    def leads(self, cities=None, pollutant="AQI", start=None, end=None, max_lag=MAX_LAG_DAYS, min_days=MIN_OVERLAP_DAYS):
+        """lags() as one row per pair, the leading city first, strongest correlation first"""
+        lag, corr = self.lags(cities, pollutant, start, end, max_lag, min_days)
+        a, b = np.triu_indices(len(lag), k=1)
+        lag, corr = lag.to_numpy()[a, b], corr.to_numpy()[a, b]
+        names = self._rows_of(cities)[1]
+        # A negative lag means the second city leads; the pair is turned around so lags read forwards
+        swap = lag < 0
+        table = pd.DataFrame({
+            "Leader": pd.Categorical.from_codes(np.where(swap, b, a), names),
+            "Follower": pd.Categorical.from_codes(np.where(swap, a, b), names),
+            "Lag (days)": np.abs(lag),
+            "Correlation": corr,
+        })
+        return table[table["Correlation"].notna()].sort_values("Correlation", ascending=False, ignore_index=True)
+
+    def ranks(self, cities=None, pollutant="AQI", start=None, end=None, freq="M"):
+        """Rank of each city by its mean in every period (1 = highest), one row per period
+
+        freq is a pandas period alias ("M", "Q", "Y"). A city with no reading
+        in a period has no rank there; equal means are ranked in city order.
+        """
+        rows, cities = self._rows_of(cities)
+        i, j = self._span(start, end)
+        periods = self.dates[i:j].to_period(freq)
+        if j == i:
+            return pd.DataFrame(index=periods, columns=pd.Index(cities, name="City"), dtype=float)
+        edges = np.concatenate([[0], np.flatnonzero(periods[1:] != periods[:-1]) + 1, [j - i]]) + i
+        _, sums, counts = self._matrix(pollutant)
+        total = np.diff(sums[rows][:, edges], axis=1)
+        n = np.diff(counts[rows][:, edges], axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(n > 0, total / n, np.nan)
+        # Missing means sort last; a stable sort keeps equal means in city order
+        order = np.argsort(np.where(np.isnan(means), np.inf, -means), axis=0, kind="stable")
+        ranks = np.empty(means.shape)
+        np.put_along_axis(ranks, order, np.arange(1, means.shape[0] + 1)[:, None].astype(float), axis=0)
+        ranks[np.isnan(means)] = np.nan
+        return pd.DataFrame(ranks.T, index=periods[edges[:-1] - i], columns=pd.Index(cities, name="City"))
+
+    def rank_changes(self, cities=None, pollutant="AQI", start=None, end=None, freq="M"):
+        """Places each city moved up (positive) or down between consecutive periods"""
+        ranks = self.ranks(cities, pollutant, start, end, freq)
+        return ranks.shift() - ranks
+
+
+def _accumulate(values, sums, counts, first, last):
+    """Running sums and counts of days [first, last) onwards, continuing from the ones before"""
+    present = ~np.isnan(values[:, first:last])
+    np.cumsum(np.where(present, values[:, first:last], 0.0), axis=1, out=sums[:, first + 1:last + 1])
+    np.cumsum(present, axis=1, out=counts[:, first + 1:last + 1])
+    sums[:, first + 1:last + 1] += sums[:, first:first + 1]
+    counts[:, first + 1:last + 1] += counts[:, first:first + 1]
+
+
+def _masked(block):
+    """Readings with missing days zeroed, and where the readings are"""
+    present = ~np.isnan(block)
+    return np.where(present, block, 0.0), present.astype(np.float64)
+
+
+def _lagged_corr(values, present, lag, min_days):
+    """corr(a(t), b(t + lag)) for every pair of rows, over the days where both are present"""
+    width = values.shape[1] - lag
+    if width <= 0:
+        return np.full((len(values), len(values)), np.nan)
+    # Slices of the day axis are views; each product below is one BLAS call over all pairs
+    a, b = values[:, :width], values[:, lag:]
+    ma, mb = present[:, :width], present[:, lag:]
+    n = ma @ mb.T
+    sum_a, sum_b = a @ mb.T, ma @ b.T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = a @ b.T - sum_a * sum_b / n
+        var_a = (a * a) @ mb.T - sum_a ** 2 / n
+        var_b = ma @ (b * b).T - sum_b ** 2 / n
+        corr = cov / np.sqrt(var_a * var_b)
+    corr[(n < max(min_days, 2)) | ~(var_a > 0) | ~(var_b > 0)] = np.nan
+    return np.clip(corr, -1.0, 1.0)
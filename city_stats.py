@@ -0,0 +1,245 @@
+import copy
+import re
+
+import numpy as np
+import pandas as pd
+
+from data_store import BUCKET_ORDER
+from intent_matcher import within_one_edit
+from query_engine import INTENTS, MONTH_NAMES, POLLUTANTS, UNITS, find_pollutant, tokenize
+
+# Percentiles kept for every city and pollutant
+PERCENTILES = [0.25, 0.5, 0.75, 0.95]
+
+# Words that mark a question as being about a city's air quality
+TOPIC_WORDS = {"aqi", "air", "quality", "pollution", "polluted", "level", "levels", "stats", "statistics", "trend", "summary"}
+
+# Shortest word taken for a misspelt city name ("dehli"), as in the intent matcher
+MIN_FUZZY_LENGTH = 5
+
+
+def _names_day_or_month(tokens):
+    """True if the question is about a day or a month ("on 2019-05-01", "in May 2019", "2019-05"), as QueryEngine.parse reads it"""
+    for i, token in enumerate(tokens):
+        if re.fullmatch(r"\d{4}-\d{2}(?:-\d{2})?", token):
+            return True
+        if token in MONTH_NAMES:
+            # "may" is usually a verb; QueryEngine takes it as a month next to "in"/"during"/"of" or a year
+            before = tokens[i - 1] if i else ""
+            after = tokens[i + 1] if i + 1 < len(tokens) else ""
+            if token != "may" or before in ("in", "during", "of") or re.fullmatch(r"(19|20)\d\d", after):
+                return True
+    return False
+
+
+def _sorted_quantiles(values, quantiles):
+    """Linear-interpolated quantiles of an already sorted array, without re-partitioning it"""
+    positions = np.asarray(quantiles) * (len(values) - 1)
+    low = np.floor(positions).astype(np.int64)
+    high = np.minimum(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (positions - low)
+
+
+def _new_entry():
+    return {
+        "count": 0, "sum": 0.0, "values": np.empty(0),
+        "latest_date": None, "latest_value": np.nan,
+        "worst_date": None, "worst_value": -np.inf,
+        "best_date": None, "best_value": np.inf,
+        "percentiles": np.full(len(PERCENTILES), np.nan),
+        "years": {},
+    }
+
+
+class CityStats:
+    """Per-city, per-pollutant statistics kept up to date as rows arrive
+
+    Every answer is read from the table, so its cost does not depend on the
+    number of rows. update() folds new rows into the cities they touch; sums,
+    extremes and yearly totals are merged, and percentiles are recomputed from
+    that city's sorted values only.
+    """
+
+    def __init__(self, df=None):
+        self.pollutants = []
+        self.entries = {}
+        self.buckets = {}
+        self.cities = []
+        if df is not None:
+            self.update(df)
+
+    def update(self, rows):
+        """Fold new rows (same columns as the dataset) into the table"""
+        pollutants = [p for p in POLLUTANTS if p in rows.columns]
+        self.pollutants = [p for p in POLLUTANTS if p in self.pollutants or p in pollutants]
+        rows = rows[rows["Date"].notna() & rows["City"].notna()]
+        # Columns are taken out of pandas once and sliced per city, so small live batches stay cheap
+        codes, cities = pd.factorize(rows["City"])
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(cities) + 1))
+        dates = rows["Date"].to_numpy()[order]
+        years = rows["Date"].dt.year.to_numpy()[order]
+        values = rows[pollutants].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+        for i, city in enumerate(cities):
+            part = slice(bounds[i], bounds[i + 1])
+            for j, pollutant in enumerate(pollutants):
+                column = values[part, j]
+                present = ~np.isnan(column)
+                if present.any():
+                    self._merge(self.entries.setdefault((city, pollutant), _new_entry()), column[present], dates[part][present], years[part][present])
+        if "AQI_Bucket" in rows.columns:
+            for (code, bucket), n in pd.DataFrame({"city": codes, "bucket": rows["AQI_Bucket"].to_numpy()}).value_counts(sort=False).items():
+                counts = self.buckets.setdefault(cities[code], {})
+                counts[bucket] = counts.get(bucket, 0) + int(n)
+        self.cities = sorted({city for city, _ in self.entries})
+
+    def copy(self):
+        """Independent copy to update() while readers go on using this one"""
+        other = copy.copy(self)
+        # update() replaces an entry's arrays instead of writing into them, so only the dicts need copying
+        other.entries = {key: dict(entry, years=dict(entry["years"])) for key, entry in self.entries.items()}
+        other.buckets = {city: dict(counts) for city, counts in self.buckets.items()}
+        return other
+
+    @staticmethod
+    def _merge(entry, values, dates, years):
+        entry["count"] += len(values)
+        entry["sum"] += float(values.sum())
+
+        new = np.sort(values)
+        old = entry["values"]
+        entry["values"] = np.insert(old, np.searchsorted(old, new), new) if len(old) else new
+        entry["percentiles"] = _sorted_quantiles(entry["values"], PERCENTILES)
+
+        i = int(np.argmax(values))
+        if values[i] > entry["worst_value"]:
+            entry["worst_value"], entry["worst_date"] = float(values[i]), pd.Timestamp(dates[i])
+        i = int(np.argmin(values))
+        if values[i] < entry["best_value"]:
+            entry["best_value"], entry["best_date"] = float(values[i]), pd.Timestamp(dates[i])
+        i = int(np.argmax(dates))
+        if entry["latest_date"] is None or pd.Timestamp(dates[i]) >= entry["latest_date"]:
+            entry["latest_value"], entry["latest_date"] = float(values[i]), pd.Timestamp(dates[i])
+
+        unique_years, inverse = np.unique(years, return_inverse=True)
+        counts = np.bincount(inverse)
+        sums = np.bincount(inverse, weights=values)
+        lows = np.full(len(unique_years), np.inf)
+        highs = np.full(len(unique_years), -np.inf)
+        np.minimum.at(lows, inverse, values)
+        np.maximum.at(highs, inverse, values)
+        for year, n, total, low, high in zip(unique_years.tolist(), counts, sums, lows, highs):
+            count, old_sum, old_low, old_high = entry["years"].get(year, (0, 0.0, np.inf, -np.inf))
+            entry["years"][year] = (count + int(n), old_sum + float(total), min(old_low, low), max(old_high, high))
+
+    # ------------ Lookups ------------
+
+    def get(self, city, pollutant="AQI"):
+        return self.entries.get((city, pollutant))
+
+    def mean(self, city, pollutant="AQI", year=None):
+        entry = self.get(city, pollutant)
+        if entry is None:
+            return np.nan
+        if year is None:
+            return entry["sum"] / entry["count"] if entry["count"] else np.nan
+        count, total, _, _ = entry["years"].get(year, (0, 0.0, np.nan, np.nan))
+        return total / count if count else np.nan
+
+    def extreme(self, pollutant="AQI", highest=True):
+        """(city, value, date) of the single highest or lowest reading"""
+        key = "worst" if highest else "best"
+        candidates = [(city, e[f"{key}_value"], e[f"{key}_date"]) for (city, p), e in self.entries.items() if p == pollutant]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda c: c[1]) if highest else min(candidates, key=lambda c: c[1])
+
+    def yearly_change(self, city, pollutant="AQI", year=None):
+        """(year, previous year, % change of the yearly mean), for the latest year if none is given"""
+        entry = self.get(city, pollutant)
+        if entry is None:
+            return None
+        years = sorted(entry["years"])
+        year = years[-1] if year is None else year
+        if year not in entry["years"] or year - 1 not in entry["years"]:
+            return None
+        now, before = self.mean(city, pollutant, year), self.mean(city, pollutant, year - 1)
+        return year, year - 1, (now - before) / before * 100 if before else np.nan
+
+    def bucket_shares(self, city):
+        counts = self.buckets.get(city, {})
+        total = sum(counts.values())
+        return [(b, counts[b] / total) for b in BUCKET_ORDER if counts.get(b)] if total else []
+
+    # ------------ Answers ------------
+
+    def answer(self, query):
+        """Answer "AQI in <city>", "<pollutant> in <city> in <year>" style questions, or None"""
+        tokens = tokenize(query)
+        text = " ".join(tokens)
+        # Extremes over months, days or cities, and single days or months, are left to the query engine
+        if any(re.search(rf"\b{w}\b", text) for words in INTENTS.values() for w in words):
+            return None
+        if any(w in tokens for words in UNITS.values() for w in words):
+            return None
+        if _names_day_or_month(tokens):
+            return None
+
+        city = self._find_city(text, tokens)
+        pollutants = {p.lower(): p for p in self.pollutants}
+        pollutant = find_pollutant(tokens, pollutants, query)
+        if city is None or (pollutant is None and not TOPIC_WORDS & set(tokens)):
+            return None
+        pollutant = pollutant or "AQI"
+        year = next((int(t) for t in tokens if re.fullmatch(r"(19|20)\d\d", t)), None)
+
+        entry = self.get(city, pollutant)
+        if entry is None:
+            return f"There are no {pollutant} readings for {city}."
+        if year is not None:
+            return self._year_answer(city, pollutant, year, entry)
+        return self._city_answer(city, pollutant, entry)
+
+    def _find_city(self, text, tokens):
+        """City named in the question, tolerating one typo in a one-word name ("dehli")"""
+        city = next((c for c in self.cities if re.search(rf"\b{re.escape(c.lower())}\b", text)), None)
+        if city is not None:
+            return city
+        names = {c.lower(): c for c in self.cities if " " not in c}
+        for token in tokens:
+            if len(token) >= MIN_FUZZY_LENGTH and token not in TOPIC_WORDS:
+                match = next((names[n] for n in names if within_one_edit(token, n)), None)
+                if match is not None:
+                    return match
+        return None
+
+    def _city_answer(self, city, pollutant, entry):
+        p25, p50, p75, p95 = entry["percentiles"]
+        lines = [
+            f"**{pollutant} in {city}**: latest reading **{entry['latest_value']:.1f}** on {entry['latest_date'].date()}.",
+            f"Average **{entry['sum'] / entry['count']:.1f}**, median {p50:.1f} "
+            f"(middle half {p25:.1f}–{p75:.1f}, 95th percentile {p95:.1f}) over {entry['count']:,} days.",
+            f"Worst day: **{entry['worst_value']:.1f}** on {entry['worst_date'].date()}.",
+        ]
+        if pollutant == "AQI":
+            shares = self.bucket_shares(city)
+            if shares:
+                lines.append("Days by category: " + ", ".join(f"{b} {share:.0%}" for b, share in shares) + ".")
+        change = self.yearly_change(city, pollutant)
+        if change is not None:
+            year, previous, percent = change
+            lines.append(f"{year} averaged {self.mean(city, pollutant, year):.1f}, "
+                         f"{abs(percent):.1f}% {'higher' if percent >= 0 else 'lower'} than {previous}.")
+        return "\n\n".join(lines)
+
+    def _year_answer(self, city, pollutant, year, entry):
+        if year not in entry["years"]:
+            return f"There are no {pollutant} readings for {city} in {year}."
+        count, total, low, high = entry["years"][year]
+        text = (f"**{pollutant} in {city} in {year}**: average **{total / count:.1f}** over {count:,} days "
+                f"(lowest {low:.1f}, highest {high:.1f}).")
+        change = self.yearly_change(city, pollutant, year)
+        if change is not None:
+            _, previous, percent = change
+            text += f" That is {abs(percent):.1f}% {'higher' if percent >= 0 else 'lower'} than {previous}."
+        return text
@@ -0,0 +1,295 @@
+import copy
+import re
+
+import numpy as np
+import pandas as pd
+
+from query_engine import POLLUTANTS, find_pollutant, tokenize
+
+# Rolling mean windows, in calendar days
+WINDOWS = [7, 30, 365]
+
+# WHO 2021 air quality guideline levels for 24-hour means (µg/m³; CO in mg/m³).
+# O3's guideline is for the daily maximum 8-hour mean; the daily mean is compared instead.
+WHO_LIMITS = {"PM2.5": 15.0, "PM10": 45.0, "NO2": 25.0, "SO2": 40.0, "CO": 4.0, "O3": 100.0}
+
+# Words that ask about guideline exceedances, and about rolling means
+EXCEEDANCE_WORDS = {"exceed", "exceeded", "exceeds", "exceeding", "exceedance", "exceedances", "limit", "limits",
+                    "guideline", "guidelines", "streak", "streaks", "unsafe"}
+ROLLING_WORDS = {"rolling", "moving", "weekly"}
+
+# Spare days allocated when a city's grid grows, so appending a day at a time rarely copies the grid
+GROWTH_DAYS = 31
+
+DAY = np.timedelta64(1, "D")
+
+
+def _runs(exceeded, seed):
+    """Length of the exceedance streak ending on each day, continuing the streaks `seed` ended the day before"""
+    counts = np.cumsum(exceeded, axis=0)
+    # Count at the last non-exceeding day up to each row; the streak is what has been added since
+    reset = np.maximum.accumulate(np.where(exceeded, 0, counts), axis=0)
+    runs = counts - reset
+    # Rows before the first non-exceeding day extend the previous streak
+    return runs + np.where(np.cumsum(~exceeded, axis=0) == 0, seed, 0)
+
+
+class DailySeries:
+    """Calendar-day series per city, with rolling means and WHO guideline exceedances
+
+    Each city keeps its readings on a dense day grid (missing days are NaN)
+    with running sums and counts, so the mean of any window is two lookups,
+    and the length of the exceedance streak ending on every day. update()
+    writes new or corrected days and recomputes these from the earliest day
+    it touched onwards, so appending a day costs O(1) per city. Query results
+    are cached per city until that city is updated again. copy() shares
+    every city's arrays; update() copies a shared city's before writing.
+    """
+
+    def __init__(self, df=None):
+        self.pollutants = []
+        self.cities = {}
+        self._memo = {}
+        # Cities whose arrays another copy may still be reading
+        self._shared = set()
+        if df is not None:
+            self.update(df)
+
+    def update(self, rows):
+        """Write rows (same columns as the dataset) into their cities' series; a day written again replaces the old one"""
+        rows = rows[rows["City"].notna() & rows["Date"].notna()]
+        added = [p for p in POLLUTANTS if p in rows.columns and p not in self.pollutants]
+        if added:
+            self._add_pollutants(added)
+        columns = [self.pollutants.index(p) for p in self.pollutants if p in rows.columns]
+        present = [p for p in self.pollutants if p in rows.columns]
+        # One conversion for all rows; per-city work below is on numpy slices only
+        cities = rows["City"].astype("category")
+        codes = cities.cat.codes.to_numpy()
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(cities.cat.categories) + 1))
+        days = rows["Date"].to_numpy().astype("datetime64[D]")[order]
+        values = rows[present].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+        touched = set()
+        for code, city in enumerate(cities.cat.categories):
+            lo, hi = bounds[code], bounds[code + 1]
+            if lo < hi:
+                self._write(city, days[lo:hi], columns, values[lo:hi])
+                touched.add(city)
+        self._memo = {key: value for key, value in self._memo.items() if key[0] not in touched}
+
+    def copy(self):
+        """Independent copy to update() while readers go on using this one; cached query results are shared
+
+        Nothing is copied per city here: both sides mark every city shared,
+        and a city is copied only when an update() writes to it, so folding
+        in a batch costs what the cities it touches hold.
+        """
+        other = copy.copy(self)
+        other.cities = dict(self.cities)
+        # dict() of the memo is one step, so sessions filling it meanwhile cannot break the copy
+        other._memo = dict(self._memo)
+        self._shared, other._shared = set(self.cities), set(self.cities)
+        return other
+
+    def _add_pollutants(self, added):
+        self.pollutants = self.pollutants + added
+        # New dicts and arrays for every city, so none is shared any more
+        self.cities = {city: dict(
+            series,
+            values=np.hstack([series["values"], np.full((len(series["values"]), len(added)), np.nan)]),
+            sums=np.hstack([series["sums"], np.zeros((len(series["values"]) + 1, len(added)))]),
+            counts=np.hstack([series["counts"], np.zeros((len(series["values"]) + 1, len(added)))]),
+            runs=np.hstack([series["runs"], np.zeros((len(series["values"]), len(added)), dtype=np.int64)]),
+        ) for city, series in self.cities.items()}
+        self._shared = set()
+
+    @staticmethod
+    def _resize(series, offset, capacity):
+        """Reallocate a city's arrays for `capacity` days, moving the current days `offset` days later"""
+        n, k = series["length"], series["values"].shape[1]
+        values = np.full((capacity, k), np.nan)
+        values[offset:offset + n] = series["values"][:n]
+        sums, counts = np.zeros((capacity + 1, k)), np.zeros((capacity + 1, k))
+        runs = np.zeros((capacity, k), dtype=np.int64)
+        # A shifted grid is recomputed from its first day anyway
+        if not offset:
+            sums[:n + 1], counts[:n + 1], runs[:n] = series["sums"][:n + 1], series["counts"][:n + 1], series["runs"][:n]
+        series.update(values=values, sums=sums, counts=counts, runs=runs)
+
+    def _write(self, city, days, columns, values):
+        k = len(self.pollutants)
+        first_day, last_day = days.min(), days.max()
+        series = self.cities.get(city)
+        if city in self._shared:
+            series = self.cities[city] = {key: value.copy() if isinstance(value, np.ndarray) else value for key, value in series.items()}
+            self._shared.discard(city)
+        if series is None:
+            series = self.cities[city] = {"start": first_day, "length": 0, "values": np.empty((0, k)), "sums": np.zeros((1, k)),
+                                          "counts": np.zeros((1, k)), "runs": np.zeros((0, k), dtype=np.int64)}
+        start, n = series["start"], series["length"]
+
+        # Grow the grid to cover the new days; growing at the front shifts everything
+        offset = max(int((start - first_day) / DAY), 0)
+        length = max(n + offset, int((last_day - start) / DAY) + offset + 1)
+        if offset or length > len(series["values"]):
+            self._resize(series, offset, length + GROWTH_DAYS if n else length)
+            series["start"] = start = min(start, first_day)
+        series["length"] = length
+
+        positions = ((days - start) / DAY).astype(np.int64)
+        series["values"][np.ix_(positions, columns)] = values
+        # Everything from the first changed day on depends on it (and on all days if the grid moved)
+        first = 0 if offset else min(int(positions.min()), n)
+        self._refresh(series, first)
+
+    def _refresh(self, series, first):
+        n = series["length"]
+        values = series["values"][first:n]
+        present = ~np.isnan(values)
+        series["sums"][first + 1:n + 1] = series["sums"][first] + np.cumsum(np.where(present, values, 0.0), axis=0)
+        series["counts"][first + 1:n + 1] = series["counts"][first] + np.cumsum(present, axis=0)
+        limits = np.array([WHO_LIMITS.get(p, np.inf) for p in self.pollutants])
+        with np.errstate(invalid="ignore"):
+            exceeded = values > limits
+        seed = series["runs"][first - 1] if first > 0 else 0
+        series["runs"][first:n] = _runs(exceeded, seed)
+
+    # ------------ Lookups ------------
+
+    def _cached(self, city, name, key, compute):
+        memo_key = (city, name, key)
+        if memo_key not in self._memo:
+            self._memo[memo_key] = compute()
+        return self._memo[memo_key]
+
+    def dates(self, city):
+        series = self.cities[city]
+        return pd.DatetimeIndex(series["start"] + np.arange(series["length"]) * DAY, name="Date")
+
+    def rolling(self, city, pollutant="AQI", windows=WINDOWS):
+        """Mean of the readings in the last w calendar days, for every day of the city's grid and every window
+
+        Same values as series.dropna().rolling(f"{w}D").mean() on the days that
+        have a reading; days with no reading in the window are NaN.
+        """
+        def compute():
+            series = self.cities[city]
+            j = self.pollutants.index(pollutant)
+            n = series["length"]
+            sums, counts = series["sums"][:n + 1, j], series["counts"][:n + 1, j]
+            end = np.arange(1, len(sums))
+            frame = {}
+            for window in windows:
+                begin = np.maximum(end - window, 0)
+                n = counts[end] - counts[begin]
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    frame[f"{window}-day"] = np.where(n > 0, (sums[end] - sums[begin]) / n, np.nan)
+            return pd.DataFrame(frame, index=self.dates(city))
+        return self._cached(city, "rolling", (pollutant, tuple(windows)), compute)
+
+    def latest(self, city, pollutant="AQI", windows=WINDOWS):
+        """(date, {window: mean}) on the city's last day with a reading of pollutant, or None"""
+        series = self.cities.get(city)
+        if series is None or pollutant not in self.pollutants:
+            return None
+        j = self.pollutants.index(pollutant)
+        present = np.flatnonzero(~np.isnan(series["values"][:series["length"], j]))
+        if not len(present):
+            return None
+        row = self.rolling(city, pollutant, windows).iloc[present[-1]]
+        return row.name, row.to_dict()
+
+    def exceedances(self, city, pollutant, year=None):
+        """Days with a reading, days above the WHO guideline and the longest streak of such days (all years or one)"""
+        def compute():
+            series = self.cities[city]
+            j = self.pollutants.index(pollutant)
+            n = series["length"]
+            values, runs = series["values"][:n, j], series["runs"][:n, j]
+            dates = self.dates(city)
+            if year is not None:
+                inside = dates.year == year
+                values, dates = values[inside], dates[inside]
+                # Streaks are cut at the start of the year
+                runs = _runs(values > WHO_LIMITS[pollutant], 0) if len(values) else runs[:0]
+            days = int(np.count_nonzero(~np.isnan(values)))
+            exceeded = int(np.count_nonzero(values > WHO_LIMITS[pollutant]))
+            result = {"limit": WHO_LIMITS[pollutant], "days": days, "exceeded": exceeded,
+                      "share": exceeded / days if days else np.nan, "longest": 0, "longest_start": None,
+                      "longest_end": None, "current": 0}
+            if exceeded:
+                end = int(np.argmax(runs))
+                result.update(longest=int(runs[end]), longest_start=dates[end - runs[end] + 1], longest_end=dates[end])
+                present = np.flatnonzero(~np.isnan(values))
+                result["current"] = int(runs[present[-1]])
+            return result
+        with np.errstate(invalid="ignore"):
+            return self._cached(city, "exceedances", (pollutant, year), compute)
+
+    def exceedance_table(self, city=None):
+        """Exceedances per WHO pollutant for one city, or the share of days above each guideline per city"""
+        pollutants = [p for p in WHO_LIMITS if p in self.pollutants]
+        if city is not None:
+            rows = []
+            for pollutant in pollutants:
+                e = self.exceedances(city, pollutant)
+                rows.append({
+                    "Pollutant": pollutant, "WHO limit": e["limit"], "Days": e["days"], "Days above": e["exceeded"],
+                    "Share": e["share"], "Longest streak": e["longest"],
+                    "From": e["longest_start"].date() if e["longest"] else None,
+                    "To": e["longest_end"].date() if e["longest"] else None,
+                    "Current streak": e["current"],
+                })
+            return pd.DataFrame(rows)
+        shares = {p: [self.exceedances(c, p)["share"] for c in sorted(self.cities)] for p in pollutants}
+        return pd.DataFrame(shares, index=pd.Index(sorted(self.cities), name="City"))
+
+    # ------------ Answers ------------
+
+    def answer(self, query):
+        """Answer "days above the WHO PM2.5 limit in Delhi" or "30-day average AQI in Pune" style questions, or None"""
+        tokens = tokenize(query)
+        text = " ".join(tokens)
+        city = next((c for c in sorted(self.cities) if re.search(rf"\b{re.escape(c.lower())}\b", text)), None)
+        if city is None:
+            return None
+        pollutants = {p.lower(): p for p in self.pollutants}
+        pollutant = find_pollutant(tokens, pollutants, query)
+        year = next((int(t) for t in tokens if re.fullmatch(r"(19|20)\d\d", t)), None)
+
+        if EXCEEDANCE_WORDS & set(tokens):
+            return self._exceedance_answer(city, pollutant or "PM2.5", year)
+        windows = [w for w in WINDOWS if re.search(rf"\b{w} days?\b", text)]
+        if ROLLING_WORDS & set(tokens) or windows:
+            if "weekly" in tokens and 7 not in windows:
+                windows.append(7)
+            return self._rolling_answer(city, pollutant or "AQI", windows or WINDOWS)
+        return None
+
+    def _exceedance_answer(self, city, pollutant, year):
+        if pollutant not in WHO_LIMITS:
+            return f"There is no WHO daily guideline for {pollutant}; limits exist for {', '.join(WHO_LIMITS)}."
+        if pollutant not in self.pollutants:
+            return f"There are no {pollutant} readings for {city}."
+        e = self.exceedances(city, pollutant, year)
+        period = f" in {year}" if year is not None else ""
+        unit = "mg/m³" if pollutant == "CO" else "µg/m³"
+        if not e["days"]:
+            return f"There are no {pollutant} readings for {city}{period}."
+        text = (f"**{city}** was above the WHO 24-hour guideline for {pollutant} ({e['limit']:g} {unit}) on "
+                f"**{e['exceeded']:,} of {e['days']:,} days**{period} ({e['share']:.0%}).")
+        if e["longest"]:
+            text += (f" The longest run was **{e['longest']} days in a row**, "
+                     f"{e['longest_start'].date()} to {e['longest_end'].date()}.")
+            if year is None and e["current"]:
+                text += f" The latest reading extends a streak of {e['current']} days."
+        return text
+
+    def _rolling_answer(self, city, pollutant, windows):
+        latest = self.latest(city, pollutant, WINDOWS)
+        if latest is None:
+            return f"There are no {pollutant} readings for {city}."
+        date, means = latest
+        parts = [f"{w}-day **{means[f'{w}-day']:.1f}**" for w in sorted(windows)]
+        return f"**{pollutant} in {city}**, rolling averages up to {date.date()}: " + ", ".join(parts) + "."
@@ -0,0 +1,163 @@
+import hashlib
+import io
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from data_store import CACHE_DIR
+
+# Finished exports are kept here, up to EXPORT_CACHE_BYTES in total
+EXPORT_DIR = os.path.join(CACHE_DIR, "exports")
+EXPORT_CACHE_BYTES = 256 * 1024 * 1024
+
+# Rows converted and written at a time; bounds the memory an export needs
+BATCH_ROWS = 10_000
+
+# zlib level of CSV exports; higher levels take several times longer for a few percent less
+GZIP_LEVEL = 3
+
+# Download formats: label -> (file extension, MIME type)
+FORMATS = {
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Arrow IPC": ("arrow", "application/vnd.apache.arrow.stream"),
+}
+
+
+class _Spool(io.RawIOBase):
+    """Write target that hands back whatever was written since the last drain()"""
+
+    def __init__(self):
+        self.parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _batches(df, rows, columns, batch_rows):
+    """Selected rows and columns of df as Arrow record batches, batch_rows at a time (one empty batch if no rows)"""
+    for start in range(0, max(len(rows), 1), batch_rows):
+        part = df.iloc[rows[start:start + batch_rows]][columns]
+        batch = pa.RecordBatch.from_pandas(part, preserve_index=False)
+        # Plain strings and calendar dates read better outside Arrow-aware tools
+        fields = []
+        for field in batch.schema:
+            if pa.types.is_dictionary(field.type):
+                field = field.with_type(field.type.value_type)
+            elif pa.types.is_timestamp(field.type) and field.name == "Date":
+                field = field.with_type(pa.date32())
+            fields.append(field)
+        yield batch.cast(pa.schema(fields))
+
+
+def iter_export(df, rows, columns, fmt, batch_rows=BATCH_ROWS):
+    """Encoded bytes of an export, yielded batch by batch as soon as each is written
+
+    rows are positions into df (e.g. from TableIndex.rows()), columns the
+    columns to keep and fmt a key of FORMATS. Only one batch of rows is
+    converted at a time, so memory does not grow with the size of the export.
+    """
+    extension, _ = FORMATS[fmt]
+    if extension == "csv.gz":
+        yield from _iter_csv_gzip(df, rows, columns, batch_rows)
+        return
+
+    spool = _Spool()
+    writer = None
+    for batch in _batches(df, rows, columns, batch_rows):
+        if writer is None:
+            if extension == "parquet":
+                writer = pq.ParquetWriter(spool, batch.schema, compression="zstd")
+            else:
+                writer = pa.ipc.new_stream(spool, batch.schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+        if extension == "parquet":
+            writer.write_batch(batch, row_group_size=batch_rows)
+        else:
+            writer.write_batch(batch)
+        data = spool.drain()
+        if data:
+            yield data
+    writer.close()
+    data = spool.drain()
+    if data:
+        yield data
+
+
+def _iter_csv_gzip(df, rows, columns, batch_rows):
+    # Arrow's gzip stream has no level setting and defaults to the slowest one
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for i, batch in enumerate(_batches(df, rows, columns, batch_rows)):
+        text = pa.BufferOutputStream()
+        pacsv.write_csv(batch, text, pacsv.WriteOptions(include_header=i == 0))
+        # Flushed per batch so the first bytes go out before the rest is converted
+        data = compressor.compress(text.getvalue()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class ExportCache:
+    """Finished exports on disk, keyed by everything that selects their content
+
+    Exports are streamed straight into a file, so building one never holds
+    the whole output in memory. The least recently used files are deleted
+    once the total size passes max_bytes.
+    """
+
+    def __init__(self, directory=EXPORT_DIR, max_bytes=EXPORT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        # Files left by an earlier run count towards the budget, oldest first
+        found = [(entry.stat().st_mtime, entry.path, entry.stat().st_size) for entry in os.scandir(directory) if entry.name.startswith("export-")]
+        self.files = OrderedDict((path, size) for _, path, size in sorted(found))
+        self.bytes = sum(self.files.values())
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def path(self, key, fmt):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:20]
+        return os.path.join(self.directory, f"export-{digest}.{FORMATS[fmt][0]}")
+
+    def get(self, key, df, rows, columns, fmt):
+        """Path of the export for key, written from df first if it is not on disk"""
+        path = self.path(key, fmt)
+        with self._lock:
+            if path in self.files and os.path.exists(path):
+                self.files.move_to_end(path)
+                return path
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as out:
+            for chunk in iter_export(df, rows, columns, fmt):
+                out.write(chunk)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.bytes -= self.files.pop(path, 0)
+            self.files[path] = os.path.getsize(path)
+            self.bytes += self.files[path]
+            # The newest file is kept even if it alone is over budget: it is about to be downloaded
+            while self.bytes > self.max_bytes and len(self.files) > 1:
+                old_path, size = self.files.popitem(last=False)
+                self.bytes -= size
+                self.evictions += 1
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+        return path
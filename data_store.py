@@ -0,0 +1,132 @@
+import os
+import pandas as pd
+import pyarrow as pa
+
+# Source CSV used by the dashboard and the chatbot (override with AQ_DATA_PATH)
+DATA_PATH = os.environ.get("AQ_DATA_PATH", r"C:\Users\RISHIRAJ\OneDrive\Desktop\final_cleaned_city_day.csv")
+
+# Converted copies of the CSV live here (override with AQ_CACHE_DIR)
+CACHE_DIR = os.environ.get("AQ_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".aq_cache"))
+
+# Append-only partitions written by ingest.py; when any exist they replace the CSV (override with AQ_PARTITIONS_DIR)
+PARTITIONS_DIR = os.environ.get("AQ_PARTITIONS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "partitions"))
+
+# Columns stored as dictionary-encoded categoricals
+CATEGORICAL_COLUMNS = ["City", "AQI_Bucket"]
+
+# AQI_Bucket categories, best to worst; shared by ingestion and the city statistics
+BUCKET_ORDER = ["Good", "Satisfactory", "Moderate", "Poor", "Very Poor", "Severe"]
+
+# Bump when the on-disk layout changes so old stores get rebuilt
+STORE_VERSION = "1"
+
+
+def store_path(csv_path):
+    """Path of the columnar store that mirrors csv_path"""
+    name = os.path.splitext(os.path.basename(csv_path))[0].strip().replace(" ", "_") or "data"
+    return os.path.join(CACHE_DIR, f"{name}.arrow")
+
+
+def source_signature(csv_path):
+    """Size and modification time of the source file, used to detect changes"""
+    stat = os.stat(csv_path)
+    return {"version": STORE_VERSION, "size": str(stat.st_size), "mtime_ns": str(stat.st_mtime_ns)}
+
+
+def read_csv(csv_path):
+    """Read the city-day CSV the way the dashboard always has"""
+    df = pd.read_csv(csv_path)
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+    return df
+
+
+def frame_to_table(df):
+    """Convert a frame to an Arrow table with categorical text columns and NaN kept as NaN"""
+    arrays = []
+    for column in df.columns:
+        series = df[column]
+        if column in CATEGORICAL_COLUMNS:
+            values = pd.Categorical(series.astype(object), categories=sorted(series.dropna().unique()))
+            arrays.append(pa.DictionaryArray.from_arrays(pa.array(values.codes, mask=values.codes < 0), values.categories.astype(object).tolist()))
+        elif pd.api.types.is_float_dtype(series) or pd.api.types.is_integer_dtype(series):
+            # Keeping NaN instead of Arrow nulls lets to_pandas() hand back the mapped buffer without a copy
+            arrays.append(pa.array(series.to_numpy(), from_pandas=False))
+        else:
+            arrays.append(pa.array(series))
+    return pa.Table.from_arrays(arrays, names=list(df.columns))
+
+
+def build_store(csv_path, path=None):
+    """Convert csv_path into an uncompressed Arrow IPC file and return its path"""
+    path = path or store_path(csv_path)
+
+    signature = source_signature(csv_path)
+    table = frame_to_table(read_csv(csv_path))
+    table = table.replace_schema_metadata({f"aq.{key}": value for key, value in signature.items()})
+
+    # Written to a temporary file and swapped in so concurrent workers never see a partial store
+    return write_table(table, path)
+
+
+def is_fresh(csv_path, path):
+    """True if the store at path was built from the current version of csv_path"""
+    if not os.path.exists(path):
+        return False
+    try:
+        metadata = pa.ipc.open_file(pa.memory_map(path, "r")).schema.metadata or {}
+    except (pa.ArrowInvalid, OSError):
+        return False
+    stored = {key.decode(): value.decode() for key, value in metadata.items()}
+    return all(stored.get(f"aq.{key}") == value for key, value in source_signature(csv_path).items())
+
+
+def open_table(csv_path=DATA_PATH):
+    """Memory-map the columnar store for csv_path, rebuilding it if the CSV changed"""
+    path = store_path(csv_path)
+    if not is_fresh(csv_path, path):
+        build_store(csv_path, path)
+    # Pages come from the OS page cache, so every worker process shares one copy
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def write_table(table, path):
+    """Write an Arrow table as an uncompressed IPC file, swapped in atomically"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    return path
+
+
+def partition_paths(directory=PARTITIONS_DIR):
+    """Partition files in the order they were written"""
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.startswith("part-") and name.endswith(".arrow")]
+
+
+def dataset_version(csv_path=DATA_PATH, directory=PARTITIONS_DIR):
+    """Cheap token that changes whenever the data on disk changes; used as a cache key"""
+    paths = partition_paths(directory)
+    if paths:
+        return tuple(os.path.basename(path) for path in paths)
+    return tuple(source_signature(csv_path).values())
+
+
+def load_partitions(paths):
+    """Concatenate partitions; a (City, Date) written again in a later partition replaces the earlier row"""
+    table = pa.concat_tables([pa.ipc.open_file(pa.memory_map(path, "r")).read_all() for path in paths], promote_options="default")
+    df = table.to_pandas(split_blocks=True)
+    if len(paths) > 1:
+        df = df.drop_duplicates(["City", "Date"], keep="last").sort_values(["City", "Date"], kind="stable").reset_index(drop=True)
+    return df
+
+
+def load_dataset(csv_path=DATA_PATH, directory=PARTITIONS_DIR):
+    """Load the city-day dataset as a DataFrame backed by the memory-mapped store or partitions"""
+    paths = partition_paths(directory)
+    if paths:
+        return load_partitions(paths)
+    return open_table(csv_path).to_pandas(split_blocks=True)
@@ -0,0 +1,177 @@
+import copy
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Default plot width in pixels; one point per pixel is all a line chart can show
+CHART_WIDTH_PX = 1000
+
+# Number of downsampled series kept in memory
+CACHE_SIZE = 256
+
+
+def lttb(x, y, budget):
+    """Largest-Triangle-Three-Buckets: indices of budget points that keep the visual shape"""
+    n = len(x)
+    if budget >= n or budget < 3:
+        return np.arange(n)
+
+    # First and last points are always kept; the rest is split into budget - 2 buckets
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.int64)
+    keep = np.empty(budget, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    prev = 0
+    for i in range(budget - 2):
+        start, end = edges[i], edges[i + 1]
+        # The next bucket's average stands in for the point that is not chosen yet
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs((x[prev] - avg_x) * (y[start:end] - y[prev]) - (x[prev] - x[start:end]) * (avg_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        keep[i + 1] = prev
+    return keep
+
+
+def minmax(x, y, budget):
+    """Indices of the minimum and maximum of each bucket, so every peak survives"""
+    n = len(x)
+    if budget >= n or budget < 2:
+        return np.arange(n)
+
+    buckets = max(budget // 2, 1)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)[:-1]
+    bucket_of = np.repeat(np.arange(buckets), np.diff(np.append(edges, n)))
+    # Sort by (bucket, value) once; first and last of each bucket are its min and max
+    order = np.lexsort((y, bucket_of))
+    ends = np.append(edges[1:], n) - 1
+    return np.unique(np.concatenate([[0, n - 1], order[edges], order[ends]]))
+
+
+def keep_all(x, y, budget):
+    """No reduction"""
+    return np.arange(len(x))
+
+
+METHODS = {"lttb": lttb, "minmax": minmax, "none": keep_all}
+
+
+def choose_method(n, budget):
+    """Pick a method from how many points fall on each pixel of the budget
+
+    Up to two points per pixel are drawn as-is, very dense series use min/max
+    buckets (vectorized, keeps every extreme), and LTTB handles the rest.
+    """
+    if n <= 2 * budget:
+        return "none"
+    return "minmax" if n > 8 * budget else "lttb"
+
+
+class SeriesDownsampler:
+    """Per-city time series reduced to a point budget, with an LRU cache of results
+
+    One instance is shared by every session, so the cache is only touched
+    under a lock; downsampling itself runs outside it. update() merges new
+    rows into their cities' sorted series (see live_feed.LiveDataset).
+    """
+
+    def __init__(self, df, x="Date", y="AQI", group="City", cache_size=CACHE_SIZE):
+        self.x, self.y, self.group = x, y, group
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+
+        data = df[[group, x, y]].dropna().sort_values([group, x], kind="stable")
+        self.x_dtype = data[x].dtype
+        self._series = {}
+        for name, part in data.groupby(group, observed=True, sort=True):
+            self._series[name] = (part[x].to_numpy().view("i8"), part[y].to_numpy(dtype=np.float64))
+        self.groups = list(self._series)
+
+    def update(self, rows):
+        """Merge new rows (same columns as the dataset) into their cities' series; cached results of those cities are dropped"""
+        data = rows[[self.group, self.x, self.y]].dropna()
+        # Columns are taken out of pandas once and sliced per city, so small batches stay cheap
+        codes, names = pd.factorize(data[self.group].astype(str))
+        xs_all = data[self.x].to_numpy().astype(self.x_dtype).view("i8")
+        order = np.lexsort((xs_all, codes))
+        bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+        xs_all, ys_all = xs_all[order], data[self.y].to_numpy(dtype=np.float64)[order]
+        touched = set()
+        for i, name in enumerate(names):
+            new_x, new_y = xs_all[bounds[i]:bounds[i + 1]], ys_all[bounds[i]:bounds[i + 1]]
+            if name in self._series:
+                xs, ys = self._series[name]
+                # After existing readings of the same day, as the stable sort in __init__ puts them
+                at = np.searchsorted(xs, new_x, side="right")
+                new_x, new_y = np.insert(xs, at, new_x), np.insert(ys, at, new_y)
+            self._series[name] = (new_x, new_y)
+            touched.add(name)
+        if touched - set(self.groups):
+            self.groups = sorted(self._series)
+        with self._lock:
+            for key in [key for key in self._cache if key[0] in touched]:
+                del self._cache[key]
+
+    def copy(self):
+        """Independent copy to update() while readers go on using this one; cached results are shared"""
+        other = copy.copy(self)
+        other._lock = threading.Lock()
+        with self._lock:
+            other._cache = OrderedDict(self._cache)
+        # update() replaces a city's arrays rather than writing into them
+        other._series = dict(self._series)
+        return other
+
+    def series(self, name, start=None, end=None, budget=CHART_WIDTH_PX, method="auto"):
+        """Downsampled (x, y) arrays of one city between start and end"""
+        start = None if start is None else pd.Timestamp(start)
+        end = None if end is None else pd.Timestamp(end)
+        key = (name, start, end, budget, method)
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return result
+            self.misses += 1
+
+        xs, ys = self._series.get(name, (np.empty(0, np.int64), np.empty(0)))
+        lo = 0 if start is None else np.searchsorted(xs, self._as_i8(start), side="left")
+        hi = len(xs) if end is None else np.searchsorted(xs, self._as_i8(end), side="right")
+        xs, ys = xs[lo:hi], ys[lo:hi]
+        chosen = choose_method(len(xs), budget) if method == "auto" else method
+        keep = METHODS[chosen](xs.astype(np.float64), ys, budget)
+        result = (xs[keep].view(self.x_dtype), ys[keep])
+
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _as_i8(self, timestamp):
+        return np.datetime64(timestamp.to_datetime64(), np.datetime_data(self.x_dtype)[0]).view("i8")
+
+    def frame(self, names=None, start=None, end=None, budget=CHART_WIDTH_PX, method="auto"):
+        """Long-format frame of the downsampled series, ready for px.line(color=group)"""
+        names = self.groups if names is None else names
+        parts = []
+        for name in names:
+            xs, ys = self.series(name, start, end, budget, method)
+            parts.append(pd.DataFrame({self.x: xs, self.y: ys, self.group: name}))
+        if not parts:
+            return pd.DataFrame(columns=[self.x, self.y, self.group])
+        return pd.concat(parts, ignore_index=True)
+
+    def date_range(self):
+        """Earliest and latest date across all series"""
+        starts = [xs[0] for xs, _ in self._series.values() if len(xs)]
+        ends = [xs[-1] for xs, _ in self._series.values() if len(xs)]
+        if not starts:
+            return None, None
+        return pd.Timestamp(np.int64(min(starts)).view(self.x_dtype)), pd.Timestamp(np.int64(max(ends)).view(self.x_dtype))
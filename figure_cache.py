@@ -0,0 +1,130 @@
+import io
+import json
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+# Total size of the rendered figures kept per process
+CACHE_BYTES = 64 * 1024 * 1024
+
+# Same savefig settings st.pyplot uses, so cached heatmaps look the same
+PNG_OPTIONS = {"format": "png", "dpi": 200, "bbox_inches": "tight"}
+
+logger = logging.getLogger(__name__)
+
+
+def plotly_payload(fig):
+    """Plotly figure as the JSON spec the browser receives"""
+    import plotly.io as pio
+
+    return pio.to_json(fig, validate=False).encode("utf-8")
+
+
+def plotly_figure(payload):
+    """Figure for st.plotly_chart from a cached spec
+
+    The spec was produced by Plotly itself, so it is not validated again;
+    validation costs more than building the chart did.
+    """
+    import plotly.graph_objects as go
+
+    return go.Figure(json.loads(payload), _validate=False)
+
+
+def png_payload(fig):
+    """Matplotlib figure as PNG bytes; the figure is closed afterwards"""
+    import matplotlib.pyplot as plt
+
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, **PNG_OPTIONS)
+    finally:
+        plt.close(fig)
+    return buffer.getvalue()
+
+
+def table_payload(frame):
+    """DataFrame (or Series) as pickled bytes, for tables computed once and shown on every rerun"""
+    return pickle.dumps(frame, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def table_frame(payload):
+    """DataFrame from a cached table; payloads are only ever built in this process"""
+    return pickle.loads(payload)
+
+
+class FigureCache:
+    """Rendered figures (Plotly JSON or PNG bytes) and pickled tables by key, least recently used evicted first
+
+    Keys start with the chart name, followed by whatever the chart depends on
+    (city filter, pollutant, data version...). The total payload size stays
+    under max_bytes. Hits, misses and time spent are tracked per chart.
+    """
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.evictions = 0
+        # chart -> [hits, seconds spent on hits, misses, seconds spent building]
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """Cached payload for key, calling build() to render it on a miss"""
+        start = time.perf_counter()
+        with self._lock:
+            payload = self.entries.get(key)
+            if payload is not None:
+                self.entries.move_to_end(key)
+        hit = payload is not None
+        if not hit:
+            # Built outside the lock; two sessions missing the same key at once both render it
+            payload = build()
+            self._put(key, payload)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            timing = self.timings.setdefault(key[0], [0, 0.0, 0, 0.0])
+            timing[0 if hit else 2] += 1
+            timing[1 if hit else 3] += elapsed
+        if not hit:
+            logger.debug("built %s in %.1f ms (%d bytes)", key, elapsed * 1000, len(payload))
+        return payload
+
+    def _put(self, key, payload):
+        with self._lock:
+            if key in self.entries:
+                self.bytes -= len(self.entries.pop(key))
+            # A payload larger than the whole cache is served but not kept
+            if len(payload) > self.max_bytes:
+                return
+            self.entries[key] = payload
+            self.bytes += len(payload)
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Per-chart hits, misses, hit rate and mean milliseconds per hit and per miss"""
+        with self._lock:
+            timings = {chart: list(t) for chart, t in self.timings.items()}
+        rows = []
+        for chart, (hits, hit_seconds, misses, build_seconds) in sorted(timings.items()):
+            rows.append({
+                "chart": chart,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses),
+                "hit_ms": hit_seconds / hits * 1000 if hits else None,
+                "miss_ms": build_seconds / misses * 1000 if misses else None,
+            })
+        return rows
@@ -0,0 +1,140 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Neighbours averaged per missing value, as in the notebook's KNNImputer
+N_NEIGHBORS = 5
+
+# Rows per KNN block; distances are computed within a block only (BLOCK_ROWS² floats each)
+BLOCK_ROWS = 1024
+
+
+def impute_window_mean(df, columns, city_means, global_means):
+    """Fill gaps with the mean of the same city and month, then the city mean, then the global mean
+
+    df holds every raw row of the windows being rebuilt, so window means are
+    exact; the fallbacks come from the whole raw file.
+    """
+    df = df.copy()
+    cities = df["City"].astype("category")
+    codes = cities.cat.codes.to_numpy()
+    groups = [codes, df["_window"].to_numpy()]
+    for column in columns:
+        if not df[column].isna().any():
+            continue
+        filled = df[column].fillna(df[column].groupby(groups, sort=False).transform("mean"))
+        city_mean = city_means[column].reindex(cities.cat.categories).to_numpy(dtype=np.float64)[codes]
+        df[column] = filled.fillna(pd.Series(city_mean, index=df.index)).fillna(global_means[column])
+    return df
+
+
+def impute_interpolate(df, columns, city_means, global_means):
+    """Interpolate each city's gaps linearly in time; gaps before the first or after the last reading use window means"""
+    df = df.copy()
+    codes = df["City"].astype("category").cat.codes.to_numpy()
+    order = np.lexsort((df["Date"].to_numpy(), codes))
+    codes = codes[order]
+    times = df["Date"].to_numpy().view("i8")[order].astype(np.float64)
+    positions = np.arange(len(order))
+    for column in columns:
+        values = df[column].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+        valid = ~np.isnan(values)
+        if valid.all() or not valid.any():
+            continue
+        # Nearest reading at or before / at or after every row, found with running max / min of positions
+        before = np.maximum.accumulate(np.where(valid, positions, -1))
+        after = np.minimum.accumulate(np.where(valid, positions, len(order))[::-1])[::-1]
+        inside = ~valid & (before >= 0) & (after < len(order))
+        inside[inside] = (codes[before[inside]] == codes[inside]) & (codes[after[inside]] == codes[inside])
+        lo, hi = before[inside], after[inside]
+        share = (times[inside] - times[lo]) / (times[hi] - times[lo])
+        values[inside] = values[lo] + (values[hi] - values[lo]) * share
+        filled = np.empty_like(values)
+        filled[order] = values
+        df[column] = filled
+    return impute_window_mean(df, columns, city_means, global_means)
+
+
+def _knn_fill(values, n_neighbors):
+    """Fill NaN in one block with the mean of its n nearest rows by nan-euclidean distance
+
+    Same rule as sklearn's KNNImputer (uniform weights): distances use the
+    columns both rows have, scaled up by how many were missing, and donors
+    must have the value being filled.
+    """
+    present = ~np.isnan(values)
+    if present.all():
+        return values
+    x = np.where(present, values, 0.0)
+    m = present.astype(np.float64)
+    shared = m @ m.T
+    squares = (x * x) @ m.T
+    distances = squares + squares.T - 2 * (x @ x.T)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        distances = np.where(shared > 0, np.maximum(distances, 0) * values.shape[1] / shared, np.inf)
+    np.fill_diagonal(distances, np.inf)
+
+    filled = values.copy()
+    for column in range(values.shape[1]):
+        targets = np.flatnonzero(~present[:, column])
+        donors = np.flatnonzero(present[:, column])
+        if len(targets) == 0 or len(donors) == 0:
+            continue
+        sub = distances[np.ix_(targets, donors)]
+        k = min(n_neighbors, len(donors))
+        nearest = np.argpartition(sub, k - 1, axis=1)[:, :k]
+        chosen = np.take_along_axis(sub, nearest, axis=1)
+        donor_values = values[donors[nearest], column]
+        # Rows sharing no column with any donor are left for the fallback
+        reachable = np.isfinite(chosen)
+        counts = reachable.sum(axis=1)
+        means = np.where(reachable, donor_values, 0.0).sum(axis=1) / np.maximum(counts, 1)
+        filled[targets[counts > 0], column] = means[counts > 0]
+    return filled
+
+
+def _knn_city(values, n_neighbors, block_rows):
+    """KNN over one city's rows (in date order), block by block so memory stays bounded"""
+    # Columns are put on the same scale so large-valued ones (AQI, PM10) do not dominate the distance
+    scale = np.nanstd(values, axis=0)
+    scale = np.where(np.isfinite(scale) & (scale > 0), scale, 1.0)
+    scaled = values / scale
+    blocks = max(1, round(len(values) / block_rows))
+    return np.concatenate([_knn_fill(block, n_neighbors) for block in np.array_split(scaled, blocks)]) * scale
+
+
+def impute_knn(df, columns, city_means, global_means, n_neighbors=N_NEIGHBORS, block_rows=BLOCK_ROWS, workers=None):
+    """K-nearest-neighbour fill within blocks of consecutive days of each city, cities in parallel processes
+
+    Neighbours come from the same city and the same block of about block_rows
+    days, so cost grows linearly with rows instead of quadratically. Whatever
+    KNN cannot fill goes through impute_window_mean.
+    """
+    df = df.copy()
+    order = np.lexsort((df["Date"].to_numpy(), df["City"].astype("category").cat.codes.to_numpy()))
+    cities = df["City"].to_numpy()[order]
+    groups = np.split(order, np.flatnonzero(cities[1:] != cities[:-1]) + 1)
+    values = df[columns].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+    tasks = [values[rows] for rows in groups if len(rows)]
+
+    workers = os.cpu_count() if workers is None else workers
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            results = list(pool.map(_knn_city, tasks, [n_neighbors] * len(tasks), [block_rows] * len(tasks)))
+    else:
+        results = [_knn_city(task, n_neighbors, block_rows) for task in tasks]
+
+    for rows, filled in zip([rows for rows in groups if len(rows)], results):
+        values[rows] = filled
+    df[columns] = values
+    return impute_window_mean(df, columns, city_means, global_means)
+
+
+# Strategies selectable with `ingest.py --impute`
+IMPUTERS = {
+    "window_mean": impute_window_mean,
+    "interpolate": impute_interpolate,
+    "knn": impute_knn,
+}
@@ -0,0 +1,168 @@
+"""Incremental ingestion of the raw city_day.csv into append-only partitions
+
+    python ingest.py city_day.csv [--partitions DIR] [--chunk-rows N] [--impute window_mean|interpolate|knn]
+
+Only days that are new or whose raw values changed since the last run are
+processed. Gaps are filled per city (from the surrounding month by default,
+or by time interpolation or blocked KNN, see imputation.py), AQI buckets
+are binned in one vectorised pass, and the result is written as a new
+partition that the dashboard loads on its next rerun.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from data_store import BUCKET_ORDER, PARTITIONS_DIR, frame_to_table, partition_paths, write_table
+from imputation import IMPUTERS
+
+# Columns kept in the cleaned dataset, in the order the dashboard expects
+COLUMNS = ["City", "Date", "PM2.5", "PM10", "NO", "NO2", "NOx", "NH3", "CO", "SO2", "O3", "Benzene", "Toluene", "AQI", "AQI_Bucket"]
+
+# Numeric columns whose gaps are filled
+IMPUTE_COLUMNS = ["PM2.5", "PM10", "NO", "NO2", "NOx", "NH3", "CO", "SO2", "O3", "Benzene", "Toluene", "AQI"]
+
+# Upper AQI bound of every bucket but the last (Severe)
+BUCKET_EDGES = [50, 100, 200, 300, 400]
+
+# Raw rows read per chunk
+CHUNK_ROWS = 100_000
+
+# Hash of every ingested (City, Date), used to spot new and changed days
+MANIFEST_NAME = "manifest.arrow"
+
+
+def aqi_bucket(aqi):
+    """AQI bucket of every value at once; missing AQI stays missing"""
+    aqi = np.asarray(aqi, dtype=np.float64)
+    codes = np.digitize(aqi, BUCKET_EDGES, right=True)
+    codes[np.isnan(aqi)] = -1
+    return pd.Categorical.from_codes(codes, categories=BUCKET_ORDER)
+
+
+def window_keys(dates):
+    """Imputation window of each date: its calendar month, as one integer"""
+    return (dates.dt.year * 12 + dates.dt.month - 1).to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _keys(chunk, columns):
+    """64-bit hash of the given columns of each row, cheaper to compare than the strings"""
+    return pd.util.hash_pandas_object(chunk[columns], index=False).to_numpy()
+
+
+def _read_chunks(raw_path, chunk_rows):
+    for chunk in pd.read_csv(raw_path, chunksize=chunk_rows):
+        chunk["Date"] = pd.to_datetime(chunk["Date"], errors="coerce")
+        chunk = chunk[chunk["City"].notna() & chunk["Date"].notna()]
+        chunk["_window"] = window_keys(chunk["Date"])
+        yield chunk
+
+
+def read_manifest(directory):
+    """Stored row hashes keyed by the hash of (City, Date)"""
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return pd.Series(dtype=np.uint64, index=pd.Index([], dtype=np.uint64))
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return pd.Series(table.column("hash").to_numpy(), index=table.column("key").to_numpy())
+
+
+def next_partition_path(directory):
+    paths = partition_paths(directory)
+    last = int(os.path.basename(paths[-1])[5:11]) if paths else 0
+    return os.path.join(directory, f"part-{last + 1:06d}.arrow")
+
+
+def ingest(raw_path, directory=PARTITIONS_DIR, chunk_rows=CHUNK_ROWS, impute="window_mean"):
+    """Process new and changed days of raw_path into a new partition
+
+    Returns counts, the partition written (None if nothing changed) and timings.
+    Rows removed from the raw file are not removed from earlier partitions.
+    """
+    start = time.perf_counter()
+    imputer = IMPUTERS[impute]
+    manifest = read_manifest(directory)
+
+    # Pass 1: hash every raw row, find the windows holding new or changed days,
+    # and total each column per city for the fallback means
+    rows_read = 0
+    changed_keys, changed_hashes, touched = [], [], set()
+    sums, counts = [], []
+    for chunk in _read_chunks(raw_path, chunk_rows):
+        rows_read += len(chunk)
+        columns = [c for c in IMPUTE_COLUMNS if c in chunk.columns]
+        keys = _keys(chunk, ["City", "Date"])
+        hashes = _keys(chunk, [c for c in COLUMNS if c in chunk.columns])
+        # Positions instead of reindex(): missing keys would turn the uint64 hashes into lossy floats
+        positions = manifest.index.get_indexer(keys)
+        changed = positions < 0
+        known = ~changed
+        changed[known] = manifest.to_numpy()[positions[known]] != hashes[known]
+        if changed.any():
+            changed_keys.append(keys[changed])
+            changed_hashes.append(hashes[changed])
+            touched.update(_keys(chunk, ["City", "_window"])[changed].tolist())
+        grouped = chunk.groupby("City", observed=True)[columns]
+        sums.append(grouped.sum())
+        counts.append(grouped.count())
+
+    scanned = time.perf_counter()
+    result = {"rows_read": rows_read, "rows_changed": sum(len(k) for k in changed_keys), "rows_written": 0, "partition": None}
+    if touched:
+        totals = pd.concat(sums).groupby(level=0).sum()
+        numbers = pd.concat(counts).groupby(level=0).sum()
+        city_means = totals / numbers.where(numbers > 0)
+        global_means = totals.sum() / numbers.sum().where(numbers.sum() > 0)
+
+        # Pass 2: every raw row of the touched windows, so window means see the whole month
+        touched = np.fromiter(touched, dtype=np.uint64)
+        parts = []
+        for chunk in _read_chunks(raw_path, chunk_rows):
+            parts.append(chunk[np.isin(_keys(chunk, ["City", "_window"]), touched)])
+        rows = pd.concat(parts, ignore_index=True)
+        rows = rows.drop_duplicates(["City", "Date"], keep="last")
+
+        columns = [c for c in IMPUTE_COLUMNS if c in rows.columns]
+        rows = imputer(rows, columns, city_means, global_means)
+        rows["AQI_Bucket"] = aqi_bucket(rows["AQI"])
+        rows = rows[[c for c in COLUMNS if c in rows.columns]].sort_values(["City", "Date"], kind="stable").reset_index(drop=True)
+
+        path = write_table(frame_to_table(rows), next_partition_path(directory))
+        # The manifest is written last: a crash before this point only means the same days are redone
+        manifest = pd.concat([manifest, pd.Series(np.concatenate(changed_hashes), index=np.concatenate(changed_keys))])
+        manifest = manifest[~manifest.index.duplicated(keep="last")]
+        write_table(pa.table({"key": manifest.index.to_numpy(dtype=np.uint64), "hash": manifest.to_numpy(dtype=np.uint64)}),
+                    os.path.join(directory, MANIFEST_NAME))
+        result.update(rows_written=len(rows), partition=path)
+
+    finished = time.perf_counter()
+    result.update(
+        scan_seconds=scanned - start,
+        seconds=finished - start,
+        rows_per_second=rows_read / (finished - start) if finished > start else float("inf"),
+    )
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest new and changed days of the raw city_day.csv")
+    parser.add_argument("raw_path", help="raw city_day.csv")
+    parser.add_argument("--partitions", default=PARTITIONS_DIR, help="partition directory (default: %(default)s)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="raw rows read at a time")
+    parser.add_argument("--impute", choices=sorted(IMPUTERS), default="window_mean", help="gap filling strategy")
+    args = parser.parse_args(argv)
+
+    result = ingest(args.raw_path, args.partitions, args.chunk_rows, args.impute)
+    if result["partition"] is None:
+        print(f"{result['rows_read']:,} rows read, nothing new ({result['rows_per_second']:,.0f} rows/s)")
+    else:
+        print(f"{result['rows_read']:,} rows read, {result['rows_changed']:,} new or changed, "
+              f"{result['rows_written']:,} written to {result['partition']} "
+              f"in {result['seconds']:.2f} s ({result['rows_per_second']:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
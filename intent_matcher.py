@@ -0,0 +1,181 @@
+import math
+import re
+from collections import defaultdict
+
+# Minimum cosine similarity for a question to count as a canned intent
+THRESHOLD = 0.65
+
+CONTRACTIONS = {
+    "what's": "what is", "whats": "what is", "how's": "how is", "where's": "where is",
+    "which's": "which is", "who's": "who is", "it's": "it is", "isn't": "is not",
+    "aren't": "are not", "don't": "do not", "doesn't": "does not", "can't": "can not",
+}
+
+# Spellings folded together before matching
+SYNONYMS = {
+    "air quality index": "aqi",
+    "pm 2.5": "pm2.5",
+    "pm25": "pm2.5",
+}
+
+# Pollutants a question can name; like cities, they gate which canned entries may answer it.
+# NO is left out, as the word "no" is far more often just that.
+POLLUTANT_NAMES = ["PM2.5", "PM10", "NO2", "NOx", "NH3", "CO", "SO2", "O3", "Benzene", "Toluene", "Xylene"]
+
+# Words that turn a question into its opposite; a query never matches a question saying the other one
+OPPOSITES = [("best", "worst"), ("most", "least"), ("safe", "unsafe"), ("safest", "worst"), ("highest", "lowest"),
+             ("good", "bad"), ("cleanest", "dirtiest"), ("increase", "reduce"), ("improve", "worsen")]
+ANTONYMS = defaultdict(set)
+for _a, _b in OPPOSITES:
+    ANTONYMS[_a].add(_b)
+    ANTONYMS[_b].add(_a)
+
+# Polite wrappers that say nothing about the intent
+FILLERS = re.compile(r"^(?:(?:please|pls|hey|hi|so|ok|okay|can you|could you|would you|tell me|explain|i want to know|do you know)\s+)+|\s+please$")
+
+# Words too common to tell canned questions apart
+STOPWORDS = {"a", "an", "the", "is", "are", "of", "in", "on", "to", "for", "and", "my", "me", "do", "does", "what", "how"}
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+
+def normalize(text):
+    """Lowercase, expand contractions and synonyms, drop punctuation and extra spaces"""
+    text = text.lower().replace("’", "'")
+    text = re.sub(r"[a-z]+'[a-z]+|\bwhats\b", lambda m: CONTRACTIONS.get(m.group(0), m.group(0)), text)
+    for phrase, replacement in SYNONYMS.items():
+        text = text.replace(phrase, replacement)
+    text = " ".join(WORD_PATTERN.findall(text))
+    return FILLERS.sub("", text).strip()
+
+
+def features(text):
+    """Word tokens plus character trigrams of each word, so typos still overlap"""
+    feats = defaultdict(float)
+    for word in text.split():
+        if word in STOPWORDS:
+            continue
+        feats["w:" + word] += 1.0
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            feats[padded[i:i + 3]] += 0.5
+    return feats
+
+
+def within_one_edit(a, b):
+    """True if a and b differ by at most one insertion, deletion, substitution or swap"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diffs) == 1:
+            return True
+        return len(diffs) == 2 and diffs[1] == diffs[0] + 1 and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]]
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+class IntentMatcher:
+    """TF-IDF over words and character trigrams of the canned questions
+
+    Questions naming an entity (a city or a pollutant) only match canned entries
+    about that same entity, so "AQI in Pune" never borrows the answer written for
+    Delhi, nor "safe level of PM10" the one for PM2.5. A query with a word whose
+    opposite the canned question has ("best" for "worst") does not match it.
+    """
+
+    def __init__(self, responses, entities=(), threshold=THRESHOLD):
+        self.threshold = threshold
+        self.entities = {normalize(e) for e in [*entities, *POLLUTANT_NAMES]}
+        self.questions = list(responses)
+        self.answers = [responses[q] for q in self.questions]
+        self.exact = {}
+
+        docs = []
+        for i, question in enumerate(self.questions):
+            text = normalize(question)
+            self.exact.setdefault(text, i)
+            docs.append(features(text))
+        self.doc_entities = [self._entities_in(normalize(q).split()) for q in self.questions]
+        self.doc_words = [set(normalize(q).split()) for q in self.questions]
+        self.vocabulary = {w for q in self.questions for w in normalize(q).split()} | {e for e in self.entities if " " not in e}
+        self._spellings = sorted(self.vocabulary)
+
+        df = defaultdict(int)
+        for feats in docs:
+            for f in feats:
+                df[f] += 1
+        n = len(docs)
+        self.idf = {f: math.log((1 + n) / (1 + count)) + 1 for f, count in df.items()}
+        # Features no canned question has still count against the similarity
+        self.unseen_idf = math.log(1 + n) + 1
+
+        # Inverted index: feature -> [(doc, normalised weight)]
+        self.postings = defaultdict(list)
+        for i, feats in enumerate(docs):
+            weights = {f: tf * self.idf[f] for f, tf in feats.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for f, w in weights.items():
+                self.postings[f].append((i, w / norm))
+
+    def _entities_in(self, words):
+        found = set()
+        for size in (3, 2, 1):
+            for i in range(len(words) - size + 1):
+                phrase = " ".join(words[i:i + size])
+                if phrase in self.entities:
+                    found.add(phrase)
+        return found
+
+    def _correct(self, words):
+        """Replace near-miss spellings of known words and entities ("dehli") with the real word"""
+        fixed = []
+        for word in words:
+            if word not in self.vocabulary and len(word) >= 5:
+                word = next((v for v in self._spellings if within_one_edit(word, v)), word)
+            fixed.append(word)
+        return fixed
+
+    def scores(self, query):
+        """(similarity, index) of the best eligible canned question"""
+        words = self._correct(normalize(query).split())
+        text = " ".join(words)
+        if text in self.exact:
+            return 1.0, self.exact[text]
+
+        wanted = self._entities_in(words)
+        contrary = {w: ANTONYMS[w] for w in set(words) if w in ANTONYMS}
+        weights = {f: tf * self.idf.get(f, self.unseen_idf) for f, tf in features(text).items()}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        if not norm:
+            return 0.0, None
+
+        totals = defaultdict(float)
+        for f, w in weights.items():
+            for doc, dw in self.postings.get(f, ()):
+                totals[doc] += w * dw
+        best, best_doc = 0.0, None
+        for doc, total in totals.items():
+            # Entries about an entity only match questions naming that entity
+            if not self.doc_entities[doc] <= wanted:
+                continue
+            # Nor do questions saying the opposite of a word of the query
+            if any(w not in self.doc_words[doc] and opposites & self.doc_words[doc] for w, opposites in contrary.items()):
+                continue
+            score = total / norm
+            if score > best:
+                best, best_doc = score, doc
+        return best, best_doc
+
+    def match(self, query):
+        """Canned answer for query, or None if nothing is similar enough"""
+        score, doc = self.scores(query)
+        if doc is None or score < self.threshold:
+            return None
+        return self.answers[doc]
@@ -0,0 +1,556 @@
+"""Live feed mode: rows read from an append-only source are folded into the loaded dataset as they arrive
+
+    AQ_LIVE_SOURCE=readings.csv streamlit run app.py
+    python live_feed.py replay "data .csv" --rate 20 --http 8765 --shift-days 1900
+
+AQ_LIVE_SOURCE names a CSV file that readings are appended to, a partition
+directory written by ingest.py, or an http:// or ws:// feed. Rows are
+appended to the dataset and to every aggregate built on it (see
+LiveDataset), and the Dashboard redraws its live panel every few seconds.
+`replay` plays a CSV back at a fixed rate, into a file or over a local HTTP
+feed, as a stand-in for real sensors.
+"""
+import argparse
+import http.client
+import http.server
+import io
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.parse
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from data_store import CATEGORICAL_COLUMNS, load_partitions, partition_paths
+from ingest import COLUMNS, aqi_bucket
+
+# How often file and directory sources look for new data
+POLL_SECONDS = 0.05
+
+# How often open Dashboard sessions redraw the live panel
+REFRESH_SECONDS = 2.0
+
+# Most rows applied in one batch; a backlog is worked off in batches of this size
+MAX_BATCH_ROWS = 50_000
+
+# Wait before reconnecting to a network feed that dropped
+RECONNECT_SECONDS = 1.0
+
+# Batches remembered for the rows-per-second and apply-time figures
+STATS_WINDOW_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(rows):
+    """Feed rows as dataset rows: parsed dates, the dataset's columns in order, AQI bucket filled in from AQI
+
+    Rows without a city or a valid date are dropped; missing pollutant columns are NaN.
+    """
+    rows = pd.DataFrame(rows).copy()
+    if "City" not in rows.columns or "Date" not in rows.columns:
+        raise ValueError(f"feed rows need City and Date columns, got {list(rows.columns)}")
+    rows["Date"] = pd.to_datetime(rows["Date"], errors="coerce")
+    rows = rows[rows["City"].notna() & rows["Date"].notna()]
+    rows["City"] = rows["City"].astype(str)
+    for column in COLUMNS[2:-1]:
+        rows[column] = pd.to_numeric(rows[column], errors="coerce") if column in rows.columns else np.nan
+    bucket = aqi_bucket(rows["AQI"])
+    if "AQI_Bucket" in rows.columns:
+        given = rows["AQI_Bucket"].astype(object)
+        rows["AQI_Bucket"] = given.where(given.notna(), pd.Series(np.asarray(bucket, dtype=object), index=rows.index))
+    else:
+        rows["AQI_Bucket"] = np.asarray(bucket, dtype=object)
+    rows["Month"] = rows["Date"].dt.month
+    return rows[COLUMNS + ["Month"]].reset_index(drop=True)
+
+
+def _row_keys(df):
+    return pd.util.hash_pandas_object(pd.DataFrame({"City": df["City"].astype(str), "Date": df["Date"]}), index=False).to_numpy()
+
+
+def _as_categorical(series):
+    """series as a Categorical with text categories, so parts of one column can be merged by their codes"""
+    values = series.array if isinstance(series.dtype, pd.CategoricalDtype) else pd.Categorical(series)
+    if values.categories.dtype == "str":
+        return values
+    return pd.Categorical.from_codes(values.codes, values.categories.astype("str"))
+
+
+class LiveDataset:
+    """A loaded dataset that grows as live rows arrive, with the aggregates built on it kept in step
+
+    Aggregates are registered by name with a function that builds them from a
+    frame (aggregate()); from then on every appended batch is passed to their
+    update(). An aggregate that has been handed out is never changed: each
+    batch goes into copies of the aggregates (their copy()), which replace
+    them all at once, so sessions read them without a lock while the feed
+    writes. A batch that repeats a (City, Date) already present replaces
+    that row, and since the aggregates only add, they are rebuilt from the
+    deduplicated frame instead. The combined frame is only assembled when
+    someone asks for it. Appends hold `lock`.
+    """
+
+    def __init__(self, df, base_version=()):
+        self.base_version = tuple(base_version)
+        self.dtypes = df.dtypes
+        self._parts = [df]
+        self.generation = 0
+        # City -> generation of its last new rows, so charts of other cities stay cached
+        self.city_generation = {}
+        self.latest_date = df.groupby("City", observed=True)["Date"].max().to_dict() if len(df) else {}
+        self.aggregates = {}
+        self.rows_appended = 0
+        self.rebuilds = 0
+        self.lock = threading.RLock()
+        self._recent = {}
+        # Sorted (City, Date) hashes of every row, so a batch is checked for replacements without hashing the frame again
+        self._keys = np.sort(_row_keys(df))
+
+    def version(self):
+        """Cache key of the current contents; shared_data.load_data() recognises it by its "live" tag"""
+        return ("live", self.base_version, self.generation)
+
+    def city_version(self, city=None):
+        """Cache key that only moves when `city` (any city if None or "All") gets new rows"""
+        if city is None or city == "All":
+            return self.version()
+        return ("live", self.base_version, self.city_generation.get(city, 0))
+
+    def frame(self):
+        """The whole dataset including every row received so far; read-only"""
+        with self.lock:
+            if len(self._parts) > 1:
+                frame = pd.concat(self._parts, ignore_index=True)
+                for column in CATEGORICAL_COLUMNS:
+                    if column in frame.columns and not isinstance(frame[column].dtype, pd.CategoricalDtype):
+                        # Only the new parts are hashed; the rows already merged keep their codes
+                        frame[column] = union_categoricals([_as_categorical(part[column]) for part in self._parts], sort_categories=True)
+                self._parts = [frame]
+            return self._parts[0]
+
+    def cities(self):
+        """Every city with rows, sorted"""
+        with self.lock:
+            return tuple(sorted(self.latest_date))
+
+    def aggregate(self, name, build):
+        """The aggregate registered as name, built from the current frame on first use and updated on every append"""
+        with self.lock:
+            if name not in self.aggregates:
+                self.aggregates[name] = (build, build(self.frame()))
+            return self.aggregates[name][1]
+
+    def append(self, rows):
+        """Add feed rows to the dataset and its aggregates; returns the number of rows applied"""
+        rows = normalize(rows).drop_duplicates(["City", "Date"], keep="last")
+        if not len(rows):
+            return 0
+        rows = rows.astype({c: t for c, t in self.dtypes.items() if c in rows.columns and c not in CATEGORICAL_COLUMNS})
+        with self.lock:
+            # Rows newer than their city's latest day cannot replace anything; only older ones are looked up
+            latest = pd.to_datetime(rows["City"].map(self.latest_date))
+            late = (rows["Date"] <= latest).to_numpy()
+            keys = np.sort(_row_keys(rows))
+            if late.any():
+                wanted = _row_keys(rows[late])
+                found = np.minimum(np.searchsorted(self._keys, wanted), max(len(self._keys) - 1, 0))
+                replaced = bool(len(self._keys)) and (self._keys[found] == wanted).any()
+            else:
+                replaced = False
+
+            if replaced:
+                self._parts.append(rows)
+                frame = self.frame()
+                self._parts = [frame[~frame.duplicated(["City", "Date"], keep="last")].reset_index(drop=True)]
+                aggregates = {name: (build, build(self._parts[0])) for name, (build, _) in self.aggregates.items()}
+                self._keys = np.union1d(self._keys, keys)
+                self.rebuilds += 1
+            else:
+                aggregates = {}
+                for name, (build, aggregate) in self.aggregates.items():
+                    aggregate = aggregate.copy()
+                    aggregate.update(rows)
+                    aggregates[name] = (build, aggregate)
+                self._parts.append(rows)
+                self._keys = np.insert(self._keys, np.searchsorted(self._keys, keys), keys)
+            # Nothing is published until every aggregate has taken the batch
+            self.aggregates = aggregates
+
+            self.generation += 1
+            for city, last in rows.groupby("City")["Date"].max().items():
+                self.city_generation[city] = self.generation
+                if city not in self.latest_date or last > self.latest_date[city]:
+                    self.latest_date[city] = last
+            self.rows_appended += len(rows)
+            self._recent.clear()
+        return len(rows)
+
+    def recent(self, city=None, days=90):
+        """Rows of the last `days` days up to the latest reading, of one city or all of them"""
+        key = (city, days, self.city_version(city))
+        with self.lock:
+            if key not in self._recent:
+                frame = self.frame()
+                rows = frame if city is None or city == "All" else frame[frame["City"] == city]
+                cutoff = rows["Date"].max() - pd.Timedelta(days=days) if len(rows) else None
+                self._recent[key] = rows if cutoff is None else rows[rows["Date"] > cutoff].sort_values(["Date", "City"])
+            return self._recent[key]
+
+    def latest(self, city=None):
+        """Latest reading of every city, or the last ten readings of one city"""
+        if city is None or city == "All":
+            key = ("latest", self.version())
+            with self.lock:
+                if key not in self._recent:
+                    frame = self.frame()
+                    latest = frame[frame["Date"] == pd.to_datetime(frame["City"].astype(str).map(self.latest_date))]
+                    self._recent[key] = latest.sort_values("City")
+                return self._recent[key]
+        return self.recent(city).tail(10).iloc[::-1]
+
+
+# ------------ Sources ------------
+
+class FileTail:
+    """New complete lines of an append-only CSV file, header on its first line
+
+    Starts at the end of the file unless from_start, so rows already in the
+    loaded dataset are not read twice. A file that shrinks (truncated or
+    replaced) is read again from its first row.
+    """
+
+    def __init__(self, path, from_start=False):
+        self.path = path
+        self.header = None
+        self.offset = 0
+        # What is in the file now is already loaded; skip it even if the first read comes after more lines
+        self._skip_to = 0 if from_start or not os.path.exists(path) else os.path.getsize(path)
+
+    def read(self, timeout=POLL_SECONDS):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if self.header is not None and size < self.offset:
+            self.header = None
+        if self.header is None and size:
+            with open(self.path, "rb") as f:
+                header = f.readline()
+            if header.endswith(b"\n"):
+                self.header = header
+                self.offset = max(len(header), self._skip_to)
+                self._skip_to = 0
+        if self.header is None or size <= self.offset:
+            time.sleep(timeout)
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        # A line still being written is left for the next call
+        end = data.rfind(b"\n") + 1
+        if not end:
+            time.sleep(timeout)
+            return None
+        self.offset += end
+        return pd.read_csv(io.BytesIO(self.header + data[:end]))
+
+
+class PartitionSource:
+    """Partitions that appear in a directory written by ingest.py, read once each"""
+
+    def __init__(self, directory, from_start=False):
+        self.directory = directory
+        self.seen = set() if from_start else set(partition_paths(directory))
+
+    def read(self, timeout=POLL_SECONDS):
+        new = [path for path in partition_paths(self.directory) if path not in self.seen]
+        if not new:
+            time.sleep(timeout)
+            return None
+        self.seen.update(new)
+        # Partitions are swapped in whole by write_table(), so a listed file is complete
+        return pd.concat([load_partitions([path]) for path in new], ignore_index=True)
+
+
+class _StreamSource:
+    """Rows pushed by a network feed, received on a background thread and handed out in batches"""
+
+    def __init__(self, url):
+        self.url = url
+        self.received = 0
+        self.connects = 0
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"live-feed {url}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.connects += 1
+                # Reconnects resume after the last row received
+                for record in self._records(self.received):
+                    self._queue.put(record)
+                    self.received += 1
+                    if self._stop.is_set():
+                        return
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                logger.warning("live feed %s: %s", self.url, e)
+            self._stop.wait(RECONNECT_SECONDS)
+
+    def read(self, timeout=POLL_SECONDS):
+        try:
+            records = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return None
+        while len(records) < MAX_BATCH_ROWS:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return pd.DataFrame.from_records(records)
+
+    def close(self):
+        self._stop.set()
+
+
+class HTTPSource(_StreamSource):
+    """Newline-delimited JSON rows streamed over one long HTTP response
+
+    GET <url>?offset=N answers with every row from the N-th on, then keeps
+    the response open and writes each new row as it arrives (FeedServer
+    below speaks this protocol).
+    """
+
+    def _records(self, offset):
+        parts = urllib.parse.urlsplit(self.url)
+        query = urllib.parse.urlencode([*urllib.parse.parse_qsl(parts.query), ("offset", offset)])
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+        try:
+            conn.request("GET", f"{parts.path or '/'}?{query}")
+            response = conn.getresponse()
+            if response.status != 200:
+                raise OSError(f"HTTP {response.status} {response.reason}")
+            while not self._stop.is_set():
+                line = response.readline()
+                if not line:
+                    return
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            conn.close()
+
+
+class WebSocketSource(_StreamSource):
+    """JSON rows from a WebSocket feed, one object or a list of objects per message (needs `websockets`)"""
+
+    def _records(self, offset):
+        from websockets.exceptions import WebSocketException
+        from websockets.sync.client import connect
+
+        parts = urllib.parse.urlsplit(self.url)
+        url = urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode([*urllib.parse.parse_qsl(parts.query), ("offset", offset)])))
+        try:
+            with connect(url, open_timeout=30) as ws:
+                while not self._stop.is_set():
+                    try:
+                        message = ws.recv(timeout=1.0)
+                    except TimeoutError:
+                        continue
+                    data = json.loads(message)
+                    yield from data if isinstance(data, list) else [data]
+        except WebSocketException as e:
+            raise OSError(str(e)) from e
+
+
+def open_source(spec):
+    """Source for an AQ_LIVE_SOURCE value: http:// or ws:// URL, partition directory, or CSV file"""
+    scheme = urllib.parse.urlsplit(spec).scheme
+    if scheme in ("http", "https"):
+        return HTTPSource(spec)
+    if scheme in ("ws", "wss"):
+        return WebSocketSource(spec)
+    if os.path.isdir(spec):
+        return PartitionSource(spec)
+    return FileTail(spec)
+
+
+class LiveFeed:
+    """Background thread that moves rows from a source into a LiveDataset as soon as they are read"""
+
+    def __init__(self, source, dataset, poll=POLL_SECONDS):
+        self.source = source
+        self.dataset = dataset
+        self.poll = poll
+        self.rows = self.batches = self.errors = 0
+        self.last_error = None
+        self.last_batch = None
+        # (time, rows, seconds to apply) of recent batches
+        self._history = deque()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="live-feed", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._thread.join(timeout)
+        if hasattr(self.source, "close"):
+            self.source.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                rows = self.source.read(self.poll)
+                if rows is None or not len(rows):
+                    continue
+                for start in range(0, len(rows), MAX_BATCH_ROWS):
+                    self._apply(rows.iloc[start:start + MAX_BATCH_ROWS])
+            except (OSError, ValueError, KeyError) as e:
+                # A bad batch is skipped; the feed carries on with the next one
+                logger.warning("live feed batch failed: %s", e)
+                with self._lock:
+                    self.errors += 1
+                    self.last_error = f"{type(e).__name__}: {e}"
+                self._stop.wait(self.poll)
+
+    def _apply(self, rows):
+        start = time.perf_counter()
+        n = self.dataset.append(rows)
+        elapsed = time.perf_counter() - start
+        now = time.time()
+        with self._lock:
+            self.rows += n
+            self.batches += 1
+            self.last_batch = now
+            self._history.append((now, n, elapsed))
+            while self._history and self._history[0][0] < now - STATS_WINDOW_SECONDS:
+                self._history.popleft()
+
+    def stats(self):
+        """Rows and batches so far, rows per second and mean ms per batch over the last minute, errors"""
+        now = time.time()
+        with self._lock:
+            recent = [entry for entry in self._history if entry[0] >= now - STATS_WINDOW_SECONDS]
+            return {
+                "rows": self.rows,
+                "batches": self.batches,
+                "rows_per_second": sum(n for _, n, _ in recent) / STATS_WINDOW_SECONDS,
+                "apply_ms": 1000 * sum(s for _, _, s in recent) / len(recent) if recent else None,
+                "seconds_since_batch": None if self.last_batch is None else now - self.last_batch,
+                "errors": self.errors,
+                "last_error": self.last_error,
+            }
+
+
+# ------------ Stand-in feed ------------
+
+class FeedServer:
+    """Local HTTP feed for HTTPSource: publish() rows and every open stream receives them"""
+
+    def __init__(self, port=0, host="127.0.0.1"):
+        self.records = []
+        self._changed = threading.Condition()
+        self._closed = False
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                offset = int(urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query).get("offset", ["0"])[0])
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    while True:
+                        with server._changed:
+                            server._changed.wait_for(lambda: server._closed or len(server.records) > offset, timeout=1.0)
+                            if server._closed:
+                                break
+                            batch = server.records[offset:]
+                        if batch:
+                            offset += len(batch)
+                            body = "".join(json.dumps(record) + "\n" for record in batch).encode("utf-8")
+                            self.wfile.write(f"{len(body):X}\r\n".encode() + body + b"\r\n")
+                            self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}/feed"
+        threading.Thread(target=self.httpd.serve_forever, name="feed-server", daemon=True).start()
+
+    def publish(self, records):
+        with self._changed:
+            self.records.extend(records)
+            self._changed.notify_all()
+
+    def close(self):
+        with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _replay_records(csv_path, shift_days):
+    df = pd.read_csv(csv_path)
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce") + pd.Timedelta(days=shift_days)
+    df = df[df["Date"].notna()].sort_values(["Date", "City"], kind="stable")
+    df["Date"] = df["Date"].dt.strftime("%Y-%m-%d")
+    return df
+
+
+def replay(csv_path, rate, to=None, port=None, shift_days=0):
+    """Play csv_path back at `rate` rows per second, day by day, appended to the file `to` or served on `port`"""
+    df = _replay_records(csv_path, shift_days)
+    server = FeedServer(port) if port is not None else None
+    if server is not None:
+        print(f"serving {len(df):,} rows at {rate:g} rows/s on {server.url}")
+    elif not os.path.exists(to) or os.path.getsize(to) == 0:
+        df.head(0).to_csv(to, index=False)
+    start = time.monotonic()
+    for i in range(len(df)):
+        # Paced against the start time so the rate holds however long each write takes
+        time.sleep(max(0.0, start + i / rate - time.monotonic()))
+        row = df.iloc[i:i + 1]
+        if server is not None:
+            server.publish(json.loads(row.to_json(orient="records")))
+        else:
+            with open(to, "a", newline="") as f:
+                row.to_csv(f, header=False, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stand-in live feed: replay a city-day CSV at a fixed rate")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    replay_parser = subparsers.add_parser("replay", help="replay a CSV into a file or over HTTP")
+    replay_parser.add_argument("csv_path")
+    replay_parser.add_argument("--rate", type=float, default=10.0, help="rows per second")
+    target = replay_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--to", help="CSV file to append rows to")
+    target.add_argument("--http", type=int, metavar="PORT", help="serve rows on http://127.0.0.1:PORT/feed")
+    replay_parser.add_argument("--shift-days", type=int, default=0, help="move every date this many days later")
+    args = parser.parse_args(argv)
+    replay(args.csv_path, args.rate, to=args.to, port=args.http, shift_days=args.shift_days)
+
+
+if __name__ == "__main__":
+    main()
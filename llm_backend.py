@@ -0,0 +1,222 @@
+import hashlib
+import os
+from contextlib import contextmanager
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+from data_store import CACHE_DIR
+
+# Where answered prompts are kept between runs
+LLM_CACHE_PATH = os.path.join(CACHE_DIR, "llm_cache.sqlite")
+
+# Cached answers expire after a day; the least recently used go first past the size limit
+CACHE_TTL_SECONDS = 24 * 60 * 60
+CACHE_MAX_ENTRIES = 1000
+
+# Seconds to wait for the first token, and between tokens after that
+REQUEST_TIMEOUT = 30
+RETRIES = 2
+RETRY_BACKOFF = 0.5
+
+
+def normalize_prompt(prompt):
+    """Case- and whitespace-insensitive form of a prompt, used as the cache key"""
+    return re.sub(r"\s+", " ", prompt).strip().casefold()
+
+
+class GeminiBackend:
+    """Google Gemini, streamed chunk by chunk"""
+
+    def __init__(self, api_key, model_name="gemini-1.5-pro", timeout=REQUEST_TIMEOUT):
+        # Imported here so pages without the chatbot never load the client library
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+        self.timeout = timeout
+
+    def stream(self, prompt):
+        response = self.model.generate_content(prompt, stream=True, request_options={"timeout": self.timeout})
+        for chunk in response:
+            # chunk.text raises for a chunk a safety filter blocked or one without candidates; those carry no text
+            for candidate in chunk.candidates[:1]:
+                for part in candidate.content.parts:
+                    if getattr(part, "text", ""):
+                        yield part.text
+
+
+class StubBackend:
+    """Deterministic offline backend: the same prompt always gives the same words
+
+    token_delay and first_token_delay simulate a remote model for benchmarks.
+    """
+
+    def __init__(self, token_delay=0.0, first_token_delay=0.0, words=40):
+        self.token_delay = token_delay
+        self.first_token_delay = first_token_delay
+        self.words = words
+        self.calls = 0
+
+    def stream(self, prompt):
+        self.calls += 1
+        digest = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+        time.sleep(self.first_token_delay)
+        for i in range(self.words):
+            if i:
+                time.sleep(self.token_delay)
+            yield ("" if i == 0 else " ") + digest[(i * 2) % len(digest):][:6]
+
+
+class ResponseCache:
+    """SQLite-backed prompt -> response cache with TTL and LRU eviction, shared by worker processes"""
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def key(prompt):
+        return hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+
+    def get(self, prompt):
+        """Cached response for prompt, or None if missing or expired"""
+        key, now = self.key(prompt), time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, prompt, response):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+                (self.key(prompt), response, now, now),
+            )
+            conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+
+def _with_timeout(tokens, timeout):
+    """Yield from tokens, raising TimeoutError if any token takes longer than timeout seconds
+
+    Once this generator exits (a timeout, an error, or the consumer closing
+    it), the thread reading tokens stops at the next token and closes them,
+    so an abandoned request is not read on while a retry runs.
+    """
+    items = queue.Queue()
+    done = object()
+    stop = threading.Event()
+
+    def pump():
+        try:
+            for token in tokens:
+                if stop.is_set():
+                    return
+                items.put(token)
+            items.put(done)
+        except Exception as e:  # handed to the consumer below
+            items.put(e)
+        finally:
+            # Closed from this thread, as a generator cannot be closed while another thread runs it
+            close = getattr(tokens, "close", None)
+            if close is not None:
+                close()
+
+    threading.Thread(target=pump, daemon=True).start()
+    try:
+        while True:
+            try:
+                item = items.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No response from the model within {timeout} seconds") from None
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+class LLMClient:
+    """Streams answers from a backend with timeouts, retries and a response cache"""
+
+    def __init__(self, backend, cache=None, timeout=REQUEST_TIMEOUT, retries=RETRIES, backoff=RETRY_BACKOFF):
+        self.backend = backend
+        self.cache = cache
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hits = self.misses = 0
+
+    def stream(self, prompt):
+        """Yield the answer as it arrives; cached answers come back as a single chunk"""
+        if self.cache is not None:
+            cached = self.cache.get(prompt)
+            # Empty answers written by older versions are treated as misses
+            if cached:
+                self.hits += 1
+                yield cached
+                return
+        self.misses += 1
+
+        for attempt in range(self.retries + 1):
+            parts = []
+            try:
+                for token in _with_timeout(self.backend.stream(prompt), self.timeout):
+                    parts.append(token)
+                    yield token
+                break
+            except Exception:
+                # Once text has reached the user a retry would repeat it, so only retry before that
+                if parts or attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+        answer = "".join(parts)
+        # An empty answer (e.g. every chunk dropped by a safety filter) is not kept, so the next ask tries again
+        if self.cache is not None and answer.strip():
+            self.cache.put(prompt, answer)
+
+    def generate(self, prompt):
+        """Whole answer as one string"""
+        return "".join(self.stream(prompt))
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,326 @@
+import json
+import logging
+import os
+import queue
+import smtplib
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from email.message import EmailMessage
+
+# Feedback waiting to be mailed survives restarts here (override with AQ_OUTBOX_PATH)
+OUTBOX_PATH = os.environ.get("AQ_OUTBOX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "feedback_outbox.sqlite"))
+
+# Messages sent per claim, over one SMTP session
+BATCH_SIZE = 20
+
+# Authenticated connections kept open, and how long an idle one is trusted without a NOOP
+POOL_SIZE = 2
+IDLE_CHECK_SECONDS = 30
+
+# Retries back off exponentially from RETRY_BACKOFF up to RETRY_MAX_DELAY; after MAX_ATTEMPTS a message is marked failed
+MAX_ATTEMPTS = 8
+RETRY_BACKOFF = 2.0
+RETRY_MAX_DELAY = 15 * 60
+
+# A claimed message goes back to the queue if its worker has not reported back within this many seconds
+LEASE_SECONDS = 120
+
+# How often an idle worker looks at the outbox when nobody wakes it
+POLL_SECONDS = 5.0
+
+logger = logging.getLogger(__name__)
+
+
+class Outbox:
+    """Durable SQLite queue of outgoing mail, safe to share between worker threads and processes"""
+
+    def __init__(self, path=OUTBOX_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # The journal mode cannot change inside a transaction; it sticks to the file once set
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        finally:
+            conn.close()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "id INTEGER PRIMARY KEY, sender TEXT NOT NULL, recipients TEXT NOT NULL, subject TEXT NOT NULL, "
+                "body TEXT NOT NULL, created REAL NOT NULL, status TEXT NOT NULL DEFAULT 'pending', "
+                "attempts INTEGER NOT NULL DEFAULT 0, next_attempt REAL NOT NULL, last_error TEXT, sent REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS messages_due ON messages (status, next_attempt)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            # With WAL this survives a crash of the app; only a power cut can drop the last few commits
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def enqueue(self, sender, recipients, subject, body):
+        """Store a message for delivery and return its id; this is all the request has to wait for"""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO messages (sender, recipients, subject, body, created, next_attempt) VALUES (?, ?, ?, ?, ?, ?)",
+                (sender, json.dumps(list(recipients)), subject, body, now, now),
+            )
+        return cursor.lastrowid
+
+    def claim(self, limit=BATCH_SIZE, lease=LEASE_SECONDS):
+        """Due messages as dicts, hidden from other workers until the lease runs out"""
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, sender, recipients, subject, body, attempts FROM messages "
+                "WHERE status = 'pending' AND next_attempt <= ? ORDER BY next_attempt, id LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            conn.executemany("UPDATE messages SET next_attempt = ? WHERE id = ?", [(now + lease, row[0]) for row in rows])
+        return [
+            {"id": row[0], "sender": row[1], "recipients": json.loads(row[2]), "subject": row[3], "body": row[4], "attempts": row[5]}
+            for row in rows
+        ]
+
+    def mark_sent(self, ids):
+        with self._connect() as conn:
+            conn.executemany("UPDATE messages SET status = 'sent', sent = ?, last_error = NULL WHERE id = ?", [(time.time(), i) for i in ids])
+
+    def mark_retry(self, message_id, error, delay):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE messages SET attempts = attempts + 1, next_attempt = ?, last_error = ? WHERE id = ?",
+                (time.time() + delay, error, message_id),
+            )
+
+    def mark_failed(self, message_id, error):
+        with self._connect() as conn:
+            conn.execute("UPDATE messages SET status = 'failed', attempts = attempts + 1, last_error = ? WHERE id = ?", (error, message_id))
+
+    def counts(self):
+        """Number of messages per status"""
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM messages GROUP BY status").fetchall())
+
+    def next_due(self):
+        """Seconds until the next pending message is due, or None if there is none"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT MIN(next_attempt) FROM messages WHERE status = 'pending'").fetchone()
+        return None if row[0] is None else max(row[0] - time.time(), 0.0)
+
+
+class SMTPPool:
+    """A few authenticated SMTP connections, reused across messages instead of a handshake per message"""
+
+    def __init__(self, host, port, user=None, password=None, starttls=True, size=POOL_SIZE, timeout=30):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.idle = queue.LifoQueue(maxsize=size)
+        self.opened = 0
+
+    def _open(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.user:
+                server.login(self.user, self.password)
+        except Exception:
+            server.close()
+            raise
+        self.opened += 1
+        return server
+
+    def _checkout(self):
+        while True:
+            try:
+                server, last_used = self.idle.get_nowait()
+            except queue.Empty:
+                return self._open()
+            if time.monotonic() - last_used < IDLE_CHECK_SECONDS:
+                return server
+            try:
+                # Long-idle connections may have been dropped by the server
+                if server.noop()[0] == 250:
+                    return server
+            except (smtplib.SMTPException, OSError):
+                pass
+            server.close()
+
+    @contextmanager
+    def connection(self):
+        """An open, logged-in connection; it goes back to the pool unless the block using it raised"""
+        server = self._checkout()
+        try:
+            yield server
+        except BaseException:
+            # Whatever went wrong, the session may be mid-command: never pool it
+            server.close()
+            raise
+        try:
+            self.idle.put_nowait((server, time.monotonic()))
+        except queue.Full:
+            server.quit()
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                server.close()
+
+
+def _is_permanent(error):
+    """5xx replies (bad address, message refused) will not succeed on a retry"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500 and not isinstance(error, smtplib.SMTPAuthenticationError)
+    return False
+
+
+class DeliveryWorker:
+    """Background threads that drain the outbox over pooled SMTP connections
+
+    submit() returns as soon as the message is on disk. Workers send claimed
+    batches over one session each, retry transient failures with exponential
+    backoff and give up on permanent ones. Anything left when the process
+    stops is sent by the next worker that starts.
+    """
+
+    def __init__(self, outbox, pool, threads=1, batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS,
+                 backoff=RETRY_BACKOFF, max_delay=RETRY_MAX_DELAY, poll=POLL_SECONDS):
+        self.outbox = outbox
+        self.pool = pool
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.poll = poll
+        self.sent = self.retried = self.failed = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, name=f"mail-delivery-{i}", daemon=True) for i in range(threads)]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self.pool.close()
+
+    def submit(self, sender, recipients, subject, body):
+        """Queue a message and wake a worker; returns the outbox id"""
+        message_id = self.outbox.enqueue(sender, recipients, subject, body)
+        self._wake.set()
+        return message_id
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = self.outbox.claim(self.batch_size)
+                if batch:
+                    self._deliver(batch)
+                    continue
+                due = self.outbox.next_due()
+            except sqlite3.Error:
+                # Outbox busy or unavailable; the messages are still on disk, try again later
+                due = None
+            except Exception:
+                # Never let the thread die; claimed messages return to the queue when their lease runs out
+                logger.exception("mail delivery failed")
+                due = None
+            self._wake.wait(self.poll if due is None else min(due, self.poll))
+            self._wake.clear()
+
+    def _deliver(self, batch):
+        sent, handled = [], set()
+        try:
+            with self.pool.connection() as server:
+                for message in batch:
+                    try:
+                        server.send_message(self._build(message), message["sender"], message["recipients"])
+                        sent.append(message["id"])
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+                        # Refused by the server for this message only; the session is still usable
+                        self._failed_attempt(message, e)
+                    except (smtplib.SMTPException, OSError):
+                        raise
+                    except Exception as e:
+                        # A message that cannot be built or encoded will not go through on a retry either
+                        logger.exception("could not send outbox message %s", message["id"])
+                        self._failed_attempt(message, e, permanent=True)
+                        handled.add(message["id"])
+                        # Leave the session clean for the next message, in case it stopped mid-transaction
+                        server.rset()
+                        continue
+                    handled.add(message["id"])
+        except (smtplib.SMTPException, OSError) as e:
+            # The connection itself failed: whatever was not handled yet is retried
+            for message in batch:
+                if message["id"] not in handled:
+                    self._failed_attempt(message, e, permanent=False)
+        finally:
+            # Messages already accepted by the server are recorded even if the batch broke off
+            if sent:
+                self.outbox.mark_sent(sent)
+                with self._lock:
+                    self.sent += len(sent)
+
+    def _failed_attempt(self, message, error, permanent=None):
+        permanent = _is_permanent(error) if permanent is None else permanent
+        text = f"{type(error).__name__}: {error}"
+        if permanent or message["attempts"] + 1 >= self.max_attempts:
+            self.outbox.mark_failed(message["id"], text)
+            with self._lock:
+                self.failed += 1
+        else:
+            self.outbox.mark_retry(message["id"], text, min(self.backoff * 2 ** message["attempts"], self.max_delay))
+            with self._lock:
+                self.retried += 1
+
+    @staticmethod
+    def _build(message):
+        msg = EmailMessage()
+        msg["From"] = message["sender"]
+        msg["To"] = ", ".join(message["recipients"])
+        msg["Subject"] = message["subject"]
+        msg.set_content(message["body"])
+        return msg
+
+    def flush(self, timeout=30):
+        """Wait until nothing is pending (or timeout); True if the outbox drained"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self.outbox.counts().get("pending"):
+                return True
+            self._wake.set()
+            time.sleep(0.01)
+        return False
@@ -0,0 +1,279 @@
+import copy
+import re
+
+import numpy as np
+import pandas as pd
+
+# Most rows returned for a plain lookup
+MAX_ROWS = 10
+
+POLLUTANTS = ["PM2.5", "PM10", "NO", "NO2", "NOx", "NH3", "CO", "SO2", "O3", "Benzene", "Toluene", "Xylene", "AQI"]
+
+MONTH_NAMES = ["january", "february", "march", "april", "may", "june",
+               "july", "august", "september", "october", "november", "december"]
+
+# Words that turn a lookup into "find the extreme / average"
+INTENTS = {
+    "max": ["worst", "highest", "maximum", "max", "peak", "most polluted", "dirtiest"],
+    "min": ["best", "lowest", "minimum", "min", "least polluted", "cleanest"],
+    "mean": ["average", "mean", "typical"],
+}
+
+# Words after a lowercase "no" that make it the pollutant ("no levels in Delhi"), for questions already lowercased
+NO_CONTEXT = {"level", "levels", "concentration", "concentrations", "reading", "readings"}
+
+# What the extreme is taken over
+UNITS = {"day": ["day", "date"], "month": ["month"], "year": ["year"], "city": ["city", "cities"]}
+
+TOKEN_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}|\d{4}-\d{2}|[a-z]+\d*(?:\.\d+)?|\d+(?:\.\d+)?")
+
+
+def tokenize(text):
+    """Lowercase word, number and ISO date tokens"""
+    return TOKEN_PATTERN.findall(text.lower().replace("pm 2.5", "pm2.5").replace("pm25", "pm2.5"))
+
+
+def find_pollutant(tokens, pollutants, query=""):
+    """First pollutant named in tokens; pollutants maps lowercase names to column names
+
+    "no" is only the pollutant when query writes it as NO, or right before
+    "level", "concentration" and the like, which still works lowercased.
+    """
+    for i, token in enumerate(tokens):
+        if token in pollutants and (token != "no" or re.search(r"\bNO\b", query) or tokens[i + 1:i + 2] and tokens[i + 1] in NO_CONTEXT):
+            return pollutants[token]
+    return None
+
+
+def _postings(keys):
+    """Map each distinct key to the sorted row ids holding it"""
+    keys = np.asarray(keys)
+    order = np.argsort(keys, kind="stable")
+    values, starts = np.unique(keys[order], return_index=True)
+    return dict(zip(values.tolist(), np.split(order, starts[1:])))
+
+
+class QueryEngine:
+    """Inverted index over the dataset plus a small parser for structured questions
+
+    Tokens for cities, AQI buckets, dates (day, month, year), month names and
+    integer AQI values map to sorted row ids, built once at load. A question is
+    answered by intersecting posting lists and reducing only the matching rows.
+    A token can belong to several kinds ("2019" is a year and an AQI value);
+    kinds are tried in the order they were indexed. update() indexes new rows
+    after the existing ones (see live_feed.LiveDataset).
+    """
+
+    def __init__(self, df):
+        self._parts = []
+        self.index = {}
+        self.kinds = {}
+        self.pollutants = {p.lower(): p for p in POLLUTANTS if p in df.columns}
+
+        cities = df["City"].astype("category")
+        self._city_codes = cities.cat.codes.to_numpy().astype(np.int64)
+        self._city_labels = list(cities.cat.categories)
+        self._dates = np.empty(0, dtype=df["Date"].dtype)
+        self._years = self._months = np.empty(0, dtype=np.int32)
+        self._index_rows(df)
+
+    def update(self, rows):
+        """Index rows (same columns as the dataset) after the ones already indexed"""
+        if not len(rows):
+            return
+        codes = {city: code for code, city in enumerate(self._city_labels)}
+        for city in rows["City"].astype(str).unique():
+            if city not in codes:
+                codes[city] = len(self._city_labels)
+                self._city_labels = self._city_labels + [city]
+        self._city_codes = np.concatenate([self._city_codes, rows["City"].astype(str).map(codes).to_numpy(dtype=np.int64)])
+        self._index_rows(rows)
+
+    def copy(self):
+        """Independent copy to update() while readers go on using this one; the rows are shared"""
+        other = copy.copy(self)
+        # update() replaces posting arrays rather than writing into them; only the containers are copied
+        other._parts = list(self._parts)
+        other.index = dict(self.index)
+        other.kinds = {token: list(kinds) for token, kinds in self.kinds.items()}
+        return other
+
+    @property
+    def df(self):
+        """The indexed rows; rows added by update() are concatenated the first time it is asked for"""
+        if len(self._parts) > 1:
+            self._parts = [pd.concat(self._parts, ignore_index=True)]
+        return self._parts[0]
+
+    def _index_rows(self, df):
+        """Add the postings of df's rows, numbered from the number of rows indexed so far"""
+        offset = len(self._dates)
+        self._parts.append(df)
+        self._add_column("city", df["City"], offset)
+        if "AQI_Bucket" in df.columns:
+            self._add_column("bucket", df["AQI_Bucket"], offset)
+
+        dates = df["Date"]
+        valid = np.flatnonzero(dates.notna().to_numpy())
+        months = dates.dt.month.to_numpy()
+        self._dates = np.concatenate([self._dates, dates.to_numpy()])
+        self._years = np.concatenate([self._years, dates.dt.year.to_numpy()])
+        self._months = np.concatenate([self._months, months])
+        for kind, keys in [
+            ("date", dates.dt.strftime("%Y-%m-%d")),
+            ("month_of_year", dates.dt.strftime("%Y-%m")),
+            ("year", dates.dt.year.astype("Int64").astype(str)),
+        ]:
+            for token, rows in _postings(keys.to_numpy()[valid].astype(str)).items():
+                self._add(kind, token, offset + valid[rows])
+        month_names = np.array(MONTH_NAMES)[months[valid].astype(np.int64) - 1]
+        for token, rows in _postings(month_names).items():
+            self._add("month", token, offset + valid[rows])
+
+        if "AQI" in df.columns:
+            aqi = df["AQI"].to_numpy(dtype=np.float64, na_value=np.nan)
+            whole = np.flatnonzero(np.isfinite(aqi) & (aqi == np.round(aqi)))
+            for token, rows in _postings(aqi[whole].astype(np.int64)).items():
+                self._add("aqi", str(token), offset + whole[rows])
+
+    def _add_column(self, kind, series, offset):
+        values = series.astype(str).str.lower().to_numpy()
+        present = np.flatnonzero(series.notna().to_numpy())
+        for token, rows in _postings(values[present]).items():
+            self._add(kind, token, offset + present[rows])
+
+    def _add(self, kind, token, rows):
+        rows = np.sort(rows)
+        old = self.index.get((kind, token))
+        if old is None:
+            self.index[(kind, token)] = rows
+            self.kinds.setdefault(token, []).append(kind)
+        else:
+            # New rows are numbered after every indexed row, so the list stays sorted
+            self.index[(kind, token)] = np.concatenate([old, rows])
+
+    # ------------ Parsing ------------
+
+    def parse(self, query):
+        """Filters, pollutant, intent and unit found in a question"""
+        tokens = tokenize(query)
+        text = " ".join(tokens)
+        filters = {}
+        i = 0
+        while i < len(tokens):
+            # Longest phrase first so "very poor" wins over "poor"
+            for size in (3, 2, 1):
+                phrase = " ".join(tokens[i:i + size])
+                kinds = self.kinds.get(phrase, []) if size <= len(tokens) - i else []
+                kind = next((k for k in kinds if self._accept(k, phrase, query, tokens, i, size)), None)
+                if kind:
+                    filters.setdefault(kind, []).append(phrase)
+                    i += size
+                    break
+            else:
+                i += 1
+
+        pollutant = find_pollutant(tokens, self.pollutants, query)
+        intent = next((name for name, words in INTENTS.items() if any(re.search(rf"\b{w}\b", text) for w in words)), None)
+        unit = next((name for name, words in UNITS.items() if any(w in tokens for w in words)), None)
+        return {"filters": filters, "pollutant": pollutant, "intent": intent, "unit": unit}
+
+    def _accept(self, kind, phrase, query, tokens, i, size):
+        if kind == "aqi":
+            # Bare numbers only count as AQI values when the question says so
+            return "aqi" in tokens
+        if kind == "month" and phrase == "may":
+            # "may" is usually a verb; take it as a month next to "in"/"during" or a year
+            before = tokens[i - 1] if i else ""
+            after = tokens[i + size] if i + size < len(tokens) else ""
+            return before in ("in", "during", "of") or "year" in self.kinds.get(after, [])
+        return True
+
+    def rows(self, filters):
+        """Row ids matching every kind of filter; values of one kind are alternatives"""
+        matched = None
+        for kind, values in filters.items():
+            rows = self.index[(kind, values[0])]
+            for value in values[1:]:
+                rows = np.union1d(rows, self.index[(kind, value)])
+            matched = rows if matched is None else np.intersect1d(matched, rows, assume_unique=True)
+        return matched
+
+    # ------------ Answers ------------
+
+    def answer(self, query, limit=MAX_ROWS):
+        """Answer a question from the index, or None if it is not about the data"""
+        parsed = self.parse(query)
+        filters, pollutant, intent, unit = parsed["filters"], parsed["pollutant"], parsed["intent"], parsed["unit"]
+        # Without a filter, only questions like "worst month for PM10" or "best city" are about the data
+        if not filters and (intent is None or (pollutant is None and unit is None)):
+            return None
+
+        rows = self.rows(filters) if filters else np.arange(len(self.df))
+        scope = self._describe_scope(filters)
+        if len(rows) == 0:
+            return f"There are no records {scope}." if scope else None
+
+        if intent is None and pollutant is None:
+            return self._rows_table(rows, limit)
+
+        column = pollutant or "AQI"
+        values = self.df[column].to_numpy(dtype=np.float64, na_value=np.nan)[rows]
+        present = ~np.isnan(values)
+        rows, values = rows[present], values[present]
+        if len(rows) == 0:
+            return f"There are no {column} readings {scope}."
+
+        if intent in ("max", "min") and unit in ("month", "year", "city"):
+            return self._extreme_group(rows, values, column, intent, unit, scope)
+        if intent in ("max", "min"):
+            pick = np.argmax(values) if intent == "max" else np.argmin(values)
+            row = rows[pick]
+            word = "highest" if intent == "max" else "lowest"
+            where = "" if len(filters.get("city", [])) == 1 else f" in **{self.df['City'].iat[row]}**"
+            return (f"The {word} {column} {scope or 'in the dataset'} was **{values[pick]:.2f}**"
+                    f"{where} on {pd.Timestamp(self._dates[row]).date()}.")
+
+        return (f"Average {column} {scope or 'across the dataset'} was **{values.mean():.2f}** "
+                f"(min {values.min():.2f}, max {values.max():.2f}, {len(values):,} daily records).")
+
+    def _extreme_group(self, rows, values, column, intent, unit, scope):
+        if unit == "city":
+            keys = self._city_codes[rows].astype(np.int64)
+            labels = self._city_labels
+        elif unit == "year":
+            keys = self._years[rows].astype(np.int64)
+            labels = None
+        else:
+            keys = self._months[rows].astype(np.int64) - 1
+            labels = [m.capitalize() for m in MONTH_NAMES]
+        valid = keys >= 0
+        keys, values = keys[valid], values[valid]
+        counts = np.bincount(keys)
+        means = np.bincount(keys, weights=values) / np.where(counts > 0, counts, 1)
+        candidates = np.flatnonzero(counts)
+        pick = candidates[np.argmax(means[candidates]) if intent == "max" else np.argmin(means[candidates])]
+        label = labels[pick] if labels is not None else str(pick)
+        word = "worst" if intent == "max" else "best"
+        return f"The {word} {unit} {scope or 'overall'} is **{label}**, with an average {column} of **{means[pick]:.2f}**."
+
+    def _describe_scope(self, filters):
+        parts = []
+        if "city" in filters:
+            parts.append("for " + " and ".join(v.title() for v in filters["city"]))
+        for kind in ("date", "month_of_year", "month", "year"):
+            if kind in filters:
+                values = [v.capitalize() if kind == "month" else v for v in filters[kind]]
+                parts.append(("on " if kind == "date" else "in ") + " and ".join(values))
+        if "bucket" in filters:
+            parts.append("on " + " or ".join(v.title() for v in filters["bucket"]) + " days")
+        if "aqi" in filters:
+            parts.append("with AQI " + " or ".join(filters["aqi"]))
+        return " ".join(parts)
+
+    def _rows_table(self, rows, limit):
+        shown = self.df.iloc[rows[:limit]]
+        text = shown.to_string(index=False)
+        if len(rows) > limit:
+            text += f"\n\n... and {len(rows) - limit:,} more matching rows."
+        return text
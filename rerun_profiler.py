@@ -0,0 +1,302 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Finished reruns are appended here as JSON lines (unset: kept in memory only)
+PROFILE_LOG = os.environ.get("AQ_PROFILE_LOG")
+
+# Prometheus text-format file, e.g. for node_exporter's textfile collector (unset: not written)
+PROFILE_PROM = os.environ.get("AQ_PROFILE_PROM")
+
+# The Prometheus file is rewritten at most this often
+PROM_WRITE_SECONDS = 5.0
+
+# Histogram bucket bounds in seconds, for whole reruns and for sections
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Reruns kept per process for summary()
+RECENT_RERUNS = 2000
+
+logger = logging.getLogger(__name__)
+
+# The rerun being profiled in this thread; every session's script runs in a thread of its own
+_current = contextvars.ContextVar("rerun", default=None)
+
+try:
+    _PAGE_BYTES = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_BYTES = 4096
+
+
+def rss_bytes():
+    """Resident memory of this process, or None where it cannot be read"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_BYTES
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def current_rerun():
+    """The rerun being profiled in this thread, or None"""
+    rerun = _current.get()
+    return None if rerun is None or rerun.finished else rerun
+
+
+def count_cache(cache, hit):
+    """Count a lookup in `cache` against the running rerun, if any"""
+    rerun = current_rerun()
+    if rerun is not None:
+        rerun.count_cache(cache, hit)
+
+
+class Rerun:
+    """Timings of one script run (or one fragment redraw), split into named sections
+
+    section() ends the running section and starts the next, so a flat
+    script only needs one call at the top of each of its blocks. A section
+    entered twice adds up. Each section records wall time, CPU time of the
+    script's thread (wall minus CPU is time spent waiting, e.g. on locks or
+    other sessions) and the change in the process's resident memory, which
+    other sessions running at the same time also move.
+    """
+
+    def __init__(self, profiler, page=None, kind="script", section="setup"):
+        self.profiler = profiler
+        self.page = page
+        self.kind = kind
+        self.started = time.time()
+        # section -> [seconds, CPU seconds, RSS change in bytes]
+        self.sections = {}
+        # cache -> [hits, misses]
+        self.caches = {}
+        self.finished = False
+        self._section = section
+        self._begin = self._mark = time.perf_counter()
+        self._begin_cpu = self._mark_cpu = time.thread_time()
+        self._begin_rss = self._mark_rss = rss_bytes()
+
+    def section(self, name):
+        """End the running section and start `name`"""
+        if self.finished:
+            return
+        now, cpu, rss = time.perf_counter(), time.thread_time(), rss_bytes()
+        totals = self.sections.setdefault(self._section, [0.0, 0.0, 0])
+        totals[0] += now - self._mark
+        totals[1] += cpu - self._mark_cpu
+        if rss is not None and self._mark_rss is not None:
+            totals[2] += rss - self._mark_rss
+        self._section, self._mark, self._mark_cpu, self._mark_rss = name, now, cpu, rss
+
+    def count_cache(self, cache, hit):
+        counts = self.caches.setdefault(cache, [0, 0])
+        counts[0 if hit else 1] += 1
+
+    def finish(self):
+        """End the rerun and hand it to the profiler; later calls do nothing"""
+        if self.finished:
+            return
+        self.section(None)
+        self.seconds = self._mark - self._begin
+        self.cpu_seconds = self._mark_cpu - self._begin_cpu
+        self.rss = self._mark_rss
+        self.rss_change = None if self.rss is None or self._begin_rss is None else self.rss - self._begin_rss
+        self.finished = True
+        if _current.get() is self:
+            _current.set(None)
+        self.profiler.record(self)
+
+    def to_dict(self):
+        return {
+            "time": round(self.started, 3),
+            "page": self.page,
+            "kind": self.kind,
+            "ms": round(self.seconds * 1000, 3),
+            "cpu_ms": round(self.cpu_seconds * 1000, 3),
+            "rss_mb": None if self.rss is None else round(self.rss / 2 ** 20, 1),
+            "rss_change_kb": None if self.rss_change is None else self.rss_change // 1024,
+            "sections": {
+                name: {"ms": round(seconds * 1000, 3), "cpu_ms": round(cpu * 1000, 3), "rss_change_kb": rss // 1024}
+                for name, (seconds, cpu, rss) in self.sections.items()
+            },
+            "caches": {name: {"hits": hits, "misses": misses} for name, (hits, misses) in self.caches.items()},
+        }
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+def _labels(**labels):
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+class RerunProfiler:
+    """Collects the reruns of every session in this process and exports them
+
+    Every finished rerun is kept in a bounded list for summary(), folded
+    into Prometheus histograms and counters, appended to the JSON-lines
+    log if one is configured, and the Prometheus file is rewritten when it
+    is due. Profiling costs a few clock and /proc reads per section.
+    """
+
+    def __init__(self, log_path=PROFILE_LOG, prom_path=PROFILE_PROM, prom_interval=PROM_WRITE_SECONDS, recent=RECENT_RERUNS):
+        self.log_path = log_path
+        self.prom_path = prom_path
+        self.prom_interval = prom_interval
+        self.recent = deque(maxlen=recent)
+        # (page, kind) -> histogram of whole reruns; (page, section) -> histogram of sections
+        self.reruns = {}
+        self.section_seconds = {}
+        self.cpu_seconds = {}
+        self.cache_lookups = {}
+        self._log = None
+        self._prom_written = 0.0
+        self._lock = threading.Lock()
+
+    def start(self, page=None, kind="script", section="setup"):
+        """Begin profiling a rerun in this thread; a rerun left unfinished here (st.rerun, st.stop, an error) is dropped"""
+        rerun = Rerun(self, page, kind, section)
+        _current.set(rerun)
+        return rerun
+
+    @contextmanager
+    def part(self, name, page=None, kind="fragment"):
+        """Section `name` of the running rerun, or a rerun of its own when there is none, e.g. a fragment redrawing by itself"""
+        rerun = current_rerun()
+        if rerun is None:
+            rerun = self.start(page, kind, name)
+            try:
+                yield rerun
+            finally:
+                rerun.finish()
+            return
+        outer = rerun._section
+        rerun.section(name)
+        try:
+            yield rerun
+        finally:
+            rerun.section(outer)
+
+    def record(self, rerun):
+        record = rerun.to_dict()
+        with self._lock:
+            self.recent.append(record)
+            self.reruns.setdefault((rerun.page, rerun.kind), _Histogram()).observe(rerun.seconds)
+            for name, (seconds, cpu, _) in rerun.sections.items():
+                self.section_seconds.setdefault((rerun.page, name), _Histogram()).observe(seconds)
+                self.cpu_seconds[(rerun.page, name)] = self.cpu_seconds.get((rerun.page, name), 0.0) + cpu
+            for cache, (hits, misses) in rerun.caches.items():
+                for result, n in (("hit", hits), ("miss", misses)):
+                    self.cache_lookups[(cache, result)] = self.cache_lookups.get((cache, result), 0) + n
+            if self.log_path:
+                try:
+                    if self._log is None:
+                        self._log = open(self.log_path, "a", encoding="utf-8")
+                    self._log.write(json.dumps(record) + "\n")
+                    self._log.flush()
+                except OSError:
+                    logger.exception("could not write the rerun profile to %s", self.log_path)
+            due = self.prom_path and time.monotonic() - self._prom_written >= self.prom_interval
+        if due:
+            self.write_prometheus()
+        logger.debug("%s rerun of %s took %.1f ms", rerun.kind, rerun.page, rerun.seconds * 1000)
+
+    def prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+
+        def histogram(metric, help_text, histograms, label_names):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for key, h in sorted(histograms.items(), key=lambda item: tuple(map(str, item[0]))):
+                labels = dict(zip(label_names, key))
+                for bound, n in zip(BUCKETS, h.buckets):
+                    lines.append(f"{metric}_bucket{_labels(**labels, le=f'{bound:g}')} {n}")
+                lines.append(f"{metric}_bucket{_labels(**labels, le='+Inf')} {h.count}")
+                lines.append(f"{metric}_sum{_labels(**labels)} {h.sum:.6f}")
+                lines.append(f"{metric}_count{_labels(**labels)} {h.count}")
+
+        with self._lock:
+            histogram("aq_rerun_seconds", "Wall time of a script rerun or fragment redraw", self.reruns, ("page", "kind"))
+            histogram("aq_section_seconds", "Wall time of a section of a rerun", self.section_seconds, ("page", "section"))
+            lines.append("# HELP aq_section_cpu_seconds_total CPU time of the session thread spent in a section")
+            lines.append("# TYPE aq_section_cpu_seconds_total counter")
+            for (page, section), seconds in sorted(self.cpu_seconds.items(), key=lambda item: tuple(map(str, item[0]))):
+                lines.append(f"aq_section_cpu_seconds_total{_labels(page=page, section=section)} {seconds:.6f}")
+            lines.append("# HELP aq_cache_lookups_total Lookups in the app's caches during reruns")
+            lines.append("# TYPE aq_cache_lookups_total counter")
+            for (cache, result), n in sorted(self.cache_lookups.items()):
+                lines.append(f"aq_cache_lookups_total{_labels(cache=cache, result=result)} {n}")
+        rss = rss_bytes()
+        if rss is not None:
+            lines.append("# HELP aq_resident_memory_bytes Resident memory of the app process")
+            lines.append("# TYPE aq_resident_memory_bytes gauge")
+            lines.append(f"aq_resident_memory_bytes {rss}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        """Rewrite the Prometheus file; scrapers never see a half-written one"""
+        path = path or self.prom_path
+        with self._lock:
+            self._prom_written = time.monotonic()
+        try:
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                f.write(self.prometheus())
+            os.replace(f"{path}.tmp", path)
+        except OSError:
+            logger.exception("could not write Prometheus metrics to %s", path)
+
+    def summary(self):
+        """Per page and section over the recent reruns: runs, p50/p95/p99 and mean CPU milliseconds, mean RSS change"""
+        with self._lock:
+            records = list(self.recent)
+        timings = {}
+        for record in records:
+            whole = {"ms": record["ms"], "cpu_ms": record["cpu_ms"], "rss_change_kb": record["rss_change_kb"]}
+            for name, section in {"(whole rerun)": whole, **record["sections"]}.items():
+                timings.setdefault((record["page"], name), []).append(section)
+        rows = []
+        for (page, name), sections in timings.items():
+            ms = sorted(s["ms"] for s in sections)
+            rss = [s["rss_change_kb"] for s in sections if s["rss_change_kb"] is not None]
+            rows.append({
+                "page": page,
+                "section": name,
+                "runs": len(ms),
+                "p50_ms": ms[len(ms) // 2],
+                "p95_ms": ms[min(int(len(ms) * 0.95), len(ms) - 1)],
+                "p99_ms": ms[min(int(len(ms) * 0.99), len(ms) - 1)],
+                "cpu_ms": sum(s["cpu_ms"] for s in sections) / len(sections),
+                "rss_change_kb": sum(rss) / len(rss) if rss else None,
+            })
+        return rows
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+        if self.prom_path:
+            self.write_prometheus()
@@ -0,0 +1,435 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+# Percentiles reported by DataFrame.describe()
+DESCRIBE_PERCENTILES = [0.25, 0.5, 0.75]
+
+# Points kept per city and column in the quantile sketches
+SKETCH_SIZE = 257
+
+
+def _sorted_quantiles(sorted_values, quantiles):
+    """Same as np.quantile() for an already sorted array, without partitioning it again"""
+    positions = np.asarray(quantiles) * (len(sorted_values) - 1)
+    low = np.floor(positions).astype(np.int64)
+    high = np.minimum(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (positions - low)
+
+
+def _sketch(sorted_values, size=SKETCH_SIZE):
+    """Quantile grid of a sorted array; grids of several cities can be merged by count"""
+    if len(sorted_values) == 0:
+        return np.full(size, np.nan)
+    return _sorted_quantiles(sorted_values, np.linspace(0, 1, size))
+
+
+def _merge_sketches(sketches, counts, percentiles):
+    """Approximate percentiles of the union of several sketched groups"""
+    sketches = [s for s, n in zip(sketches, counts) if n > 0]
+    counts = [n for n in counts if n > 0]
+    if not counts:
+        return np.full(len(percentiles), np.nan)
+    if len(counts) == 1:
+        return np.interp(percentiles, np.linspace(0, 1, len(sketches[0])), sketches[0])
+
+    # Evaluate the combined CDF on every grid point, then invert it
+    grid = np.unique(np.concatenate(sketches))
+    ranks = np.zeros(len(grid))
+    for sketch, n in zip(sketches, counts):
+        levels = np.linspace(0, 1, len(sketch))
+        ranks += n * np.interp(grid, sketch, levels, left=0.0, right=1.0)
+    return np.interp(percentiles, ranks / sum(counts), grid)
+
+
+class CorrStats:
+    """Pairwise-complete sums and cross-products of the numeric columns, per city
+
+    Enough to rebuild the correlation matrix of any set of cities without
+    touching rows. update() folds new rows in and update(rows, sign=-1) takes
+    replaced ones back out, so the table can follow appends and corrections.
+    """
+
+    def __init__(self, columns, shift=None, city_column="City"):
+        self.columns = list(columns)
+        self.city_column = city_column
+        # Values are taken around a fixed per-column shift so the sums stay accurate
+        self.shift = np.zeros(len(self.columns)) if shift is None else np.asarray(shift, dtype=np.float64)
+        # City (None for rows without one) -> stacked n, sx, sxx, sxy matrices
+        self.sums = {}
+
+    @classmethod
+    def from_frame(cls, df, columns, city_column="City"):
+        x = df[list(columns)].to_numpy(dtype=np.float64, na_value=np.nan)
+        with np.errstate(invalid="ignore"):
+            shift = np.nan_to_num(np.nanmean(x, axis=0)) if len(x) else None
+        stats = cls(columns, shift, city_column)
+        stats.update(df)
+        return stats
+
+    @staticmethod
+    def _sums(x):
+        mask = (~np.isnan(x)).astype(np.float64)
+        xz = np.nan_to_num(x)
+        # n[i, j]: rows with both columns present; sx[i, j]: sum of column i over those rows
+        return np.stack([mask.T @ mask, xz.T @ mask, (xz * xz).T @ mask, xz.T @ xz])
+
+    def update(self, rows, sign=1):
+        """Add rows (same columns as the dataset) to their cities' sums, or remove them with sign=-1"""
+        if not self.columns or not len(rows):
+            return
+        x = rows[self.columns].to_numpy(dtype=np.float64, na_value=np.nan) - self.shift
+        cities = rows[self.city_column].astype("category")
+        codes = cities.cat.codes.to_numpy()
+        for code in np.unique(codes):
+            city = None if code < 0 else cities.cat.categories[code]
+            sums = sign * self._sums(x[codes == code])
+            if city in self.sums:
+                self.sums[city] += sums
+            else:
+                self.sums[city] = sums
+
+    def copy(self):
+        other = copy.copy(self)
+        other.sums = {city: sums.copy() for city, sums in self.sums.items()}
+        return other
+
+    def corr(self, cities=None):
+        """Same matrix as .corr() of the numeric columns of the rows of these cities (all rows if None)"""
+        k = len(self.columns)
+        parts = list(self.sums.values()) if cities is None else [self.sums[c] for c in cities if c in self.sums]
+        n, sx, sxx, sxy = np.sum(parts, axis=0) if parts else np.zeros((4, k, k))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = n * sxy - sx * sx.T
+            spread = n * sxx - sx * sx
+            # Constant columns cancel to rounding noise rather than exactly zero
+            spread = np.where(spread > 1e-10 * n * sxx, spread, 0.0)
+            var = spread * spread.T
+            corr = np.where((n > 0) & (var > 0), cov / np.sqrt(var), np.nan)
+        corr = np.clip(corr, -1, 1)
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+
+class RollupCube:
+    """City x year x month aggregates of every numeric column, answered without touching rows
+
+    Each cell keeps count, sum, sum of squares, min and max per column. Sums are
+    taken around a fixed per-column shift so variances stay accurate when merged.
+    Exact describe() percentiles come from each city's sorted values (and all of
+    them together for the whole table), and quantile sketches per city cover any
+    other combination of cities. update() folds appended rows in.
+    """
+
+    def __init__(self, df, city_column="City", date_column="Date"):
+        self.city_column = city_column
+        self.date_column = date_column
+
+        # Same column selection as DataFrame.describe() and the correlation heatmap
+        described = df.select_dtypes(include=[np.number, "datetime"])
+        self.columns = list(described.columns)
+        self.datetime_columns = [c for c in self.columns if described[c].dtype.kind == "M"]
+        self.dtypes = {c: described[c].dtype for c in self.columns}
+        self.corr_columns = list(df.select_dtypes(include=["float64", "int64"]).columns)
+
+        cities = df[city_column].astype("category")
+        self.cities = list(cities.cat.categories)
+        self._city_codes = {city: code for code, city in enumerate(self.cities)}
+
+        values = self._values(described)
+        with np.errstate(invalid="ignore"):
+            self.shift = np.nan_to_num(np.nanmean(values, axis=0)) if len(values) else np.zeros(len(self.columns))
+
+        # Cell keys; rows without a date land in year/month -1 and only count towards totals
+        dates = df[date_column]
+        city_codes = cities.cat.codes.to_numpy().astype(np.int64)
+        years = dates.dt.year.fillna(-1).to_numpy().astype(np.int64)
+        months = dates.dt.month.fillna(-1).to_numpy().astype(np.int64)
+        self._build_cells(values, city_codes, years, months)
+        self._build_quantiles(values, city_codes)
+        self.corr_stats = CorrStats.from_frame(df, self.corr_columns, city_column)
+        self._memo = {}
+
+    def _values(self, df):
+        return np.column_stack([self._as_float(df[c]) for c in self.columns]) if self.columns else np.empty((len(df), 0))
+
+    @staticmethod
+    def _as_float(series):
+        if series.dtype.kind == "M":
+            return np.where(series.isna(), np.nan, series.to_numpy().view("i8").astype(np.float64))
+        return series.to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def _build_cells(self, values, city_codes, years, months):
+        keys = np.column_stack([city_codes, years, months])
+        cell_keys, cell_ids = np.unique(keys, axis=0, return_inverse=True)
+        n_cells, n_columns = len(cell_keys), len(self.columns)
+        self.cell_city, self.cell_year, self.cell_month = cell_keys.T if n_cells else (np.empty(0, np.int64),) * 3
+        self._cell_ids = {key: i for i, key in enumerate(map(tuple, cell_keys.tolist()))}
+        self.cell_count = np.zeros((n_cells, n_columns))
+        self.cell_sum = np.zeros((n_cells, n_columns))
+        self.cell_sumsq = np.zeros((n_cells, n_columns))
+        self.cell_min = np.full((n_cells, n_columns), np.inf)
+        self.cell_max = np.full((n_cells, n_columns), -np.inf)
+        self._add_to_cells(values, cell_ids.ravel())
+
+    def _add_to_cells(self, values, cell_ids):
+        present = ~np.isnan(values)
+        shifted = np.where(present, values - self.shift, 0.0)
+        np.add.at(self.cell_count, cell_ids, present)
+        np.add.at(self.cell_sum, cell_ids, shifted)
+        np.add.at(self.cell_sumsq, cell_ids, shifted * shifted)
+        np.minimum.at(self.cell_min, cell_ids, np.where(present, values, np.inf))
+        np.maximum.at(self.cell_max, cell_ids, np.where(present, values, -np.inf))
+
+    def _build_quantiles(self, values, city_codes):
+        n_columns = len(self.columns)
+        self.city_quantiles = np.full((len(self.cities), len(DESCRIBE_PERCENTILES), n_columns), np.nan)
+        self.city_sketches = np.full((len(self.cities), SKETCH_SIZE, n_columns), np.nan)
+        # (city, column) -> that city's present values of the column, sorted
+        self.city_values = {}
+        for j in range(n_columns):
+            # One sort by city, then value; NaN sorts last within each city
+            order = np.lexsort((values[:, j], city_codes))
+            column, codes = values[order, j], city_codes[order]
+            bounds = np.searchsorted(codes, np.arange(len(self.cities) + 1))
+            for code in range(len(self.cities)):
+                city_values = column[bounds[code]:bounds[code + 1]]
+                self.city_values[code, j] = city_values[:np.count_nonzero(~np.isnan(city_values))]
+                self._refresh_quantiles(code, j)
+        self._all_quantiles = None
+
+    def _refresh_quantiles(self, code, j):
+        city_values = self.city_values[code, j]
+        if len(city_values):
+            self.city_quantiles[code, :, j] = _sorted_quantiles(city_values, DESCRIBE_PERCENTILES)
+        self.city_sketches[code, :, j] = _sketch(city_values)
+
+    @property
+    def all_quantiles(self):
+        """describe() percentiles of the whole table, from the cities' sorted values"""
+        if self._all_quantiles is None:
+            quantiles = np.full((len(DESCRIBE_PERCENTILES), len(self.columns)), np.nan)
+            for j in range(len(self.columns)):
+                column = np.concatenate([self.city_values[code, j] for code in range(len(self.cities))] + [np.empty(0)])
+                if len(column):
+                    quantiles[:, j] = np.quantile(column, DESCRIBE_PERCENTILES)
+            self._all_quantiles = quantiles
+        return self._all_quantiles
+
+    def update(self, rows):
+        """Fold appended rows (same columns as the dataset) into the cells, sorted values and correlation sums
+
+        Rows are added, not matched against earlier ones: a row for a (city,
+        date) already in the cube is counted twice. Rows without a city only
+        count towards the correlation sums.
+        """
+        rows = rows[rows[self.city_column].notna()]
+        if not len(rows):
+            return
+        values = self._values(rows)
+        names = rows[self.city_column].astype(str).to_numpy()
+        for city in dict.fromkeys(names):
+            if city not in self._city_codes:
+                self._add_city(city)
+        city_codes = np.array([self._city_codes[city] for city in names], dtype=np.int64)
+        dates = rows[self.date_column]
+        years = dates.dt.year.fillna(-1).to_numpy().astype(np.int64)
+        months = dates.dt.month.fillna(-1).to_numpy().astype(np.int64)
+
+        keys = list(zip(city_codes.tolist(), years.tolist(), months.tolist()))
+        new_keys = [key for key in dict.fromkeys(keys) if key not in self._cell_ids]
+        if new_keys:
+            first = len(self.cell_city)
+            self._cell_ids.update((key, first + i) for i, key in enumerate(new_keys))
+            added = np.array(new_keys, dtype=np.int64).reshape(-1, 3)
+            self.cell_city, self.cell_year, self.cell_month = (np.concatenate([old, new]) for old, new in
+                                                               zip((self.cell_city, self.cell_year, self.cell_month), added.T))
+            k = len(self.columns)
+            self.cell_count = np.vstack([self.cell_count, np.zeros((len(new_keys), k))])
+            self.cell_sum = np.vstack([self.cell_sum, np.zeros((len(new_keys), k))])
+            self.cell_sumsq = np.vstack([self.cell_sumsq, np.zeros((len(new_keys), k))])
+            self.cell_min = np.vstack([self.cell_min, np.full((len(new_keys), k), np.inf)])
+            self.cell_max = np.vstack([self.cell_max, np.full((len(new_keys), k), -np.inf)])
+        self._add_to_cells(values, np.array([self._cell_ids[key] for key in keys], dtype=np.int64))
+
+        # Only the touched cities' percentiles are recomputed
+        for code in np.unique(city_codes).tolist():
+            mine = values[city_codes == code]
+            for j in range(len(self.columns)):
+                new = np.sort(mine[~np.isnan(mine[:, j]), j])
+                if len(new):
+                    old = self.city_values[code, j]
+                    self.city_values[code, j] = np.insert(old, np.searchsorted(old, new), new)
+                    self._refresh_quantiles(code, j)
+        self._all_quantiles = None
+        self.corr_stats.update(rows)
+        self._memo.clear()
+
+    def copy(self):
+        """Independent copy to update() while readers go on using this one"""
+        other = copy.copy(self)
+        other.cities = list(self.cities)
+        other._city_codes = dict(self._city_codes)
+        other._cell_ids = dict(self._cell_ids)
+        for name in ["cell_count", "cell_sum", "cell_sumsq", "cell_min", "cell_max", "city_quantiles", "city_sketches"]:
+            setattr(other, name, getattr(self, name).copy())
+        # Sorted values are replaced by update(), never written into, so the arrays are shared
+        other.city_values = dict(self.city_values)
+        other.corr_stats = self.corr_stats.copy()
+        # update() empties the memo anyway, and sessions may be filling this one meanwhile
+        other._memo = {}
+        return other
+
+    def _add_city(self, city):
+        code = len(self.cities)
+        self.cities.append(city)
+        self._city_codes[city] = code
+        k = len(self.columns)
+        self.city_quantiles = np.concatenate([self.city_quantiles, np.full((1, len(DESCRIBE_PERCENTILES), k), np.nan)])
+        self.city_sketches = np.concatenate([self.city_sketches, np.full((1, SKETCH_SIZE, k), np.nan)])
+        for j in range(k):
+            self.city_values[code, j] = np.empty(0)
+
+    # ------------ Queries ------------
+
+    def _city_key(self, cities):
+        if cities is None or (isinstance(cities, str) and cities == "All"):
+            return None
+        if isinstance(cities, str):
+            cities = [cities]
+        return tuple(sorted(self._city_codes[c] for c in cities if c in self._city_codes))
+
+    def _cached(self, name, key, compute):
+        memo_key = (name, key)
+        if memo_key not in self._memo:
+            self._memo[memo_key] = compute()
+        return self._memo[memo_key]
+
+    def _cell_mask(self, key):
+        if key is None:
+            return np.ones(len(self.cell_city), dtype=bool)
+        return np.isin(self.cell_city, key)
+
+    def totals(self, cities=None, years=None, months=None):
+        """Count, mean, sample std, min and max per column over the selected cells"""
+        mask = self._cell_mask(self._city_key(cities))
+        if years is not None:
+            mask &= np.isin(self.cell_year, years)
+        if months is not None:
+            mask &= np.isin(self.cell_month, months)
+        count = self.cell_count[mask].sum(axis=0)
+        total = self.cell_sum[mask].sum(axis=0)
+        sumsq = self.cell_sumsq[mask].sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total / count + self.shift, np.nan)
+            spread = sumsq - total * total / count
+            spread = np.where(spread > 1e-10 * sumsq, spread, 0.0)
+            var = np.where(count > 1, spread / (count - 1), np.nan)
+        std = np.sqrt(np.clip(var, 0, None))
+        low = self.cell_min[mask].min(axis=0, initial=np.inf)
+        high = self.cell_max[mask].max(axis=0, initial=-np.inf)
+        return {
+            "count": count,
+            "mean": mean,
+            "std": std,
+            "min": np.where(count > 0, low, np.nan),
+            "max": np.where(count > 0, high, np.nan),
+        }
+
+    def quantiles(self, cities=None):
+        """describe() percentiles per column: exact for one city or all, sketched otherwise"""
+        key = self._city_key(cities)
+        if key is None:
+            return self.all_quantiles
+        if len(key) == 1:
+            return self.city_quantiles[key[0]]
+        counts = self.totals([self.cities[c] for c in key])["count"]
+        merged = np.full((len(DESCRIBE_PERCENTILES), len(self.columns)), np.nan)
+        for j in range(len(self.columns)):
+            city_counts = [self.cell_count[self.cell_city == c, j].sum() for c in key]
+            merged[:, j] = _merge_sketches([self.city_sketches[c, :, j] for c in key], city_counts, DESCRIBE_PERCENTILES)
+        merged[:, counts == 0] = np.nan
+        return merged
+
+    def city_means(self, column="AQI"):
+        """Same as df.groupby(City)[column].mean().reset_index()"""
+        def compute():
+            j = self.columns.index(column)
+            count = np.bincount(self.cell_city[self.cell_city >= 0], weights=self.cell_count[self.cell_city >= 0, j], minlength=len(self.cities))
+            total = np.bincount(self.cell_city[self.cell_city >= 0], weights=self.cell_sum[self.cell_city >= 0, j], minlength=len(self.cities))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = np.where(count > 0, total / count + self.shift[j], np.nan)
+            # Cities added by update() come last in self.cities; the table stays in name order like groupby
+            order = np.argsort(self.cities, kind="stable")
+            return pd.DataFrame({self.city_column: np.array(self.cities, dtype=object)[order], column: mean[order]})
+        return self._cached("city_means", column, compute).copy()
+
+    def top_cities(self, n=5, column="AQI", largest=True):
+        """Same as city_means(column).nlargest(n, column), or nsmallest when largest is False"""
+        def compute():
+            means = self.city_means(column)
+            values = means[column].to_numpy()
+            valid = np.flatnonzero(~np.isnan(values))
+            order = valid[np.argsort(-values[valid] if largest else values[valid], kind="stable")]
+            return means.iloc[order[:n]]
+        return self._cached("top_cities", (n, column, largest), compute).copy()
+
+    def monthly_means(self, cities=None, column="AQI"):
+        """Same as df_filtered.groupby("Month")[column].mean().reset_index()"""
+        key = self._city_key(cities)
+
+        def compute():
+            j = self.columns.index(column)
+            mask = self._cell_mask(key) & (self.cell_month > 0)
+            count = np.bincount(self.cell_month[mask], weights=self.cell_count[mask, j], minlength=13)
+            total = np.bincount(self.cell_month[mask], weights=self.cell_sum[mask, j], minlength=13)
+            months = np.flatnonzero(count)
+            month_dtype = self.dtypes.get("Month", np.dtype(np.int32))
+            return pd.DataFrame({"Month": months.astype(month_dtype), column: total[months] / count[months] + self.shift[j]})
+        return self._cached("monthly_means", (key, column), compute).copy()
+
+    def describe(self, cities=None):
+        """Same table as df_filtered.describe()"""
+        key = self._city_key(cities)
+
+        def compute():
+            stats = self.totals([self.cities[c] for c in key] if key is not None else None)
+            quantiles = self.quantiles([self.cities[c] for c in key] if key is not None else None)
+            labels = [f"{int(p * 100)}%" for p in DESCRIBE_PERCENTILES]
+            columns = []
+            for j, name in enumerate(self.columns):
+                if name in self.datetime_columns:
+                    to_date = self._to_datetime(name)
+                    index = ["count", "mean", "min", *labels, "max"]
+                    data = [int(stats["count"][j]), to_date(stats["mean"][j]), to_date(stats["min"][j]),
+                            *[to_date(q) for q in quantiles[:, j]], to_date(stats["max"][j])]
+                    columns.append(pd.Series(data, index=index, name=name))
+                else:
+                    index = ["count", "mean", "std", "min", *labels, "max"]
+                    data = [stats["count"][j], stats["mean"][j], stats["std"][j], stats["min"][j], *quantiles[:, j], stats["max"][j]]
+                    columns.append(pd.Series(data, index=index, name=name, dtype=np.float64))
+            # Row order follows pandas: shortest index first, new labels appended
+            order = []
+            for index in sorted((s.index for s in columns), key=len):
+                order.extend(label for label in index if label not in order)
+            return pd.concat([s.reindex(order) for s in columns], axis=1, sort=False)
+        return self._cached("describe", key, compute).copy()
+
+    def _to_datetime(self, column):
+        unit = np.datetime_data(self.dtypes[column])[0]
+
+        def convert(value):
+            if np.isnan(value):
+                return pd.NaT
+            return pd.Timestamp(np.datetime64(int(round(value)), unit))
+        return convert
+
+    def corr(self, cities=None):
+        """Same matrix as df_filtered.select_dtypes(["float64", "int64"]).corr()"""
+        key = self._city_key(cities)
+        return self._cached("corr", key, lambda: self.corr_stats.corr(None if key is None else [self.cities[c] for c in key])).copy()
+
+
+def build_cube(df, city_column="City", date_column="Date"):
+    """Build the rollup cube for a loaded dataset"""
+    return RollupCube(df, city_column=city_column, date_column=date_column)
@@ -0,0 +1,94 @@
+import os
+import threading
+
+import streamlit as st
+
+
+# One copy per process, shared by app.py, chatbot.py and every session.
+# data_store (and with it pandas and pyarrow) is imported on first use, so
+# pages that never touch the data do not pay for it.
+@st.cache_resource(max_entries=1)
+def load_data(version):
+    """The city-day dataset for `version` (current_version()); read-only, never modify it in place"""
+    if version[0] == "live":
+        return load_live_feed().dataset.frame()
+    from data_store import load_dataset
+
+    df = load_dataset()
+    df["Month"] = df["Date"].dt.month
+    return df
+
+
+# Last daily series built, as (version, series); the next version only reads the partitions added since.
+# Sessions may still be reading that series, so new partitions go into a copy of it and it is never changed.
+_latest_series = []
+_latest_series_lock = threading.Lock()
+
+
+@st.cache_resource(max_entries=1)
+def load_daily_series(version):
+    """Rolling means and WHO exceedances per city (daily_series.DailySeries) for `version`
+
+    When `version` is the previous one plus new partitions from ingest.py,
+    only the new partitions are read and folded into the existing series.
+    """
+    from daily_series import DailySeries
+    from data_store import PARTITIONS_DIR, load_partitions
+
+    live = live_aggregate(version, "daily_series", DailySeries)
+    if live is not None:
+        return live
+    with _latest_series_lock:
+        latest = _latest_series[0] if _latest_series else None
+    if latest is not None:
+        previous, series = latest
+        added = version[len(previous):]
+        if added and version[:len(previous)] == previous and all(name.endswith(".arrow") for name in version):
+            series = series.copy()
+            series.update(load_partitions([os.path.join(PARTITIONS_DIR, name) for name in added]))
+            with _latest_series_lock:
+                _latest_series[:] = [(version, series)]
+            return series
+    series = DailySeries(load_data(version))
+    with _latest_series_lock:
+        _latest_series[:] = [(version, series)]
+    return series
+
+
+# Rows from the feed named by AQ_LIVE_SOURCE are added to a copy of the loaded
+# dataset as they arrive (see live_feed.py); without it the app shows the data on disk
+@st.cache_resource
+def load_live_feed():
+    """The running live_feed.LiveFeed, started on first use, or None if AQ_LIVE_SOURCE is not set"""
+    source = os.environ.get("AQ_LIVE_SOURCE")
+    if not source:
+        return None
+    from data_store import dataset_version
+    from live_feed import LiveDataset, LiveFeed, open_source
+
+    version = dataset_version()
+    return LiveFeed(open_source(source), LiveDataset(load_data(version), version)).start()
+
+
+def current_version():
+    """Version of the data to show: the live dataset's while a feed runs, else data_store.dataset_version()"""
+    live = load_live_feed()
+    if live is not None:
+        return live.dataset.version()
+    from data_store import dataset_version
+
+    return dataset_version()
+
+
+def city_names(version):
+    """Cities in the data of `version`; a live dataset answers without assembling its frame"""
+    if version[0] == "live":
+        return load_live_feed().dataset.cities()
+    return tuple(load_data(version)["City"].unique())
+
+
+def live_aggregate(version, name, build):
+    """The live dataset's own copy of an aggregate, updated as rows arrive, if version is a live version; else None"""
+    if version[0] != "live":
+        return None
+    return load_live_feed().dataset.aggregate(name, build)
@@ -0,0 +1,211 @@
+import copy
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Rows shown per page of the dataset preview
+PAGE_SIZE = 50
+
+# Full-table sort orders kept in memory (8 bytes per row each)
+SORTED_ORDERS = 4
+
+
+class TableIndex:
+    """Row indexes on (City, Date) and Date for paging, filtering and sorting without copying the frame
+
+    Only the rows of the requested page are ever materialised; filters are
+    slices of the precomputed orderings and sorts touch the filtered rows only.
+    One instance is shared by every session; its caches of sort keys and
+    whole-table orders are only touched under a lock. update() inserts new
+    rows into the orderings (see live_feed.LiveDataset); rows of a city not
+    seen before lay the index out again.
+    """
+
+    def __init__(self, df, city_column="City", date_column="Date"):
+        self.city_column = city_column
+        self.date_column = date_column
+        self._date_dtype = df[date_column].dtype
+        self._lock = threading.Lock()
+        self._layout(df)
+
+    def _layout(self, df):
+        self._parts = [df]
+        cities = df[self.city_column].astype("category")
+        self.cities = list(cities.cat.categories)
+        codes = cities.cat.codes.to_numpy()
+        dates = self._sort_key(df[self.date_column])
+
+        # Rows ordered by (City, Date), with the slice each city occupies
+        self.by_city_date = np.lexsort((dates, codes))
+        self._bounds = np.searchsorted(codes[self.by_city_date], np.arange(len(self.cities) + 1), side="left")
+        self.city_slices = {city: (self._bounds[i], self._bounds[i + 1]) for i, city in enumerate(self.cities)}
+        self.city_dates = dates[self.by_city_date]
+
+        # Rows ordered by Date alone, for date filters across all cities
+        self.by_date = np.argsort(dates, kind="stable")
+        self.dates = dates[self.by_date]
+        # Rows without a date sort last in by_date
+        self.n_dated = int(np.count_nonzero(~np.isnan(self.dates)))
+        with self._lock:
+            self._sort_cache = {}
+            self._full_orders = OrderedDict()
+
+    @property
+    def df(self):
+        """The indexed frame; rows added by update() are concatenated the first time it is asked for"""
+        if len(self._parts) > 1:
+            self._parts = [pd.concat(self._parts, ignore_index=True)]
+        return self._parts[0]
+
+    @property
+    def columns(self):
+        return self._parts[0].columns
+
+    def update(self, rows):
+        """Add rows (same columns as the frame) after the existing ones and insert them into the orderings"""
+        names = rows[self.city_column].astype(str)
+        if not names.isin(self.city_slices).all():
+            self._layout(pd.concat(self._parts + [rows], ignore_index=True))
+            return
+        codes = names.map({city: code for code, city in enumerate(self.cities)}).to_numpy(dtype=np.int64)
+        dates = self._sort_key(rows[self.date_column].astype(self._date_dtype))
+        ids = len(self.by_city_date) + np.arange(len(rows))
+
+        # New rows go after existing rows of the same (City, Date), as the stable sorts above put them
+        order = np.lexsort((dates, codes))
+        codes, dates, ids = codes[order], dates[order], ids[order]
+        at = np.empty(len(ids), dtype=np.int64)
+        for code in np.unique(codes).tolist():
+            mine = codes == code
+            lo, hi = self._bounds[code], self._bounds[code + 1]
+            at[mine] = lo + np.searchsorted(self.city_dates[lo:hi], dates[mine], side="right")
+        self.by_city_date = np.insert(self.by_city_date, at, ids)
+        self.city_dates = np.insert(self.city_dates, at, dates)
+        self._bounds = self._bounds + np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(self.cities)))])
+        self.city_slices = {city: (self._bounds[i], self._bounds[i + 1]) for i, city in enumerate(self.cities)}
+
+        order = np.lexsort((ids, dates))
+        at = np.searchsorted(self.dates, dates[order], side="right")
+        self.by_date = np.insert(self.by_date, at, ids[order])
+        self.dates = np.insert(self.dates, at, dates[order])
+        self.n_dated += int(np.count_nonzero(~np.isnan(dates)))
+
+        self._parts.append(rows)
+        with self._lock:
+            self._sort_cache = {}
+            self._full_orders = OrderedDict()
+
+    def copy(self):
+        """Independent copy to update() while readers go on using this one; it starts with no cached sorts"""
+        other = copy.copy(self)
+        # update() replaces the orderings rather than writing into them, so the arrays are shared
+        other._parts = list(self._parts)
+        other._lock = threading.Lock()
+        other._sort_cache = {}
+        other._full_orders = OrderedDict()
+        return other
+
+    def date_range(self):
+        """Earliest and latest date, or (None, None) if no row has one"""
+        if not self.n_dated:
+            return None, None
+        unit = np.datetime_data(self._date_dtype)[0]
+        return tuple(pd.Timestamp(np.datetime64(int(value), unit)) for value in (self.dates[0], self.dates[self.n_dated - 1]))
+
+    @staticmethod
+    def _sort_key(series):
+        """Numeric sort key for a column; missing values sort last"""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Categories are stored sorted, so codes follow alphabetical order
+            codes = series.cat.codes.to_numpy().astype(np.float64)
+            codes[codes < 0] = np.nan
+            return codes
+        if series.dtype.kind == "M":
+            values = series.to_numpy().view("i8").astype(np.float64)
+            values[series.isna().to_numpy()] = np.nan
+            return values
+        if series.dtype.kind in "biuf":
+            return series.to_numpy(dtype=np.float64, na_value=np.nan)
+        return series.astype("category").cat.codes.to_numpy().astype(np.float64)
+
+    def _date_bound(self, value):
+        if value is None:
+            return None
+        return float(pd.Timestamp(value).to_datetime64().astype(self._date_dtype).view("i8"))
+
+    def rows(self, city=None, start=None, end=None):
+        """Row positions matching the filter: (City, Date) order, or Date order for a narrower date range over all cities"""
+        lo_date, hi_date = self._date_bound(start), self._date_bound(end)
+        if city is None or city == "All":
+            # A range reaching both ends of the data (the date picker's default) filters nothing
+            covers_start = lo_date is None or not self.n_dated or lo_date <= self.dates[0]
+            covers_end = hi_date is None or not self.n_dated or hi_date >= self.dates[self.n_dated - 1]
+            if covers_start and covers_end:
+                return self.by_city_date
+            lo = 0 if lo_date is None else np.searchsorted(self.dates, lo_date, side="left")
+            hi = len(self.dates) if hi_date is None else np.searchsorted(self.dates, hi_date, side="right")
+            return self.by_date[lo:hi]
+        base, stop = self.city_slices.get(city, (0, 0))
+        dates = self.city_dates[base:stop]
+        lo = base if lo_date is None else base + np.searchsorted(dates, lo_date, side="left")
+        hi = stop if hi_date is None else base + np.searchsorted(dates, hi_date, side="right")
+        return self.by_city_date[lo:hi]
+
+    def _column_key(self, column):
+        with self._lock:
+            keys = self._sort_cache.get(column)
+        if keys is None:
+            # Computed outside the lock; two sessions asking at once both compute it
+            keys = self._sort_key(self.df[column])
+            with self._lock:
+                self._sort_cache[column] = keys
+        return keys
+
+    def _full_order(self, column, ascending):
+        key = (column, ascending)
+        with self._lock:
+            order = self._full_orders.get(key)
+            if order is not None:
+                self._full_orders.move_to_end(key)
+                return order
+        keys = self._column_key(column)[self.by_city_date]
+        top = np.lexsort((np.arange(len(keys)), keys if ascending else -keys))
+        order = self.by_city_date[top]
+        with self._lock:
+            self._full_orders[key] = order
+            self._full_orders.move_to_end(key)
+            if len(self._full_orders) > SORTED_ORDERS:
+                self._full_orders.popitem(last=False)
+        return order
+
+    def page(self, city=None, start=None, end=None, sort_by=None, ascending=True, page=0, page_size=PAGE_SIZE):
+        """One page of the filtered, sorted table and the total number of matching rows"""
+        rows = self.rows(city, start, end)
+        total = len(rows)
+        first = page * page_size
+        last = min(first + page_size, total)
+        if first >= total:
+            return self.df.iloc[:0], total
+
+        if sort_by is None:
+            chosen = rows[first:last]
+        elif rows is self.by_city_date:
+            # Unfiltered sorts are reused across reruns and sessions, so keep the whole order
+            chosen = self._full_order(sort_by, ascending)[first:last]
+        else:
+            keys = self._column_key(sort_by)[rows]
+            keys = keys if ascending else -keys
+            if last < total // 2:
+                # Only the first `last` positions matter: find the cut-off value instead of sorting everything
+                filled = np.nan_to_num(keys, nan=np.inf, posinf=np.inf)
+                cutoff = np.partition(filled, last - 1)[last - 1]
+                below = np.flatnonzero(filled < cutoff)
+                tied = np.flatnonzero(filled == cutoff)[: last - len(below)]
+                top = np.concatenate([below, tied])
+                top = top[np.lexsort((top, keys[top]))]
+            else:
+                top = np.lexsort((np.arange(total), keys))
+            chosen = rows[top[first:last]]
+        return self.df.iloc[chosen], total
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DATA_PATH = os.path.join(ROOT, "data .csv")
+
+
+@pytest.fixture(scope="session")
+def dataset():
+    """The bundled city-day dataset, read the way the dashboard reads it, with its Month column; do not modify"""
+    from data_store import read_csv
+
+    df = read_csv(DATA_PATH)
+    df["Month"] = df["Date"].dt.month
+    return df
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from city_compare import MIN_OVERLAP_DAYS, CityComparison
+from figure_cache import table_frame, table_payload
+
+CITIES = ["Delhi", "Mumbai", "Patna", "Kolkata"]
+
+# Days the updated comparison receives through update(), a day at a time
+APPEND_DAYS = 30
+
+PERIODS = [(None, None), ("2018-03-15", "2019-11-30")]
+
+
+@pytest.fixture(scope="module")
+def comparison(dataset):
+    return CityComparison(dataset)
+
+
+def _rows(dataset, start, end):
+    rows = dataset
+    if start is not None:
+        rows = rows[(rows["Date"] >= start) & (rows["Date"] <= end)]
+    return rows
+
+
+@pytest.mark.parametrize("start,end", PERIODS)
+@pytest.mark.parametrize("pollutant", ["AQI", "PM2.5"])
+def test_correlations_match_pandas(dataset, comparison, pollutant, start, end):
+    expected = _rows(dataset, start, end).pivot_table(index="Date", columns="City", values=pollutant, observed=True)
+    expected = expected.corr(min_periods=MIN_OVERLAP_DAYS)
+    corr = comparison.correlations(None, pollutant, start, end)
+    np.testing.assert_allclose(corr.loc[expected.index, expected.columns].to_numpy(), expected.to_numpy(), atol=1e-9)
+
+
+@pytest.mark.parametrize("start,end", PERIODS)
+def test_ranks_match_pandas(dataset, comparison, start, end):
+    rows = _rows(dataset, start, end)
+    means = rows.groupby([pd.Grouper(key="Date", freq="MS"), "City"], observed=True)["AQI"].mean().unstack()
+    expected = means.rank(axis=1, ascending=False, method="first")
+    ranks = comparison.ranks(None, "AQI", start, end)
+    ranks.index = ranks.index.to_timestamp()
+    np.testing.assert_array_equal(ranks.loc[expected.index, expected.columns].to_numpy(), expected.to_numpy())
+    changes = comparison.rank_changes(None, "AQI", start, end)
+    np.testing.assert_array_equal(changes[expected.columns].to_numpy(), (expected.shift() - expected).to_numpy())
+
+
+@pytest.mark.parametrize("start,end", [("2021-01-01", None), (None, "2014-12-31"), ("2019-06-01", "2019-05-01")])
+def test_empty_periods_give_empty_results(comparison, start, end):
+    for result in [comparison.aligned(CITIES, "AQI", start, end), comparison.correlations(CITIES, "AQI", start, end).dropna(how="all"),
+                   comparison.leads(CITIES, "AQI", start, end), comparison.ranks(CITIES, "AQI", start, end),
+                   comparison.rank_changes(CITIES, "AQI", start, end)]:
+        assert result.empty
+    ranks = comparison.ranks(CITIES, "AQI", start, end)
+    assert list(ranks.columns) == CITIES and ranks.columns.name == "City"
+    assert comparison.period_means(CITIES, "AQI", start, end).isna().all()
+
+
+def test_copy_updates_without_touching_the_original(dataset):
+    cutoff = dataset["Date"].max() - pd.Timedelta(days=APPEND_DAYS)
+    original = CityComparison(dataset[dataset["Date"] <= cutoff])
+    before = original.period_means()
+
+    updated = original.copy()
+    for _, day in dataset[dataset["Date"] > cutoff].groupby("Date"):
+        updated.update(day)
+
+    pd.testing.assert_series_equal(original.period_means(), before)
+    assert original.dates[-1] == cutoff
+    fresh = CityComparison(dataset)
+    pd.testing.assert_frame_equal(updated.aligned(), fresh.aligned())
+    pd.testing.assert_series_equal(updated.period_means(), fresh.period_means())
+    pd.testing.assert_frame_equal(updated.ranks(), fresh.ranks())
+    pd.testing.assert_frame_equal(updated.correlations(), fresh.correlations(), rtol=1e-9)
+
+
+def test_leads_list_every_pair_of_lags(comparison):
+    lag, corr = comparison.lags(CITIES)
+    leads = comparison.leads(CITIES)
+
+    assert len(leads) == len(CITIES) * (len(CITIES) - 1) // 2
+    assert leads["Correlation"].is_monotonic_decreasing
+    for row in leads.itertuples(index=False):
+        # Each pair reads forwards: the follower is Lag (days) behind the leader
+        assert lag.loc[row.Leader, row.Follower] == row[2]
+        assert np.isclose(corr.loc[row.Leader, row.Follower], row.Correlation)
+    # Cached the way the app shows it
+    assert table_frame(table_payload(leads)).equals(leads)
@@ -0,0 +1,45 @@
+import pytest
+
+from city_stats import CityStats
+from query_engine import QueryEngine
+
+
+@pytest.fixture(scope="module")
+def stats(dataset):
+    return CityStats(dataset)
+
+
+@pytest.fixture(scope="module")
+def engine(dataset):
+    return QueryEngine(dataset)
+
+
+@pytest.mark.parametrize("question", [
+    "AQI in Delhi on 2019-05-01",
+    "AQI in Delhi in May 2019",
+    "aqi in delhi in 2019-05",
+    "PM10 in Patna during january",
+])
+def test_days_and_months_are_left_to_the_query_engine(stats, engine, question):
+    assert stats.answer(question) is None
+    assert engine.answer(question) is not None
+
+
+def test_one_day_answer_comes_from_that_day(dataset, engine):
+    day = dataset[(dataset["City"] == "Delhi") & (dataset["Date"] == "2019-05-01")]["AQI"].iloc[0]
+    assert f"**{day:.2f}**" in engine.answer("AQI in Delhi on 2019-05-01")
+
+
+@pytest.mark.parametrize("question", ["AQI in Delhi", "what is the aqi in dehli", "may i know the air quality in delhi"])
+def test_city_summary(stats, question):
+    assert stats.answer(question).startswith("**AQI in Delhi**")
+
+
+def test_year_answer(dataset, stats):
+    rows = dataset[(dataset["City"] == "Lucknow") & (dataset["Date"].dt.year == 2019)]["PM2.5"].dropna()
+    assert stats.answer("PM2.5 in Lucknow in 2019").startswith(f"**PM2.5 in Lucknow in 2019**: average **{rows.mean():.1f}** over {len(rows):,} days")
+
+
+def test_questions_without_a_city_or_topic(stats):
+    assert stats.answer("how is aqi calculated") is None
+    assert stats.answer("tell me about delhi") is None
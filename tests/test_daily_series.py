@@ -0,0 +1,38 @@
+import pandas as pd
+
+from daily_series import DailySeries
+
+
+def test_copy_updates_without_touching_the_original(dataset):
+    cutoff = dataset["Date"].max() - pd.Timedelta(days=60)
+    old, new = dataset[dataset["Date"] <= cutoff], dataset[dataset["Date"] > cutoff]
+    series = DailySeries(old)
+    before = series.rolling("Delhi").copy()
+
+    updated = series.copy()
+    updated.update(new)
+
+    # Readers of the original see exactly what they saw before
+    pd.testing.assert_frame_equal(series.rolling("Delhi"), before)
+    assert series.latest("Delhi")[0] <= cutoff
+    # The copy has the new days
+    pd.testing.assert_frame_equal(updated.rolling("Delhi"), DailySeries(dataset).rolling("Delhi"))
+    assert updated.latest("Delhi")[0] > cutoff
+
+
+def test_copy_shares_the_cities_a_batch_does_not_touch(dataset):
+    cutoff = dataset["Date"].max() - pd.Timedelta(days=60)
+    old = dataset[dataset["Date"] <= cutoff]
+    new = dataset[(dataset["Date"] > cutoff) & (dataset["City"] == "Delhi")]
+    series = DailySeries(old)
+    before = {city: series.rolling(city).copy() for city in ["Delhi", "Mumbai"]}
+
+    updated = series.copy()
+    updated.update(new)
+    assert updated.cities["Mumbai"]["values"] is series.cities["Mumbai"]["values"]
+    assert updated.cities["Delhi"]["values"] is not series.cities["Delhi"]["values"]
+    # Updating the original afterwards leaves the copy alone as well
+    series.update(dataset[(dataset["Date"] > cutoff) & (dataset["City"] == "Mumbai")].assign(AQI=1.0))
+    pd.testing.assert_frame_equal(updated.rolling("Mumbai"), before["Mumbai"])
+    pd.testing.assert_frame_equal(series.rolling("Delhi"), before["Delhi"])
+    pd.testing.assert_frame_equal(updated.rolling("Delhi"), DailySeries(pd.concat([old, new])).rolling("Delhi"))
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from downsample import SeriesDownsampler
+
+
+def test_update_matches_a_fresh_downsampler(dataset):
+    cutoff = dataset["Date"].max() - pd.Timedelta(days=30)
+    late_city = sorted(dataset["City"].unique())[-1]
+    new = (dataset["Date"] > cutoff) | (dataset["City"] == late_city)
+    updated = SeriesDownsampler(dataset[~new])
+    before = updated.series("Delhi", budget=200)
+    copy = updated.copy()
+    for _, day in dataset[new].groupby("Date"):
+        copy.update(day)
+    fresh = SeriesDownsampler(dataset)
+
+    assert copy.groups == fresh.groups
+    assert copy.date_range() == fresh.date_range()
+    for city in ["Delhi", late_city]:
+        for a, b in zip(copy.series(city, budget=200), fresh.series(city, budget=200)):
+            np.testing.assert_array_equal(a, b)
+    # The original, and what it already handed out, stay as they were
+    for a, b in zip(updated.series("Delhi", budget=200), before):
+        np.testing.assert_array_equal(a, b)
+    assert late_city not in updated.groups
@@ -0,0 +1,47 @@
+import ast
+import os
+
+import pytest
+
+from conftest import ROOT
+from intent_matcher import IntentMatcher
+
+CITIES = ["Delhi", "Mumbai", "Pune", "Kolkata"]
+
+
+@pytest.fixture(scope="module")
+def responses():
+    # Read from chatbot.py without importing it; importing starts the Streamlit UI
+    tree = ast.parse(open(os.path.join(ROOT, "chatbot.py"), encoding="utf-8").read())
+    node = next(n for n in tree.body if isinstance(n, ast.Assign) and getattr(n.targets[0], "id", None) == "predefined_responses")
+    return ast.literal_eval(node.value)
+
+
+@pytest.fixture(scope="module")
+def matcher(responses):
+    return IntentMatcher(responses, entities=CITIES)
+
+
+@pytest.mark.parametrize("question,canned", [
+    ("How's AQI calculated?", "how is aqi calculated"),
+    ("What's the safe level of PM 2.5?", "what is the safe level of pm2.5"),
+    ("please, what are the effcts of pm2.5 on health ??", "what are the effects of pm2.5 on health"),
+    ("Which city has the worst air quality?", "which city has the worst air quality"),
+])
+def test_variants_match_their_canned_answer(matcher, responses, question, canned):
+    assert matcher.match(question) == responses[canned]
+
+
+@pytest.mark.parametrize("question", [
+    # Another pollutant than the canned entry's
+    "what is the safe level of pm10",
+    "what is the safe level of no2",
+    "what are the effects of pm10 on health",
+    # The opposite of the canned question
+    "which city has the best air quality",
+    # Questions for the dataset or the model
+    "what is the aqi in pune",
+    "what is the no2 level in delhi in 2019",
+])
+def test_other_questions_are_not_claimed(matcher, question):
+    assert matcher.match(question) is None
@@ -0,0 +1,140 @@
+import sys
+import threading
+
+import pandas as pd
+import pytest
+
+from city_compare import CityComparison
+from city_stats import CityStats
+from daily_series import DailySeries
+from downsample import SeriesDownsampler
+from live_feed import LiveDataset
+from query_engine import QueryEngine
+from rollups import build_cube
+from table_view import TableIndex
+
+AGGREGATES = [("cube", build_cube), ("city_stats", CityStats), ("daily_series", DailySeries), ("city_compare", CityComparison),
+              ("downsampler", SeriesDownsampler), ("table_index", TableIndex), ("query_engine", QueryEngine)]
+
+# Days held back from the base dataset and fed in one batch per day
+FEED_DAYS = 40
+
+
+def _read_everything(dataset):
+    cube = dataset.aggregate("cube", build_cube)
+    stats = dataset.aggregate("city_stats", CityStats)
+    series = dataset.aggregate("daily_series", DailySeries)
+    comparison = dataset.aggregate("city_compare", CityComparison)
+    downsampler = dataset.aggregate("downsampler", SeriesDownsampler)
+    table_index = dataset.aggregate("table_index", TableIndex)
+    engine = dataset.aggregate("query_engine", QueryEngine)
+    # Several reads of the same objects, as one rerun of a page does
+    for city in ["All", "Delhi", ["Delhi", "Mumbai", "Patna"]]:
+        cube.totals(city)
+        cube.describe(city)
+        cube.corr(city)
+        cube.monthly_means(city, "AQI")
+    cube.city_means("AQI")
+    stats.answer("AQI in Delhi")
+    series.rolling("Delhi")
+    series.exceedance_table()
+    comparison.period_means()
+    comparison.correlations(["Delhi", "Mumbai", "Patna"])
+    downsampler.frame(budget=200)
+    table_index.page("Delhi", sort_by="AQI", ascending=False)
+    table_index.page(None, "2020-01-01", None)
+    engine.answer("highest AQI in Delhi in 2020")
+
+
+def test_readers_never_see_a_batch_half_applied(dataset):
+    cutoff = dataset["Date"].max() - pd.Timedelta(days=FEED_DAYS)
+    live = LiveDataset(dataset[dataset["Date"] <= cutoff].reset_index(drop=True))
+    for name, build in AGGREGATES:
+        live.aggregate(name, build)
+    days = [day.drop(columns="Month") for _, day in dataset[dataset["Date"] > cutoff].groupby("Date")]
+
+    errors = []
+    done = threading.Event()
+
+    def feed():
+        try:
+            for day in days:
+                live.append(day)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            done.set()
+
+    # Switch threads far more often than usual, so a reader lands in the middle of an append
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        writer = threading.Thread(target=feed)
+        writer.start()
+        reads = 0
+        while not done.is_set() or not reads:
+            try:
+                _read_everything(live)
+            except Exception as e:
+                errors.append(e)
+            reads += 1
+        writer.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert not errors, f"{len(errors)} errors, first: {errors[0]!r}"
+    assert live.rebuilds == 0
+    assert live.rows_appended == sum(len(day) for day in days)
+    # What the readers ended on is what a cube built from all the rows says
+    expected = dataset.groupby("City", observed=True)["AQI"].mean().reset_index()
+    pd.testing.assert_frame_equal(expected, live.aggregate("cube", build_cube).city_means("AQI"), check_dtype=False, check_categorical=False)
+
+
+# One answer from each aggregate that every appended day changes
+QUERIES = {
+    "cube": lambda cube: cube.city_means("AQI"),
+    "city_stats": lambda stats: stats.answer("AQI in Delhi"),
+    "daily_series": lambda series: series.rolling("Delhi"),
+    "city_compare": lambda comparison: comparison.period_means(),
+    "downsampler": lambda downsampler: downsampler.frame(["Delhi"]),
+    "table_index": lambda table_index: table_index.page(None, "2020-01-01", None)[0],
+    "query_engine": lambda engine: engine.answer("average AQI in Delhi in 2020"),
+}
+
+
+@pytest.mark.parametrize("name,build", AGGREGATES)
+def test_handed_out_aggregates_do_not_change(dataset, name, build):
+    cutoff = dataset["Date"].max() - pd.Timedelta(days=FEED_DAYS)
+    live = LiveDataset(dataset[dataset["Date"] <= cutoff].reset_index(drop=True))
+    before = live.aggregate(name, build)
+    answer = QUERIES[name](before)
+    live.append(dataset[dataset["Date"] > cutoff].drop(columns="Month"))
+    after = live.aggregate(name, build)
+    assert after is not before
+    _assert_equal(QUERIES[name](before), answer)
+    with pytest.raises(AssertionError):
+        _assert_equal(QUERIES[name](after), answer)
+
+
+def _assert_equal(actual, expected):
+    if isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(actual, expected)
+    elif isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(actual, expected)
+    else:
+        assert actual == expected
+
+
+def test_only_rows_that_repeat_a_city_and_day_rebuild(dataset):
+    delhi = dataset[dataset["City"] == "Delhi"]
+    # Delhi with a gap of a week, which a late batch then fills
+    gap = delhi["Date"].iloc[-20:-13]
+    live = LiveDataset(dataset[~dataset.index.isin(gap.index)].reset_index(drop=True))
+    live.aggregate("cube", build_cube)
+
+    live.append(delhi.loc[gap.index].drop(columns="Month"))
+    assert live.rebuilds == 0 and len(live.frame()) == len(dataset)
+    # The same days again replace the rows just added
+    live.append(delhi.loc[gap.index].drop(columns="Month").assign(AQI=1.0))
+    assert live.rebuilds == 1 and len(live.frame()) == len(dataset)
+    assert live.aggregate("cube", build_cube).totals("Delhi")["count"].max() == len(delhi)
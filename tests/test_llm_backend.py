@@ -0,0 +1,61 @@
+import threading
+import time
+
+from llm_backend import LLMClient, ResponseCache, StubBackend
+
+
+def test_empty_answers_are_not_cached(tmp_path):
+    cache = ResponseCache(str(tmp_path / "llm.sqlite"))
+    # A backend that streams nothing, as when a safety filter drops every chunk
+    client = LLMClient(StubBackend(words=0), cache=cache, retries=0)
+    assert client.generate("AQI in Delhi?") == ""
+    assert cache.get("AQI in Delhi?") is None
+
+    client.backend = StubBackend(words=5)
+    answer = client.generate("AQI in Delhi?")
+    assert answer and client.backend.calls == 1
+    assert client.generate("AQI in Delhi?") == answer
+    assert client.backend.calls == 1 and client.hits == 1
+
+
+class RecordingBackend:
+    """Streams numbered tokens, the first call only after a delay; records how far each call got"""
+
+    def __init__(self, first_call_delay=0.0, token_delay=0.001, words=1000):
+        self.first_call_delay = first_call_delay
+        self.token_delay = token_delay
+        self.words = words
+        self.sent = []
+        self.closed = []
+
+    def stream(self, prompt):
+        call = len(self.sent)
+        self.sent.append(0)
+        self.closed.append(threading.Event())
+        try:
+            if call == 0:
+                time.sleep(self.first_call_delay)
+            for i in range(self.words):
+                time.sleep(self.token_delay)
+                self.sent[call] += 1
+                yield f"{i} "
+        finally:
+            self.closed[call].set()
+
+
+def test_a_timed_out_request_stops_before_the_retry():
+    backend = RecordingBackend(first_call_delay=0.3, words=20)
+    client = LLMClient(backend, timeout=0.1, retries=1, backoff=0.0)
+    assert client.generate("AQI in Delhi?") == "".join(f"{i} " for i in range(20))
+    assert backend.closed[0].wait(1)
+    # The abandoned request got at most the token it was waiting for when it came back
+    assert len(backend.sent) == 2 and backend.sent[0] <= 1
+
+
+def test_closing_the_answer_early_stops_the_request():
+    backend = RecordingBackend()
+    tokens = LLMClient(backend).stream("AQI in Delhi?")
+    assert [next(tokens) for _ in range(3)] == ["0 ", "1 ", "2 "]
+    tokens.close()
+    assert backend.closed[0].wait(1)
+    assert backend.sent[0] < backend.words
@@ -0,0 +1,94 @@
+import smtplib
+from contextlib import contextmanager
+
+import pytest
+
+from mail_outbox import DeliveryWorker, Outbox, SMTPPool
+
+
+class FakeServer:
+    """Accepts every message except those whose subject says otherwise"""
+
+    def __init__(self):
+        self.delivered = []
+        self.closed = False
+        self.resets = 0
+
+    def send_message(self, msg, sender, recipients):
+        if "unexpected" in msg["Subject"]:
+            raise UnicodeEncodeError("ascii", "ä", 0, 1, "ordinal not in range(128)")
+        self.delivered.append(msg["Subject"])
+
+    def rset(self):
+        self.resets += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool:
+    def __init__(self, fail_first=0):
+        self.server = FakeServer()
+        self.fail_first = fail_first
+
+    @contextmanager
+    def connection(self):
+        if self.fail_first:
+            self.fail_first -= 1
+            raise RuntimeError("pool exploded")
+        yield self.server
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return Outbox(str(tmp_path / "outbox.sqlite"))
+
+
+def test_unexpected_errors_fail_one_message_only(outbox):
+    pool = FakePool()
+    for subject in ["first", "unexpected encoding", "last"]:
+        outbox.enqueue("a@example.com", ["b@example.com"], subject, "body")
+    worker = DeliveryWorker(outbox, pool)
+    worker._deliver(outbox.claim())
+    assert pool.server.delivered == ["first", "last"]
+    assert pool.server.resets == 1
+    assert outbox.counts() == {"sent": 2, "failed": 1}
+    assert worker.sent == 2 and worker.failed == 1
+
+
+def test_worker_thread_survives_unexpected_errors(outbox):
+    pool = FakePool(fail_first=1)
+    # The lease is what brings the claimed message back after the first, broken batch
+    worker = DeliveryWorker(outbox, pool, poll=0.01)
+    worker.outbox.claim = lambda limit, claim=outbox.claim: claim(limit, lease=0)
+    worker.start()
+    try:
+        worker.submit("a@example.com", ["b@example.com"], "hello", "body")
+        assert worker.flush(timeout=10)
+        assert all(thread.is_alive() for thread in worker._threads)
+    finally:
+        worker.stop()
+    assert pool.fail_first == 0 and pool.server.delivered == ["hello"]
+
+
+class OneServerPool(SMTPPool):
+    def __init__(self, server):
+        super().__init__("localhost", 25)
+        self.server = server
+
+    def _checkout(self):
+        return self.server
+
+
+@pytest.mark.parametrize("error", [RuntimeError("boom"), smtplib.SMTPServerDisconnected("gone"), KeyboardInterrupt()])
+def test_pool_closes_connections_whatever_the_error(error):
+    server = FakeServer()
+    pool = OneServerPool(server)
+    with pytest.raises(type(error)):
+        with pool.connection():
+            raise error
+    assert server.closed
+    assert pool.idle.empty()
@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+from query_engine import POLLUTANTS, QueryEngine, find_pollutant, tokenize
+
+QUESTIONS = [
+    "AQI in Delhi on 2020-06-30",
+    "highest PM2.5 in Mumbai in 2020",
+    "average AQI in June 2020",
+    "which city had the worst AQI in 2020",
+    "PM10 in Aizawl",
+]
+
+
+@pytest.fixture(scope="module")
+def engines(dataset):
+    cutoff = dataset["Date"].max() - pd.Timedelta(days=30)
+    # Aizawl only arrives through update(), as a city not seen before
+    new = (dataset["Date"] > cutoff) | (dataset["City"] == "Aizawl")
+    updated = QueryEngine(dataset[~new].reset_index(drop=True))
+    before = {question: updated.answer(question) for question in QUESTIONS}
+    copy = updated.copy()
+    for _, day in dataset[new].groupby("Date"):
+        copy.update(day.reset_index(drop=True))
+    frame = pd.concat([dataset[~new], dataset[new].sort_values("Date", kind="stable")], ignore_index=True)
+    return updated, before, copy, QueryEngine(frame)
+
+
+@pytest.mark.parametrize("question", QUESTIONS)
+def test_update_matches_a_fresh_engine(engines, question):
+    updated, before, copy, fresh = engines
+    assert copy.answer(question) == fresh.answer(question)
+    assert updated.answer(question) == before[question]
+
+
+@pytest.mark.parametrize("question,pollutant", [
+    ("highest NO in Delhi in 2019", "NO"),
+    # The chatbot's earlier lookups see the question lowercased
+    ("highest no levels in delhi in 2019", "NO"),
+    ("no concentration in patna", "NO"),
+    ("is there no data for delhi in 2019", None),
+    ("no2 in delhi", "NO2"),
+])
+def test_no_is_the_pollutant_only_when_the_question_says_so(question, pollutant):
+    assert find_pollutant(tokenize(question), {p.lower(): p for p in POLLUTANTS}, question) == pollutant
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rollups import build_cube
+
+# Days (and one whole city) the updated cube receives through update(), a day at a time
+APPEND_DAYS = 30
+
+
+def assert_same(expected, actual):
+    pd.testing.assert_frame_equal(expected, actual, check_dtype=False, check_categorical=False, rtol=1e-9, atol=1e-9)
+
+
+@pytest.fixture(scope="module")
+def built(dataset):
+    return dataset, build_cube(dataset)
+
+
+@pytest.fixture(scope="module")
+def updated(dataset):
+    """A cube built without the last days and the last city, which then arrive through update()"""
+    cutoff = dataset["Date"].max() - pd.Timedelta(days=APPEND_DAYS)
+    late_city = sorted(dataset["City"].unique())[-1]
+    base = dataset[(dataset["Date"] <= cutoff) & (dataset["City"] != late_city)]
+    cube = build_cube(base)
+    appended = dataset.drop(base.index)
+    for _, day in appended.groupby("Date", sort=True):
+        cube.update(day)
+    # The frame in the order the cube saw its rows, so float sums match pandas to the last bit that matters
+    ordered = dataset.loc[base.index.append(appended.sort_values("Date", kind="stable").index)]
+    return ordered, cube
+
+
+@pytest.fixture(params=["built", "updated"])
+def frame_and_cube(request):
+    return request.getfixturevalue(request.param)
+
+
+def test_city_means_and_top_cities(frame_and_cube):
+    df, cube = frame_and_cube
+    avg_aqi = df.groupby("City", observed=True)["AQI"].mean().reset_index()
+    assert_same(avg_aqi, cube.city_means("AQI"))
+    assert_same(avg_aqi.nlargest(5, "AQI"), cube.top_cities(5, "AQI"))
+    assert_same(avg_aqi.nsmallest(5, "AQI"), cube.top_cities(5, "AQI", largest=False))
+
+
+def _cities(df):
+    return ["All"] + sorted(df["City"].unique())
+
+
+def _filtered(df, city):
+    return df if city == "All" else df[df["City"] == city]
+
+
+def test_monthly_means(frame_and_cube):
+    df, cube = frame_and_cube
+    for city in _cities(df):
+        assert_same(_filtered(df, city).groupby("Month")["AQI"].mean().reset_index(), cube.monthly_means(city, "AQI"))
+
+
+def test_corr(frame_and_cube):
+    df, cube = frame_and_cube
+    for city in _cities(df):
+        assert_same(_filtered(df, city).select_dtypes(include=["float64", "int64"]).corr(), cube.corr(city))
+
+
+def test_describe(frame_and_cube):
+    df, cube = frame_and_cube
+    for city in _cities(df):
+        expected, actual = _filtered(df, city).describe(), cube.describe(city)
+        assert list(expected.index) == list(actual.index)
+        assert list(expected.columns) == list(actual.columns)
+        for column in expected.columns:
+            if expected[column].dtype != object:
+                np.testing.assert_allclose(expected[column].to_numpy(float), actual[column].to_numpy(float), rtol=1e-9, atol=1e-12,
+                                           err_msg=f"describe {column} ({city})")
+                continue
+            # Datetime means are summed in a different order; allow a few microseconds
+            for label in expected.index:
+                a, b = expected.at[label, column], actual.at[label, column]
+                if label == "count":
+                    assert a == b
+                else:
+                    assert (pd.isna(a) and pd.isna(b)) or abs(pd.Timestamp(a) - pd.Timestamp(b)) <= pd.Timedelta("10us"), (column, label, city)
+
+
+def test_describe_of_a_city_group_is_close(built):
+    df, cube = built
+    group = sorted(df["City"].unique())[:3]
+    exact = df[df["City"].isin(group)].describe().loc[["25%", "50%", "75%"], "AQI"].to_numpy(float)
+    approx = cube.describe(group).loc[["25%", "50%", "75%"], "AQI"].to_numpy(float)
+    # Several cities are answered from merged quantile sketches, not exactly
+    np.testing.assert_allclose(approx, exact, rtol=0.02)
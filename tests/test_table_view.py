@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from table_view import TableIndex
+
+
+@pytest.fixture(scope="module")
+def index(dataset):
+    return TableIndex(dataset)
+
+
+def test_full_date_range_keeps_city_date_order(dataset, index):
+    rows = index.rows(None, dataset["Date"].min().date(), dataset["Date"].max().date())
+    assert rows is index.by_city_date
+    shown = dataset.iloc[rows[:500]]
+    expected = dataset.sort_values(["City", "Date"], kind="stable").head(500)
+    pd.testing.assert_frame_equal(shown, expected)
+
+
+def test_date_range_matches_a_pandas_filter(dataset, index):
+    for city in ["All", "Delhi"]:
+        rows = index.rows(city, "2018-03-01", "2019-02-28")
+        part = dataset if city == "All" else dataset[dataset["City"] == city]
+        expected = part[(part["Date"] >= "2018-03-01") & (part["Date"] <= "2019-02-28")]
+        np.testing.assert_array_equal(np.sort(rows), expected.index.to_numpy())
+
+
+def test_sorted_page_matches_pandas(dataset, index):
+    rows, total = index.page(None, sort_by="AQI", ascending=False, page=2)
+    expected = dataset.iloc[index.by_city_date].sort_values("AQI", ascending=False, kind="stable", na_position="last")
+    assert total == len(dataset)
+    pd.testing.assert_frame_equal(rows, expected.iloc[100:150])
+
+
+@pytest.mark.parametrize("late_city", [False, True])
+def test_update_matches_a_fresh_index(dataset, late_city):
+    cutoff = dataset["Date"].max() - pd.Timedelta(days=30)
+    new = dataset["Date"] > cutoff
+    if late_city:
+        # A city first seen in an update lays the index out again
+        new |= dataset["City"] == sorted(dataset["City"].unique())[0]
+    updated = TableIndex(dataset[~new].reset_index(drop=True))
+    for _, day in dataset[new].groupby("Date"):
+        updated.update(day.reset_index(drop=True))
+    frame = pd.concat([dataset[~new], dataset[new].sort_values("Date", kind="stable")], ignore_index=True)
+    fresh = TableIndex(frame)
+
+    pd.testing.assert_frame_equal(updated.df, frame, check_categorical=False)
+    for name in ["by_city_date", "city_dates", "by_date", "dates"]:
+        np.testing.assert_array_equal(getattr(updated, name), getattr(fresh, name))
+    assert updated.city_slices == fresh.city_slices and updated.n_dated == fresh.n_dated
+    assert updated.date_range() == (frame["Date"].min(), frame["Date"].max())
+    np.testing.assert_array_equal(updated.rows("Delhi", "2020-01-01", None), fresh.rows("Delhi", "2020-01-01", None))
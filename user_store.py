@@ -0,0 +1,213 @@
+import base64
+import hashlib
+import hmac
+import os
+import queue
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Accounts shared by every session and worker process (override with AQ_USERS_PATH)
+USERS_PATH = os.environ.get("AQ_USERS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "users.sqlite"))
+
+# scrypt cost: about 16 MB and 70 ms per hash, so guessing passwords from a stolen file is slow
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+
+# Connections kept open per process
+POOL_SIZE = 4
+
+# Successful (username, password) checks remembered per process, so a repeated login skips scrypt
+VERIFIED_CACHE_SIZE = 1024
+
+# How long a session token stays valid
+SESSION_SECONDS = 12 * 60 * 60
+
+
+def hash_password(password, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P):
+    """Salted scrypt hash of password, as "scrypt$n$r$p$salt$hash" (salt and hash base64)"""
+    salt = os.urandom(SALT_BYTES)
+    digest = hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=256 * r * (n + p + 2))
+    return "$".join(["scrypt", str(n), str(r), str(p), base64.b64encode(salt).decode(), base64.b64encode(digest).decode()])
+
+
+def check_password(password, stored):
+    """True if password matches a hash_password() string; the parameters are read from the string"""
+    try:
+        scheme, n, r, p, salt, digest = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+    except ValueError:
+        return False
+    if scheme != "scrypt":
+        return False
+    expected = base64.b64decode(digest)
+    actual = hashlib.scrypt(password.encode("utf-8"), salt=base64.b64decode(salt), n=n, r=r, p=p,
+                            maxmem=256 * r * (n + p + 2), dklen=len(expected))
+    return hmac.compare_digest(actual, expected)
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class UserStore:
+    """Accounts in SQLite with scrypt password hashes, shared by all sessions and worker processes
+
+    Logging in looks the user up by primary key and checks the password with
+    scrypt, unless the same password was already verified against the same
+    stored hash in this process. A successful login returns a signed session
+    token; checking it on later reruns costs one HMAC and no database access.
+    The signing key lives in the database, so every process accepts the
+    tokens of every other.
+    """
+
+    def __init__(self, path=USERS_PATH, pool_size=POOL_SIZE, session_seconds=SESSION_SECONDS, cache_size=VERIFIED_CACHE_SIZE):
+        self.path = path
+        self.session_seconds = session_seconds
+        self.cache_size = cache_size
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.idle = queue.LifoQueue(maxsize=pool_size)
+        self.verified = OrderedDict()
+        # Cache entries are keyed with this, so they reveal nothing about the passwords outside this process
+        self._cache_key = secrets.token_bytes(32)
+        self._lock = threading.Lock()
+        # A hash to check unknown usernames against, so they take as long as wrong passwords
+        self._dummy_hash = hash_password(secrets.token_hex(8))
+        self.scrypt_checks = self.cache_hits = 0
+
+        # The journal mode cannot change inside a transaction; it sticks to the file once set
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        finally:
+            conn.close()
+        with self._connect(write=True) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password_hash TEXT NOT NULL, created REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value BLOB NOT NULL)")
+            # The first process to get here picks the key; the others read it
+            conn.execute("INSERT OR IGNORE INTO settings (name, value) VALUES ('session_key', ?)", (secrets.token_bytes(32),))
+            self._session_key = conn.execute("SELECT value FROM settings WHERE name = 'session_key'").fetchone()[0]
+
+    @contextmanager
+    def _connect(self, write=False):
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            # With WAL this survives a crash of the app; only a power cut can drop the last few commits
+            conn.execute("PRAGMA synchronous=NORMAL")
+        broken = False
+        try:
+            if write:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield conn
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            else:
+                yield conn
+        except sqlite3.IntegrityError:
+            # A rejected row (e.g. a taken username) leaves the connection usable
+            raise
+        except sqlite3.Error:
+            broken = True
+            raise
+        finally:
+            try:
+                if broken:
+                    conn.close()
+                else:
+                    self.idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def exists(self, username):
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone() is not None
+
+    def register(self, username, password):
+        """Create an account; False if the username is taken (also when another process took it first)"""
+        password_hash = hash_password(password)
+        try:
+            with self._connect(write=True) as conn:
+                conn.execute("INSERT INTO users (username, password_hash, created) VALUES (?, ?, ?)", (username, password_hash, time.time()))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def ensure_user(self, username, password):
+        """Create username with password unless it already exists, e.g. for the default admin account; True if created"""
+        return not self.exists(username) and self.register(username, password)
+
+    def set_password(self, username, password):
+        with self._connect(write=True) as conn:
+            conn.execute("UPDATE users SET password_hash = ? WHERE username = ?", (hash_password(password), username))
+
+    def authenticate(self, username, password):
+        """True if the password is right for username"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT password_hash FROM users WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            check_password(password, self._dummy_hash)
+            return False
+
+        # The stored hash is part of the key, so a changed password never matches an old entry
+        key = hmac.new(self._cache_key, f"{username}\0{password}\0{row[0]}".encode("utf-8"), hashlib.sha256).digest()
+        with self._lock:
+            if key in self.verified:
+                self.verified.move_to_end(key)
+                self.cache_hits += 1
+                return True
+            self.scrypt_checks += 1
+        if not check_password(password, row[0]):
+            return False
+        with self._lock:
+            self.verified[key] = True
+            while len(self.verified) > self.cache_size:
+                self.verified.popitem(last=False)
+        return True
+
+    def login(self, username, password):
+        """Session token for username if the password is right, else None"""
+        return self.issue_token(username) if self.authenticate(username, password) else None
+
+    def issue_token(self, username):
+        """Signed "user.expiry.signature" token, valid for session_seconds"""
+        payload = f"{_b64(username.encode('utf-8'))}.{int(time.time()) + self.session_seconds}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify_token(self, token):
+        """Username the token was issued to, or None if it is forged, malformed or expired"""
+        if not token:
+            return None
+        payload, _, signature = token.rpartition(".")
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        user, _, expires = payload.partition(".")
+        try:
+            if int(expires) < time.time():
+                return None
+            return _unb64(user).decode("utf-8")
+        except ValueError:
+            return None
+
+    def _sign(self, payload):
+        return _b64(hmac.new(self._session_key, payload.encode("utf-8"), hashlib.sha256).digest())